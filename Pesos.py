@@ -1,13 +1,12 @@
 import pandas as pd
 import numpy as np
 import nltk
-from nltk.stem import SnowballStemmer
 from collections import defaultdict
+from app.Analizador import Analizador
 
 nltk.download('punkt')
 
 def calcular_pesos_campos(ruta_csv, ruta_stoplist, ruta_pesos):
-    stemmer = SnowballStemmer('spanish')
     stopwords = set()
     # CARGAMOS LOS STOPWORDS
     try:
@@ -22,6 +21,7 @@ def calcular_pesos_campos(ruta_csv, ruta_stoplist, ruta_pesos):
     # añadimos los caracteres especiales
     caracteres_especiales = set("'«[]¿?$+-*'.,»:;!,º«»()@¡😆“/#|*%'&`")
     stopwords.update(caracteres_especiales)
+    analizador = Analizador(stopwords)
     
     # variables 
     total_campos = None
@@ -39,12 +39,8 @@ def calcular_pesos_campos(ruta_csv, ruta_stoplist, ruta_pesos):
             for _, fila in chunk.iterrows():
                 total_documentos += 1
                 for idx_campo, campo in enumerate(fila):
-                    tokens = nltk.word_tokenize(str(campo).lower())
-                    tokens = [token.strip() for token in tokens]
-                    for token in tokens:
-                        if token not in stopwords:
-                            lematizado = stemmer.stem(token)
-                            terminos_por_campo[idx_campo][lematizado] += 1
+                    for lematizado in analizador.analizar(str(campo)):
+                        terminos_por_campo[idx_campo][lematizado] += 1
             if total_documentos >= 5000:  
                 break
     except Exception as e:
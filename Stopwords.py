@@ -4,6 +4,7 @@ from collections import Counter, defaultdict
 import numpy as np
 import csv
 import matplotlib.pyplot as plt
+from app.Analizador import Analizador
 
 # Asegúrate de tener los paquetes necesarios de NLTK
 nltk.download('punkt')
@@ -22,8 +23,9 @@ def generar_stopwords_desde_csv(ruta_csv_entrada, ruta_csv_stopwords_salida):
     word_freq = Counter()
     word_doc_freq = defaultdict(set)
     
+    analizador = Analizador()
     for idx, texto in df['texto_combinado'].items():
-        tokens = nltk.word_tokenize(texto.lower())
+        tokens = analizador.tokenizar(texto)
         word_freq.update(tokens)
         for token in set(tokens):
             word_doc_freq[token].add(idx)
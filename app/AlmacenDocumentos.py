@@ -0,0 +1,169 @@
+import json
+import mmap
+import struct
+import numpy as np
+import pandas as pd
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+# ALMACEN DE DOCUMENTOS
+# el motor de consulta solo necesita las filas del top k, asi que en vez de tener todo el csv en un
+# DataFrame se guarda cada fila como un registro y una tabla de offsets por id de documento:
+#
+#   [cabecera][columnas (json)][registro 0][registro 1]...[tabla de offsets]
+#
+# cabecera: magic, version, numero de documentos, offset de la tabla y longitud del json de columnas
+# registro: lista json con los valores de la fila en el orden de las columnas
+# tabla: numero_documentos + 1 offsets uint64, el registro i ocupa [offset[i], offset[i + 1])
+# el id de documento es la posicion de la fila en el csv, el mismo que usa el indice invertido
+
+MAGIC = b'DOCS'
+VERSION = 1
+FORMATO_CABECERA = '<4sHHQQI'
+TAMANIO_CABECERA = struct.calcsize(FORMATO_CABECERA)
+NOMBRE_ALMACEN = "documentos.bin"
+TAMANIO_CACHE_FILAS = 1024  # filas recientes decodificadas; las consultas populares repiten documentos
+
+
+class EscritorAlmacenDocumentos:
+    """escribe los registros en orden de id de documento, chunk por chunk"""
+
+    def __init__(self, ruta: str, columnas: List[str]):
+        self.ruta = ruta
+        self.columnas = list(columnas)
+        columnas_bytes = json.dumps(self.columnas, ensure_ascii=False).encode('utf-8')
+        self.archivo = open(ruta, 'wb', buffering=1024 * 1024)
+        self.archivo.write(b'\x00' * TAMANIO_CABECERA)  # se completa al cerrar
+        self.archivo.write(columnas_bytes)
+        self.longitud_columnas = len(columnas_bytes)
+        self.offsets = [self.archivo.tell()]
+
+    def agregar_chunk(self, chunk: pd.DataFrame):
+        if list(chunk.columns) != self.columnas:
+            raise ValueError(f"las columnas del chunk no coinciden con las del almacen: {list(chunk.columns)}")
+        if len(chunk) and int(chunk.index[0]) != len(self.offsets) - 1:
+            raise ValueError(f"el chunk empieza en el documento {chunk.index[0]}, se esperaba {len(self.offsets) - 1}")
+        # to_dict da tipos nativos de python, igual que dataframe.loc[id].to_dict()
+        self.agregar_registros(list(registro.values()) for registro in chunk.to_dict('records'))
+
+    def agregar_registros(self, registros: Iterable[list]):
+        """agrega filas ya como listas de valores, en el orden de las columnas"""
+        for registro in registros:
+            self.archivo.write(json.dumps(list(registro), ensure_ascii=False).encode('utf-8'))
+            self.offsets.append(self.archivo.tell())
+
+    def cerrar(self):
+        offset_tabla = self.archivo.tell()
+        self.archivo.write(np.asarray(self.offsets, dtype='<u8').tobytes())
+        self.archivo.seek(0)
+        self.archivo.write(struct.pack(FORMATO_CABECERA, MAGIC, VERSION, 0, len(self.offsets) - 1, offset_tabla,
+                                       self.longitud_columnas))
+        self.archivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        self.cerrar()
+
+
+class AlmacenDocumentos:
+    """lee registros sueltos por id desde el archivo mapeado en memoria
+
+    solo la tabla de offsets (8 bytes por documento) queda residente; las letras se leen del mmap
+    al pedir el top k y las paginas las comparte el sistema operativo entre procesos
+    """
+
+    def __init__(self, ruta: str, tamanio_cache: int = TAMANIO_CACHE_FILAS):
+        self.ruta = ruta
+        self.archivo = open(ruta, 'rb')
+        cabecera = self.archivo.read(TAMANIO_CABECERA)
+        if len(cabecera) < TAMANIO_CABECERA:
+            raise ValueError(f"{ruta} no es un almacen de documentos valido")
+        magic, version, _, self.numero_documentos, offset_tabla, longitud_columnas = struct.unpack(
+            FORMATO_CABECERA, cabecera)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{ruta} no es un almacen de documentos valido (version {version})")
+        self.columnas = json.loads(self.archivo.read(longitud_columnas).decode('utf-8'))
+        self.mapa = mmap.mmap(self.archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        self.offsets = np.frombuffer(self.mapa, dtype='<u8', count=self.numero_documentos + 1, offset=offset_tabla)
+        self._leer_registro = lru_cache(maxsize=tamanio_cache)(self._decodificar_registro)
+
+    def _posicion(self, id_documento) -> Optional[int]:
+        try:
+            posicion = int(id_documento)
+        except (TypeError, ValueError):
+            return None
+        return posicion if 0 <= posicion < self.numero_documentos else None
+
+    def registro(self, posicion: int) -> tuple:
+        """los valores de la fila en el orden de las columnas (sin pasar por la cache)"""
+        return self._decodificar_registro(posicion)
+
+    def _decodificar_registro(self, posicion: int) -> tuple:
+        inicio, fin = int(self.offsets[posicion]), int(self.offsets[posicion + 1])
+        return tuple(json.loads(self.mapa[inicio:fin].decode('utf-8')))
+
+    def __contains__(self, id_documento) -> bool:
+        return self._posicion(id_documento) is not None
+
+    def __len__(self) -> int:
+        return self.numero_documentos
+
+    def obtener(self, id_documento) -> Optional[Dict]:
+        """la fila como dict columna -> valor (una copia nueva, se puede modificar)"""
+        posicion = self._posicion(id_documento)
+        if posicion is None:
+            return None
+        return dict(zip(self.columnas, self._leer_registro(posicion)))
+
+    def obtener_varios(self, ids_documentos: Iterable) -> Dict[int, Dict]:
+        documentos = {}
+        for id_documento in ids_documentos:
+            registro = self.obtener(id_documento)
+            if registro is not None:
+                documentos[int(id_documento)] = registro
+        return documentos
+
+    def estadisticas(self) -> Dict[str, float]:
+        info = self._leer_registro.cache_info()
+        consultas = info.hits + info.misses
+        return {
+            "aciertos": info.hits,
+            "fallos": info.misses,
+            "tasa_aciertos": round(info.hits / consultas, 4) if consultas else 0.0,
+            "filas_en_cache": info.currsize,
+            "max_filas": info.maxsize,
+        }
+
+    def cerrar(self):
+        self._leer_registro.cache_clear()
+        del self.offsets  # la vista de numpy sobre el mmap debe soltarse antes de cerrarlo
+        self.mapa.close()
+        self.archivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        self.cerrar()
+
+
+def construir_almacen(ruta_csv: str, ruta_salida: str, tamanio_chunk: int = 20000) -> str:
+    escritor = None
+    for chunk in pd.read_csv(ruta_csv, chunksize=tamanio_chunk, encoding='utf-8'):
+        if escritor is None:
+            escritor = EscritorAlmacenDocumentos(ruta_salida, chunk.columns)
+        escritor.agregar_chunk(chunk)
+    if escritor is not None:
+        escritor.cerrar()
+        print(f"almacen de documentos guardado en {ruta_salida} ({len(escritor.offsets) - 1} documentos)")
+    return ruta_salida
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    # uso: python -m app.AlmacenDocumentos <archivo.csv> <ruta_indice>
+    # para indices construidos antes de que la construccion generara documentos.bin
+    construir_almacen(sys.argv[1], os.path.join(sys.argv[2], NOMBRE_ALMACEN))
@@ -0,0 +1,125 @@
+import re
+import nltk
+from functools import lru_cache
+from typing import Dict, Iterable, List
+from nltk.stem import SnowballStemmer
+
+# ANALIZADOR DE TEXTO COMPARTIDO
+# minusculas -> tokens (como nltk.word_tokenize) -> strip -> stopwords -> stem de snowball.
+# lo usan la construccion del indice, el motor de consulta, el calculo de pesos y los scripts de stoplist,
+# asi que un termino se analiza igual al indexar que al consultar
+#
+# modo 'regex': los textos que solo tienen letras, numeros, espacios, puntuacion simple (, ; ? ! ' y
+# parentesis) y a lo mas un punto al final se tokenizan con las mismas reglas de nltk pero sin el separador
+# de oraciones punkt ni las reglas que no pueden aplicar; cualquier otro texto (puntos en medio, comillas,
+# guiones, emojis...) pasa por nltk.word_tokenize, asi que la salida es la misma que con el modo 'nltk'
+
+MAX_STEMS = 100000  # entradas de la cache de stems; las letras repiten unas pocas miles de palabras
+
+# contracciones que nltk separa aunque no haya apostrofe (CONTRACTIONS2 de nltk)
+_CONTRACCIONES = {
+    "cannot": ["can", "not"],
+    "gimme": ["gim", "me"],
+    "gonna": ["gon", "na"],
+    "gotta": ["got", "ta"],
+    "lemme": ["lem", "me"],
+    "wanna": ["wan", "na"],
+}
+
+_SOLO_PALABRAS = re.compile(r"[\w\s]*")
+_PUNTUACION_SIMPLE = re.compile(r"[\w\s,;?!()\[\]{}']*")
+
+# reglas de NLTKWordTokenizer que pueden aplicar a un texto con _PUNTUACION_SIMPLE, en el mismo orden;
+# cada regla lleva las subcadenas sin las que no puede aplicar, para no pasar el regex en vano
+_REGLAS_ANTES_DE_RELLENO = [
+    (re.compile(r"(?i)(?<!\w)(\')(?!(?:re|ve|ll|m|t|s|d|n)\b)(?=\w)"), r"\1 ", ("'",)),
+    (re.compile(r"([^\.])(\.)([\]\)}>\"\'»”’ ]*)\s*$"), r"\1 \2 \3 ", (".",)),
+    (re.compile(r"([:,])([^\d])"), r" \1 \2", (",",)),
+    (re.compile(r"([:,])$"), r" \1 ", (",",)),
+    (re.compile(r"[;?!]"), r" \g<0> ", (";", "?", "!")),
+    (re.compile(r"([^'])' "), r"\1 ' ", ("' ",)),
+    (re.compile(r"[\]\[\(\)\{\}]"), r" \g<0> ", ("(", ")", "[", "]", "{", "}")),
+]
+# despues del relleno nltk reemplaza \s+ por un espacio; eso se hace con split/join antes de estas reglas
+_REGLAS_DESPUES_DE_RELLENO = [
+    (re.compile(r"([^' ])('[sS]|'[mM]|'[dD]|') "), r"\1 \2 ", ("'",)),
+    (re.compile(r"([^' ])('ll|'LL|'re|'RE|'ve|'VE|n't|N'T) "), r"\1 \2 ", ("'",)),
+    (re.compile(r"(?i)\b(can)(not)\b"), r" \1 \2 ", ("cannot",)),
+    (re.compile(r"(?i)\b(d)('ye)\b"), r" \1 \2 ", ("d'ye",)),
+    (re.compile(r"(?i)\b(gim)(me)\b"), r" \1 \2 ", ("gimme",)),
+    (re.compile(r"(?i)\b(gon)(na)\b"), r" \1 \2 ", ("gonna",)),
+    (re.compile(r"(?i)\b(got)(ta)\b"), r" \1 \2 ", ("gotta",)),
+    (re.compile(r"(?i)\b(lem)(me)\b"), r" \1 \2 ", ("lemme",)),
+    (re.compile(r"(?i)\b(more)('n)\b"), r" \1 \2 ", ("more'n",)),
+    (re.compile(r"(?i)\b(wan)(na)(?=\s)"), r" \1 \2 ", ("wanna",)),
+    (re.compile(r"(?i) ('t)(is)\b"), r" \1 \2 ", ("'tis",)),
+    (re.compile(r"(?i) ('t)(was)\b"), r" \1 \2 ", ("'twas",)),
+]
+
+
+def _aplicar(reglas, texto: str) -> str:
+    for regla, reemplazo, disparadores in reglas:
+        for disparador in disparadores:
+            if disparador in texto:
+                texto = regla.sub(reemplazo, texto)
+                break
+    return texto
+
+
+class Analizador:
+    """tokenizacion, filtrado de stopwords y stemming con cache"""
+
+    def __init__(self, stopwords: Iterable[str] = (), modo_tokenizador: str = 'regex', max_stems: int = MAX_STEMS,
+                 idioma: str = 'spanish'):
+        if modo_tokenizador not in ('regex', 'nltk'):
+            raise ValueError(f"modo de tokenizador desconocido: {modo_tokenizador}")
+        # se guarda la referencia: si el llamador agrega stopwords despues, el analizador las ve
+        self.stopwords = stopwords if isinstance(stopwords, set) else set(stopwords)
+        self.modo_tokenizador = modo_tokenizador
+        self.stemmer = SnowballStemmer(idioma)
+        self.lematizar = lru_cache(maxsize=max_stems)(self.stemmer.stem)
+        self.textos_rapidos = 0
+        self.textos_nltk = 0
+
+    def tokenizar(self, texto: str) -> List[str]:
+        """tokens del texto en minusculas, igual que nltk.word_tokenize(texto.lower())"""
+        texto = texto.lower()
+        if self.modo_tokenizador == 'regex':
+            if _SOLO_PALABRAS.fullmatch(texto):
+                self.textos_rapidos += 1
+                tokens = []
+                for palabra in texto.split():
+                    separada = _CONTRACCIONES.get(palabra)
+                    if separada is None:
+                        tokens.append(palabra)
+                    else:
+                        tokens.extend(separada)
+                return tokens
+            cuerpo = texto.rstrip()
+            if cuerpo.endswith("."):
+                cuerpo = cuerpo[:-1]  # con un solo punto al final punkt no parte nada en medio
+            if "''" not in texto and _PUNTUACION_SIMPLE.fullmatch(cuerpo):
+                self.textos_rapidos += 1
+                texto = _aplicar(_REGLAS_ANTES_DE_RELLENO, texto)
+                texto = " " + " ".join(texto.split()) + " "
+                return _aplicar(_REGLAS_DESPUES_DE_RELLENO, texto).split()
+        self.textos_nltk += 1
+        return nltk.word_tokenize(texto)
+
+    def analizar(self, texto: str) -> List[str]:
+        """stems de los tokens que no son stopwords, en orden de aparicion"""
+        stopwords = self.stopwords
+        lematizar = self.lematizar
+        return [lematizar(token) for token in map(str.strip, self.tokenizar(texto)) if token not in stopwords]
+
+    def estadisticas(self) -> Dict[str, float]:
+        info = self.lematizar.cache_info()
+        consultas = info.hits + info.misses
+        return {
+            "textos_rapidos": self.textos_rapidos,
+            "textos_nltk": self.textos_nltk,
+            "aciertos_stems": info.hits,
+            "fallos_stems": info.misses,
+            "tasa_aciertos_stems": round(info.hits / consultas, 4) if consultas else 0.0,
+            "stems_en_cache": info.currsize,
+        }
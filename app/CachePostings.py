@@ -0,0 +1,59 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+
+class CachePostingsLRU:
+    """cache LRU de listas de postings ya decodificadas, acotada por numero total de postings
+
+    el limite es por postings y no por terminos porque una lista de un termino frecuente
+    puede pesar lo mismo que miles de listas de terminos raros
+    """
+
+    def __init__(self, max_postings: int = 200000):
+        self.max_postings = max_postings
+        self.entradas = OrderedDict()
+        self.postings_en_cache = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.candado = threading.Lock()  # el servidor de flask atiende peticiones en hilos
+
+    def obtener(self, termino: str, cargar: Callable[[str], Optional[Dict]]) -> Optional[Dict]:
+        with self.candado:
+            postings = self.entradas.get(termino)
+            if postings is not None:
+                self.entradas.move_to_end(termino)
+                self.aciertos += 1
+                return postings
+            self.fallos += 1
+        postings = cargar(termino)
+        if postings is None or len(postings) > self.max_postings:
+            return postings  # listas mas grandes que toda la cache no se guardan
+        with self.candado:
+            if termino not in self.entradas:
+                self.entradas[termino] = postings
+                self.postings_en_cache += len(postings)
+                while self.postings_en_cache > self.max_postings:
+                    _, desalojado = self.entradas.popitem(last=False)
+                    self.postings_en_cache -= len(desalojado)
+                    self.desalojos += 1
+        return postings
+
+    def limpiar(self):
+        with self.candado:
+            self.entradas.clear()
+            self.postings_en_cache = 0
+
+    def estadisticas(self) -> Dict[str, float]:
+        with self.candado:
+            consultas = self.aciertos + self.fallos
+            return {
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else 0.0,
+                "desalojos": self.desalojos,
+                "terminos_en_cache": len(self.entradas),
+                "postings_en_cache": self.postings_en_cache,
+                "max_postings": self.max_postings,
+            }
@@ -0,0 +1,87 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+# CACHE DE RESULTADOS DE BUSQUEDA
+# la clave es la salida de procesar_consulta (terminos lematizados con su peso, en orden) mas el top_k,
+# asi "Feel Alive" y "feel alive!" comparten entrada. el orden de los terminos se conserva porque
+# decide el desempate del ranking. cada entrada recuerda la version del indice con la que se calculo:
+# si el motor cambia de version la cache se vacia entera
+
+
+def clave_resultados(terminos_consulta: Dict[str, float], top_k: int) -> Tuple:
+    return tuple(terminos_consulta.items()), top_k
+
+
+class CacheResultadosLRU:
+    """cache LRU con vencimiento (TTL) de los resultados de buscar, acotada por numero de entradas"""
+
+    def __init__(self, max_entradas: int = 2048, ttl_segundos: float = 300.0,
+                 reloj: Callable[[], float] = time.monotonic):
+        self.max_entradas = max_entradas
+        self.ttl_segundos = ttl_segundos
+        self.reloj = reloj
+        self.entradas = OrderedDict()  # clave -> (resultados, vence)
+        self.version = None
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.vencidas = 0
+        self.invalidaciones = 0
+        self.candado = threading.Lock()  # el servidor de flask atiende peticiones en hilos
+
+    def _comprobar_version(self, version: Hashable):
+        if version != self.version:
+            if self.entradas:
+                self.invalidaciones += 1
+            self.entradas.clear()
+            self.version = version
+
+    def obtener(self, clave: Hashable, version: Hashable) -> Optional[Dict[str, Dict]]:
+        """los resultados guardados (una copia nueva) o None si no estan, vencieron o son de otra version"""
+        with self.candado:
+            self._comprobar_version(version)
+            entrada = self.entradas.get(clave)
+            if entrada is not None and entrada[1] <= self.reloj():
+                del self.entradas[clave]
+                self.vencidas += 1
+                entrada = None
+            if entrada is None:
+                self.fallos += 1
+                return None
+            self.entradas.move_to_end(clave)
+            self.aciertos += 1
+            resultados = entrada[0]
+        return {doc_id: dict(registro) for doc_id, registro in resultados.items()}
+
+    def guardar(self, clave: Hashable, version: Hashable, resultados: Dict[str, Dict]):
+        if self.max_entradas <= 0:
+            return
+        copia = {doc_id: dict(registro) for doc_id, registro in resultados.items()}
+        with self.candado:
+            self._comprobar_version(version)
+            self.entradas[clave] = (copia, self.reloj() + self.ttl_segundos)
+            self.entradas.move_to_end(clave)
+            while len(self.entradas) > self.max_entradas:
+                self.entradas.popitem(last=False)
+                self.desalojos += 1
+
+    def limpiar(self):
+        with self.candado:
+            self.entradas.clear()
+
+    def estadisticas(self) -> Dict[str, float]:
+        with self.candado:
+            consultas = self.aciertos + self.fallos
+            return {
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else 0.0,
+                "desalojos": self.desalojos,
+                "vencidas": self.vencidas,
+                "invalidaciones": self.invalidaciones,
+                "entradas": len(self.entradas),
+                "max_entradas": self.max_entradas,
+                "ttl_segundos": self.ttl_segundos,
+            }
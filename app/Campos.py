@@ -0,0 +1,247 @@
+import os
+import json
+import math
+import threading
+import numpy as np
+import pandas as pd
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+from .Analizador import Analizador
+from .FusionExterna import fusionar_indices_parciales, MEMORIA_MAXIMA
+from .IndiceBinario import LectorIndiceBinario, guardar_indice_binario, decodificar_arreglos
+from .MatrizDispersa import _top_k_fila
+
+# INDICE POR CAMPOS (OPCIONAL): LOS PESOS DE LOS CAMPOS SE ELIGEN EN CONSULTA
+# indice_final.bin lleva los pesos de pesos_campos.json metidos en cada posting (log10(1 + suma peso·tf)),
+# asi que probar otros pesos era reconstruir el indice. con IndiceInvertido(..., por_campos=True) se guarda
+# ademas el directorio campos/ con:
+#   <campo>.bin     un indice binario por campo de texto con la frecuencia cruda del termino (escala 1)
+#   longitudes.npy  terminos de cada campo por documento (uint32, filas = ids, columnas = campos)
+#   campos.json     los campos y los pesos de la construccion (los que se usan si no se piden otros)
+# en consulta los campos se combinan con los pesos que se pidan, con dos modelos:
+#   'coseno'  el mismo de rankear: log10(1 + suma peso_c·tf_c), idf y norma del documento. la norma no se
+#             puede armar barato para pesos cualquiera (el log va sobre la suma de los campos), asi que solo
+#             acepta los pesos de la construccion; sus normas se calculan una vez, en una pasada por los campos
+#   'bm25f'   tf~ = suma peso_c·tf_c / (1 - b + b·long_c / media_c), puntaje = suma idf·tf~·(k1 + 1) / (k1 + tf~)
+#             no usa normas, asi que cambiar los pesos no cuesta nada: es el modelo para pesos por consulta
+# solo se abren y leen los indices de los campos con peso: buscar solo por titulo lee solo track_name.bin
+
+CAMPOS_TEXTO = ("track_name", "track_artist", "lyrics", "playlist_name")
+DIRECTORIO_CAMPOS = "campos"
+NOMBRE_LONGITUDES = "longitudes.npy"
+NOMBRE_MANIFIESTO_CAMPOS = "campos.json"
+MODELOS = ('coseno', 'bm25f')
+K1 = 1.2
+B = 0.75
+
+
+def columnas_campos(columnas) -> List[Tuple[int, str]]:
+    """(posicion en el csv, nombre) de los campos de texto que tiene el csv"""
+    return [(posicion, nombre) for posicion, nombre in enumerate(columnas) if nombre in CAMPOS_TEXTO]
+
+
+def frecuencias_campos_chunk(chunk: pd.DataFrame,
+                             analizador: Analizador) -> Tuple[Dict[str, Dict[str, Dict[int, int]]], np.ndarray]:
+    """{campo: {termino: {id_documento: tf}}} de un chunk y la longitud de cada campo por fila (filas x campos)"""
+    ids_documentos = [int(indice) for indice in chunk.index]
+    campos = columnas_campos(chunk.columns)
+    longitudes = np.zeros((len(ids_documentos), len(campos)), dtype=np.uint32)
+    frecuencias = {}
+    for columna, (posicion, campo) in enumerate(campos):
+        indice = defaultdict(dict)
+        contados = {}  # texto -> (tf por termino, longitud); artistas y playlists se repiten mucho
+        for fila, (id_documento, texto) in enumerate(zip(ids_documentos, chunk.iloc[:, posicion].tolist())):
+            texto = str(texto)
+            conteo = contados.get(texto)
+            if conteo is None:
+                terminos = analizador.analizar(texto)
+                conteo = contados[texto] = (Counter(terminos), len(terminos))
+            for termino, tf in conteo[0].items():
+                indice[termino][id_documento] = tf
+            longitudes[fila, columna] = conteo[1]
+        frecuencias[campo] = indice
+    return frecuencias, longitudes
+
+
+def ruta_campo_parcial(directorio: str, campo: str, numero_chunk: int) -> str:
+    return os.path.join(directorio, f"{campo}_parcial_{numero_chunk}.bin")
+
+
+def guardar_campos_parcial(frecuencias: Dict[str, Dict[str, Dict[int, int]]], directorio: str,
+                           numero_chunk: int) -> Dict[str, str]:
+    """un parcial por campo (tf enteros, escala 1); devuelve {campo: ruta}"""
+    rutas = {}
+    for campo, indice in frecuencias.items():
+        rutas[campo] = ruta_campo_parcial(directorio, campo, numero_chunk)
+        guardar_indice_binario(indice, rutas[campo], escala=1)
+    return rutas
+
+
+def fusionar_campos(rutas_parciales: Dict[str, List[str]], directorio: str,
+                    memoria_maxima: int = MEMORIA_MAXIMA):
+    """fusiona los parciales de cada campo en <campo>.bin y los borra"""
+    for campo, rutas in rutas_parciales.items():
+        fusionar_indices_parciales(rutas, os.path.join(directorio, f"{campo}.bin"), memoria_maxima, escala=1)
+        for ruta in rutas:
+            os.remove(ruta)
+
+
+def convertir_longitudes(ruta_temporal: str, ruta_longitudes: str, numero_campos: int,
+                         tamanio_bloque: int = 1 << 20) -> int:
+    """longitudes.npy desde el archivo temporal de filas uint32 seguidas, por bloques como las normas"""
+    total = os.path.getsize(ruta_temporal) // (4 * numero_campos) if numero_campos else 0
+    longitudes = np.lib.format.open_memmap(ruta_longitudes, mode='w+', dtype=np.uint32,
+                                           shape=(total, numero_campos))
+    with open(ruta_temporal, 'rb') as archivo:
+        for inicio in range(0, total, tamanio_bloque):
+            filas = min(tamanio_bloque, total - inicio)
+            bloque = np.fromfile(archivo, dtype='<u4', count=filas * numero_campos)
+            longitudes[inicio:inicio + filas] = bloque.reshape(filas, numero_campos)
+    longitudes.flush()
+    del longitudes
+    return total
+
+
+def guardar_manifiesto_campos(directorio: str, campos: List[str], pesos: Dict[str, float]):
+    with open(os.path.join(directorio, NOMBRE_MANIFIESTO_CAMPOS), 'w', encoding='utf-8') as archivo:
+        json.dump({"campos": campos, "pesos": pesos}, archivo)
+
+
+def _sumar_por_documento(ids: np.ndarray, valores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # ids ordenados sin repetidos con la suma de sus valores
+    if not len(ids):
+        return ids, valores
+    if len(ids) > 1 and not (ids[1:] > ids[:-1]).all():
+        orden = np.argsort(ids, kind='stable')
+        ids, valores = ids[orden], valores[orden]
+    inicios = np.flatnonzero(np.diff(ids, prepend=-1))
+    return ids[inicios], np.add.reduceat(valores, inicios)
+
+
+class IndiceCampos:
+    """lee el directorio campos/ y puntua con pesos de campo elegidos en cada consulta"""
+
+    def __init__(self, ruta_indice: str):
+        self.directorio = os.path.join(ruta_indice, DIRECTORIO_CAMPOS)
+        with open(os.path.join(self.directorio, NOMBRE_MANIFIESTO_CAMPOS), 'r', encoding='utf-8') as archivo:
+            manifiesto = json.load(archivo)
+        self.campos = manifiesto["campos"]
+        self.pesos = {campo: float(peso) for campo, peso in manifiesto["pesos"].items() if peso > 0}
+        self.longitudes = np.load(os.path.join(self.directorio, NOMBRE_LONGITUDES), mmap_mode='r')
+        self.numero_documentos = len(self.longitudes)
+        self.lectores = {}  # se abren al primer uso de cada campo
+        self.medias = {}
+        self.normas = None  # normas del modelo coseno con los pesos de la construccion, al primer uso
+        self.candado = threading.Lock()
+
+    def validar_pesos(self, pesos: Dict[str, float] = None, modelo: str = 'coseno') -> Dict[str, float]:
+        """los campos con peso mayor que cero; sin pesos, los de la construccion. ValueError si no sirven
+        (en 'coseno' tambien si no son los de la construccion)"""
+        if pesos is None:
+            return dict(self.pesos)
+        if not isinstance(pesos, dict):
+            raise ValueError("los pesos de campo van como {campo: peso}")
+        desconocidos = [campo for campo in pesos if campo not in self.campos]
+        if desconocidos:
+            raise ValueError(f"campos desconocidos: {desconocidos} (hay {self.campos})")
+        validos = {}
+        for campo in self.campos:  # en el orden del indice, asi la clave de cache no depende del pedido
+            peso = pesos.get(campo, 0)
+            if isinstance(peso, bool) or not isinstance(peso, (int, float)) or not math.isfinite(peso) or peso < 0:
+                raise ValueError(f"el peso de {campo} debe ser un numero no negativo")
+            if peso > 0:
+                validos[campo] = float(peso)
+        if not validos:
+            raise ValueError("hace falta al menos un campo con peso mayor que cero")
+        if modelo == 'coseno' and validos != self.pesos:
+            raise ValueError(f"el modelo coseno solo usa los pesos de la construccion {self.pesos}; "
+                             f"para otros pesos use el modelo 'bm25f'")
+        return validos
+
+    def _lector(self, campo: str) -> LectorIndiceBinario:
+        lector = self.lectores.get(campo)
+        if lector is None:
+            with self.candado:
+                lector = self.lectores.get(campo)
+                if lector is None:
+                    lector = LectorIndiceBinario(os.path.join(self.directorio, f"{campo}.bin"), usar_mmap=True)
+                    columna = self.longitudes[:, self.campos.index(campo)]
+                    self.medias[campo] = float(columna.mean()) if len(columna) else 0.0
+                    self.lectores[campo] = lector
+        return lector
+
+    def _frecuencias(self, termino: str, pesos: Dict[str, float], modelo: str, b: float):
+        # (ids, suma peso·tf de los campos) del termino; en bm25f cada tf va normalizado por la longitud del campo
+        ids_campos, valores = [], []
+        for campo, peso in pesos.items():
+            lector = self._lector(campo)
+            if termino not in lector:
+                continue
+            ids, tfs = decodificar_arreglos(lector.leer_bytes(termino), lector.escala)
+            if modelo == 'bm25f' and self.medias[campo] > 0:
+                longitudes = self.longitudes[ids, self.campos.index(campo)]
+                tfs = tfs / (1 - b + b * longitudes / self.medias[campo])
+            ids_campos.append(ids)
+            valores.append(peso * tfs)
+        if not ids_campos:
+            return None
+        return _sumar_por_documento(np.concatenate(ids_campos), np.concatenate(valores))
+
+    def top_k(self, terminos_consulta: Dict[str, float], pesos: Dict[str, float], modelo: str = 'coseno',
+              top_k: int = 10, k1: float = K1, b: float = B) -> List[Tuple[int, float]]:
+        """top k con los pesos de campo dados (ya validados); terminos_consulta es {termino: peso en la consulta}"""
+        if modelo not in MODELOS:
+            raise ValueError(f"modelo desconocido: {modelo} (puede ser {', '.join(MODELOS)})")
+        if not self.numero_documentos:
+            return []
+        ids_terminos, puntajes_terminos = [], []
+        for termino, frecuencia_q in terminos_consulta.items():
+            frecuencias = self._frecuencias(termino, pesos, modelo, b)
+            if frecuencias is None:
+                continue
+            ids, tf = frecuencias
+            df = len(ids)  # documentos con el termino en alguno de los campos pedidos
+            if modelo == 'bm25f':
+                idf = math.log(1 + (self.numero_documentos - df + 0.5) / (df + 0.5))
+                puntajes = frecuencia_q * idf * tf * (k1 + 1) / (k1 + tf)
+            else:
+                puntajes = frecuencia_q * math.log10(self.numero_documentos / df) * np.log10(1 + tf)
+            ids_terminos.append(ids)
+            puntajes_terminos.append(puntajes)
+        if not ids_terminos:
+            return []
+        ids, puntajes = _sumar_por_documento(np.concatenate(ids_terminos), np.concatenate(puntajes_terminos))
+        if modelo == 'coseno':
+            normas = self.normas_coseno()[ids].astype(np.float64)
+            norma_consulta = math.sqrt(sum(frecuencia ** 2 for frecuencia in terminos_consulta.values()))
+            validos = normas > 0
+            puntajes = np.where(validos, puntajes / np.where(validos, normas, 1) / norma_consulta, 0.0)
+        return _top_k_fila(ids, puntajes, top_k)
+
+    def normas_coseno(self) -> np.ndarray:
+        """normas con los pesos de la construccion: sqrt(suma de log10(1 + suma peso·tf)^2), como normas.npy"""
+        with self.candado:
+            if self.normas is not None:
+                return self.normas
+        # cada posting de cada campo va a su par (termino, documento); los pares se suman entre campos
+        vocabulario = {}
+        claves, valores = [], []
+        for campo, peso in self.pesos.items():
+            dfs, ids, tfs = self._lector(campo).arreglos()
+            numeros = np.fromiter((vocabulario.setdefault(termino, len(vocabulario))
+                                   for termino in self.lectores[campo].diccionario), dtype=np.int64, count=len(dfs))
+            claves.append(np.repeat(numeros, dfs) * self.numero_documentos + ids)
+            valores.append(peso * tfs)
+        pares, tf = _sumar_por_documento(np.concatenate(claves), np.concatenate(valores))
+        sumas = np.bincount(pares % self.numero_documentos, weights=np.log10(1 + tf) ** 2,
+                            minlength=self.numero_documentos)
+        normas = np.round(np.sqrt(sumas), 3).astype(np.float32)
+        with self.candado:
+            self.normas = normas
+        return normas
+
+    def cerrar(self):
+        for lector in self.lectores.values():
+            lector.cerrar()
+        self.lectores = {}
@@ -0,0 +1,187 @@
+import re
+import numpy as np
+from typing import Callable, List, Optional, Tuple
+
+from .Analizador import Analizador
+
+# CONSULTAS BOOLEANAS: AND, OR, NOT, PARENTESIS Y FRASES ENTRE COMILLAS
+#   amor AND "feel alive" OR (luna NOT sol)
+# los operadores van en mayusculas ("not" o "and" en minusculas son palabras de la letra); entre dos
+# terminos sin operador va AND. precedencia: NOT, luego AND, luego OR. como en lucene, NOT solo resta:
+# una consulta (o un grupo) sin ninguna parte positiva no devuelve documentos.
+#
+# el arbol es de tuplas, asi sirve de clave en la cache de resultados:
+#   ('termino', t)  ('frase', (t1, t2, ...))  ('y', (hijos...))  ('o', (hijos...))  ('no', hijo)
+# se evalua sobre listas de ids de documento ordenadas (np.int64). un AND procesa sus hijos de menor a
+# mayor df y corta en cuanto queda vacio; cada interseccion busca los ids de la lista chica en la grande
+# con busqueda binaria (galloping vectorizado), saltando la parte de la lista grande que queda fuera
+# del rango de la chica
+
+_TOKENS = re.compile(r'"[^"]*"?|\(|\)|[^\s()"]+')
+VACIA = np.zeros(0, dtype=np.int64)
+
+
+def intersectar(primera: np.ndarray, segunda: np.ndarray) -> np.ndarray:
+    """interseccion de dos listas ordenadas y sin repetidos"""
+    menor, mayor = (primera, segunda) if len(primera) <= len(segunda) else (segunda, primera)
+    if not len(menor) or not len(mayor):
+        return VACIA
+    # salto: solo el tramo de la lista grande entre el primer y el ultimo id de la chica
+    mayor = mayor[np.searchsorted(mayor, menor[0]):np.searchsorted(mayor, menor[-1], side='right')]
+    if not len(mayor):
+        return VACIA
+    lugares = np.minimum(np.searchsorted(mayor, menor), len(mayor) - 1)
+    return menor[mayor[lugares] == menor]
+
+
+def unir(listas: List[np.ndarray]) -> np.ndarray:
+    """union de listas ordenadas, ordenada y sin repetidos"""
+    listas = [lista for lista in listas if len(lista)]
+    if len(listas) <= 1:
+        return listas[0] if listas else VACIA
+    todos = np.sort(np.concatenate(listas))
+    return todos[np.flatnonzero(np.diff(todos, prepend=-1))]
+
+
+def restar(lista: np.ndarray, quitar: np.ndarray) -> np.ndarray:
+    """los ids de lista que no estan en quitar (las dos ordenadas)"""
+    if not len(lista) or not len(quitar):
+        return lista
+    lugares = np.minimum(np.searchsorted(quitar, lista), len(quitar) - 1)
+    return lista[quitar[lugares] != lista]
+
+
+class _Parser:
+    def __init__(self, tokens: List[str], analizador: Analizador):
+        self.tokens = tokens
+        self.posicion = 0
+        self.analizador = analizador
+
+    def _siguiente(self) -> Optional[str]:
+        return self.tokens[self.posicion] if self.posicion < len(self.tokens) else None
+
+    def o(self):
+        hijos = [self.y()]
+        while self._siguiente() == "OR":
+            self.posicion += 1
+            hijos.append(self.y())
+        return _grupo('o', hijos)
+
+    def y(self):
+        hijos = [self.unario()]
+        while self._siguiente() not in (None, ")", "OR"):
+            if self._siguiente() == "AND":
+                self.posicion += 1
+            hijos.append(self.unario())
+        return _grupo('y', hijos)
+
+    def unario(self):
+        token = self._siguiente()
+        if token is None or token in (")", "AND", "OR"):
+            raise ValueError(f"se esperaba un termino en la posicion {self.posicion + 1} de la consulta")
+        self.posicion += 1
+        if token == "NOT":
+            hijo = self.unario()
+            return None if hijo is None else ('no', hijo)
+        if token == "(":
+            nodo = self.o()
+            if self._siguiente() != ")":
+                raise ValueError("falta cerrar un parentesis")
+            self.posicion += 1
+            return nodo
+        if token.startswith('"'):
+            if len(token) < 2 or not token.endswith('"'):
+                raise ValueError("faltan cerrar las comillas")
+            return _hoja(self.analizador.analizar(token[1:-1]))
+        return _hoja(self.analizador.analizar(token))
+
+
+def _hoja(terminos: List[str]):
+    # una palabra puede dar varios terminos (contracciones): se tratan como frase
+    if not terminos:
+        return None  # stopword
+    return ('termino', terminos[0]) if len(terminos) == 1 else ('frase', tuple(terminos))
+
+
+def _grupo(tipo: str, hijos: list):
+    hijos = tuple(hijo for hijo in hijos if hijo is not None)
+    if len(hijos) <= 1:
+        return hijos[0] if hijos else None
+    return tipo, hijos
+
+
+def analizar_consulta_booleana(consulta: str, analizador: Analizador):
+    """arbol de la consulta con los terminos ya analizados, o None si solo tenia stopwords
+
+    ValueError si la consulta esta mal formada (parentesis o comillas sin cerrar, operador sin termino)
+    """
+    tokens = _TOKENS.findall(consulta)
+    if not tokens:
+        return None
+    parser = _Parser(tokens, analizador)
+    arbol = parser.o()
+    if parser.posicion < len(tokens):
+        raise ValueError(f"sobra '{tokens[parser.posicion]}' en la consulta")
+    return arbol
+
+
+def terminos_positivos(arbol) -> List[str]:
+    """terminos que no estan bajo un NOT, en orden de aparicion (con repeticiones): son los que puntuan"""
+    if arbol is None or arbol[0] == 'no':
+        return []
+    if arbol[0] == 'termino':
+        return [arbol[1]]
+    if arbol[0] == 'frase':
+        return list(arbol[1])
+    return [termino for hijo in arbol[1] for termino in terminos_positivos(hijo)]
+
+
+def _estimar(nodo, df: Callable[[str], int]) -> int:
+    # cota del numero de documentos del nodo, sin leer postings
+    tipo = nodo[0]
+    if tipo == 'termino':
+        return df(nodo[1])
+    if tipo == 'frase':
+        return min(df(termino) for termino in nodo[1])
+    if tipo == 'no':
+        return 0
+    if tipo == 'o':
+        return sum(_estimar(hijo, df) for hijo in nodo[1] if hijo[0] != 'no')
+    positivos = [_estimar(hijo, df) for hijo in nodo[1] if hijo[0] != 'no']
+    return min(positivos) if positivos else 0
+
+
+def evaluar(arbol, ids_termino: Callable[[str], np.ndarray], df: Callable[[str], int],
+            ids_frase: Callable[[Tuple[str, ...]], np.ndarray]) -> np.ndarray:
+    """ids ordenados de los documentos que cumplen la consulta
+
+    ids_termino da la lista ordenada de un termino, df su numero de documentos (barato, sin decodificar)
+    e ids_frase la lista de una frase
+    """
+    if arbol is None:
+        return VACIA
+    tipo = arbol[0]
+    if tipo == 'termino':
+        return ids_termino(arbol[1])
+    if tipo == 'frase':
+        return ids_frase(arbol[1])
+    if tipo == 'no':
+        return VACIA  # NOT sin parte positiva
+    if tipo == 'o':
+        return unir([evaluar(hijo, ids_termino, df, ids_frase) for hijo in arbol[1]])
+
+    positivos = sorted((hijo for hijo in arbol[1] if hijo[0] != 'no'), key=lambda hijo: _estimar(hijo, df))
+    negativos = sorted((hijo[1] for hijo in arbol[1] if hijo[0] == 'no'), key=lambda hijo: -_estimar(hijo, df))
+    if not positivos:
+        return VACIA
+    resultado = evaluar(positivos[0], ids_termino, df, ids_frase)
+    for hijo in positivos[1:]:
+        if not len(resultado):
+            return resultado
+        resultado = intersectar(resultado, evaluar(hijo, ids_termino, df, ids_frase))
+    # los NOT de lista mas grande primero: son los que mas pueden vaciar el resultado
+    for hijo in negativos:
+        if not len(resultado):
+            break
+        resultado = restar(resultado, evaluar(hijo, ids_termino, df, ids_frase))
+    return resultado
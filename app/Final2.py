@@ -1,16 +1,57 @@
 import os
 import io
+import sys
 import json
 import math
+import time
+import logging
+import threading
+import numpy as np
 import pandas as pd
 import nltk
-from nltk.stem import SnowballStemmer
-from collections import defaultdict
-from typing import Dict
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple, Union
+from .IndiceBinario import guardar_indice_binario, LectorIndiceBinario
+from .FusionExterna import fusionar_indices_parciales, MEMORIA_MAXIMA, NOMBRE_INDICE_FINAL
+from .CachePostings import CachePostingsLRU
+from .CacheResultados import CacheResultadosLRU, clave_resultados
+from .TopK import top_k_maxscore, top_k_exhaustivo
+from .Impactos import calcular_impactos, NOMBRE_INDICE_IMPACTOS
+from .Analizador import Analizador
+from .AlmacenDocumentos import AlmacenDocumentos, EscritorAlmacenDocumentos, NOMBRE_ALMACEN
+from .Normas import convertir_sumas_a_normas, cargar_normas, NOMBRE_NORMAS
+from .MatrizDispersa import MatrizTerminoDocumento, scipy_disponible
+from .Segmentos import VistaSegmentos, leer_manifiesto, NOMBRE_MANIFIESTO
+from .ConsultaBooleana import analizar_consulta_booleana, terminos_positivos, evaluar, VACIA
+from .Posiciones import (posiciones_chunk, guardar_posiciones, fusionar_posiciones, LectorPosiciones,
+                         NOMBRE_INDICE_POSICIONES)
+from .Snapshot import abrir_snapshot, NOMBRE_STOPLIST
+from .Campos import (frecuencias_campos_chunk, guardar_campos_parcial, fusionar_campos, convertir_longitudes,
+                     guardar_manifiesto_campos, columnas_campos, IndiceCampos, DIRECTORIO_CAMPOS,
+                     NOMBRE_LONGITUDES, NOMBRE_MANIFIESTO_CAMPOS)
+from .Trigramas import IndiceTrigramas, distancia_maxima, MAX_EXPANSIONES, PESO_POR_EDICION
+from .Sugerencias import contar_textos, guardar_sugerencias, IndiceSugerencias, NOMBRE_SUGERENCIAS, MAX_SUGERENCIAS
+from .Metricas import etapa
 
-nltk.download('punkt')
+try:
+    import psutil
+except ImportError:  # psutil es opcional: sin el, el buffer de postings usa un presupuesto fijo
+    psutil = None
+
+try:  # nltk.download consulta el servidor en cada arranque aunque punkt ya este descargado
+    nltk.data.find('tokenizers/punkt')
+except LookupError:
+    nltk.download('punkt')
 
 TAMANIO_CHUNK = 20000  # numero de chunks asumiendo de que tenmeos 10 % de almacenamiento 
+FRACCION_MEMORIA_BUFFER = 0.1  # de la memoria disponible, para el buffer de postings (la idea de get_chunksize en CHUCKS.PY)
+MEMORIA_BUFFER_POR_DEFECTO = 256 * 1024 * 1024  # sin psutil
+BYTES_POR_FLOAT = sys.getsizeof(1.0)
+BYTES_POR_ENTERO = sys.getsizeof(2 ** 20)
+
+# el motor de consulta (lo que corre en el servidor) escribe con logging; la construccion sigue con print
+log = logging.getLogger(__name__)
 
 
 
@@ -20,24 +61,151 @@ RUTA_INDICE_LOCAL = r"C:\Users\semin\OneDrive\Escritorio\bd2_code\Clonación2\Pr
 RUTA_INDICE_FINAL = r"C:\Users\semin\OneDrive\Escritorio\bd2_code\Clonación2\Proyecto_2_BD2\app\TESING"
 RUTA_ARCHIVO_CSV = r"C:\Users\semin\OneDrive\Escritorio\bd2_code\Clonación2\Proyecto_2_BD2\spotify_songs_filtrado.csv"
 RUTA_STOPLIST = r"C:\Users\semin\BD2\stoplist.csv"
-RUTA_NORMAS = r"C:\Users\semin\OneDrive\Escritorio\bd2_code\Clonación2\Proyecto_2_BD2\app\TESING\normas.json"
+RUTA_NORMAS = r"C:\Users\semin\OneDrive\Escritorio\bd2_code\Clonación2\Proyecto_2_BD2\app\TESING\normas.npy"
 RUTA_PESOS_CAMPO = r"C:\Users\semin\OneDrive\Escritorio\bd2_code\Clonación2\Proyecto_2_BD2\app\TESING\pesos_campos.json"  # Ruta para los pesos preprocesados
 
 
 
+def indexar_chunk(chunk: pd.DataFrame, pesos_campos: List[float],
+                  analizador: Analizador) -> Tuple[Dict[str, Dict[int, float]], np.ndarray]:
+    """tokeniza y lematiza un chunk del csv; devuelve su indice parcial y la suma de cuadrados de cada fila
+
+    los ids de documento son enteros: la posicion de la fila en el csv (el indice de los chunks de read_csv).
+
+    se procesa por columnas: solo las que tienen peso distinto de cero, y cada texto repetido dentro del
+    chunk (generos, artistas, playlists) se analiza una sola vez. las frecuencias ponderadas se acumulan
+    con numpy en el mismo orden que el recorrido fila por fila, asi que pesos y normas salen identicos.
+    no toca estado compartido, asi que la usan igual la construccion serial y los procesos del pool
+    """
+    ids_documentos = [int(indice) for indice in chunk.index]
+    normas_documentos = [0] * len(ids_documentos)  # por posicion dentro del chunk
+    indice_invertido = defaultdict(dict)
+    # saltar campos sin pesos definidos y campos con peso cero
+    campos = [(idx_campo, pesos_campos[idx_campo]) for idx_campo in range(min(chunk.shape[1], len(pesos_campos)))
+              if pesos_campos[idx_campo] != 0]
+
+    terminos = {}  # termino -> id dentro del chunk
+    analizados = {}  # texto -> ids de sus terminos
+    documentos, ids_terminos, pesos = [], [], []
+    for idx_campo, peso in campos:
+        listas = []
+        for campo in chunk.iloc[:, idx_campo].tolist():
+            texto = str(campo)
+            lista = analizados.get(texto)
+            if lista is None:
+                lematizados = analizador.analizar(texto)
+                nuevos = [termino for termino in dict.fromkeys(lematizados) if termino not in terminos]
+                terminos.update(zip(nuevos, range(len(terminos), len(terminos) + len(nuevos))))
+                lista = np.fromiter(map(terminos.__getitem__, lematizados), dtype=np.int64, count=len(lematizados))
+                analizados[texto] = lista
+            listas.append(lista)
+        longitudes = np.fromiter((len(lista) for lista in listas), dtype=np.int64, count=len(listas))
+        documentos.append(np.repeat(np.arange(len(listas), dtype=np.int64), longitudes))
+        ids_terminos.append(np.concatenate(listas) if listas else np.zeros(0, dtype=np.int64))
+        pesos.append(np.full(int(longitudes.sum()), peso, dtype=np.float64))
+    if not terminos:
+        return indice_invertido, np.array(normas_documentos, dtype=np.float64)
+
+    # orden fila por fila: documento, luego campo, luego posicion del token (argsort estable)
+    documentos = np.concatenate(documentos)
+    orden = np.argsort(documentos, kind='stable')
+    claves = documentos[orden] * len(terminos) + np.concatenate(ids_terminos)[orden]
+    unicas, primeras, inversa = np.unique(claves, return_index=True, return_inverse=True)
+    # np.add.at suma sin buffer y en orden, igual que frecuencia_terminos[lematizado] += peso
+    frecuencias = np.zeros(len(unicas))
+    np.add.at(frecuencias, inversa, np.concatenate(pesos)[orden])
+
+    # cada documento con sus terminos en orden de primera aparicion, como el dict por fila
+    por_aparicion = np.argsort(primeras, kind='stable')
+    lista_terminos = list(terminos)
+    for clave, frecuencia in zip(unicas[por_aparicion].tolist(), frecuencias[por_aparicion].tolist()):
+        posicion = clave // len(terminos)
+        peso = math.log10(1 + frecuencia)
+        indice_invertido[lista_terminos[clave % len(terminos)]][ids_documentos[posicion]] = peso
+        normas_documentos[posicion] += peso ** 2
+    return indice_invertido, np.array(normas_documentos, dtype=np.float64)
+
+
+def presupuesto_buffer(fraccion: float = FRACCION_MEMORIA_BUFFER) -> int:
+    """bytes para el buffer de postings: una fraccion de la memoria disponible"""
+    if psutil is None:
+        return MEMORIA_BUFFER_POR_DEFECTO
+    return int(psutil.virtual_memory().available * fraccion)
+
+
+def guardar_indice_parcial(indice_invertido: Dict[str, Dict[int, float]], ruta: str, formato_indice: str):
+    if formato_indice == 'binario':
+        guardar_indice_binario(indice_invertido, ruta)
+    else:
+        with open(ruta, 'w', encoding='utf-8') as archivo:
+            json.dump(indice_invertido, archivo)
+
+
+# CONSTRUCCION EN PARALELO
+# cada proceso del pool recibe un chunk, escribe su indice_parcial_N y devuelve solo las normas;
+# pesos y stopwords se pasan una vez por proceso en el inicializador, que arma su propio analizador
+_contexto_proceso = {}
+
+
+def _inicializar_proceso(pesos_campos: List[float], stopwords: set):
+    _contexto_proceso["pesos_campos"] = pesos_campos
+    _contexto_proceso["analizador"] = Analizador(stopwords)
+
+
+def _indexar_chunk_en_proceso(chunk: pd.DataFrame, ruta_parcial: str, formato_indice: str,
+                              ruta_posiciones: str = None, directorio_campos: str = None,
+                              numero_chunk: int = 0) -> Tuple[np.ndarray, Dict[str, str], np.ndarray]:
+    # devuelve las normas y, con el indice por campos, las rutas de sus parciales y las longitudes de los campos
+    indice_invertido, normas = indexar_chunk(chunk, _contexto_proceso["pesos_campos"],
+                                             _contexto_proceso["analizador"])
+    guardar_indice_parcial(indice_invertido, ruta_parcial, formato_indice)
+    if ruta_posiciones is not None:
+        guardar_posiciones(posiciones_chunk(chunk, _contexto_proceso["pesos_campos"], _contexto_proceso["analizador"]),
+                           ruta_posiciones)
+    if directorio_campos is None:
+        return normas, {}, None
+    frecuencias, longitudes = frecuencias_campos_chunk(chunk, _contexto_proceso["analizador"])
+    return normas, guardar_campos_parcial(frecuencias, directorio_campos, numero_chunk), longitudes
+
+
 class IndiceInvertido:
-    def __init__(self, ruta_csv: str, ruta_stoplist: str, ruta_indice: str, ruta_normas: str, ruta_pesos: str):
+    def __init__(self, ruta_csv: str, ruta_stoplist: str, ruta_indice: str, ruta_normas: str, ruta_pesos: str,
+                 formato_indice: str = 'binario', memoria_fusion: int = MEMORIA_MAXIMA, workers: int = 1,
+                 memoria_buffer: int = None, posicional: bool = False, por_campos: bool = False,
+                 sugerencias: bool = True):
         self.ruta_csv = ruta_csv
         self.ruta_stoplist = ruta_stoplist
-        self.ruta_indice = RUTA_INDICE_LOCAL
+        self.ruta_indice = ruta_indice
+        self.formato_indice = formato_indice  # 'binario' (indice_parcial_N.bin) o 'json' (formato anterior)
+        self.memoria_fusion = memoria_fusion  # techo de memoria de la fusion externa de parciales
+        self.workers = workers  # procesos para tokenizar los chunks; 1 construye en serie como antes
+        # en serie los chunks se acumulan en memoria y se vuelca un parcial cuando el tamaño medido del buffer
+        # de postings pasa este limite; las normas van a un archivo, asi que la memoria no depende del corpus
+        self.memoria_buffer = memoria_buffer if memoria_buffer is not None else presupuesto_buffer()
+        self.tamanio_buffer = 0
+        self.archivo_sumas = None
+        self.rutas_parciales = []
+        # con posicional=True ademas se escribe indice_posiciones.bin para las consultas por frase;
+        # cada chunk deja un parcial posicional que se fusiona al final
+        self.posicional = posicional
+        self.rutas_posiciones = []
+        # con por_campos=True ademas se guarda campos/ (ver Campos.py): la frecuencia de cada termino por campo,
+        # para elegir los pesos de los campos en consulta sin reconstruir
+        self.por_campos = por_campos
+        self.directorio_campos = os.path.join(ruta_indice, DIRECTORIO_CAMPOS)
+        self.rutas_campos = defaultdict(list)
+        self.columnas_campos = []  # (posicion en el csv, nombre) de los campos de texto
+        self.archivo_longitudes = None
+        # sugerencias.npz (ver Sugerencias.py) para /suggest: titulos y artistas se cuentan al leer los chunks
+        self.sugerencias = sugerencias
+        self.conteos_sugerencias = defaultdict(Counter)
         self.ruta_normas = ruta_normas
         self.ruta_pesos = ruta_pesos
         self.stopwords = set()
-        self.stemmer = SnowballStemmer('spanish')
         self.pesos_campos = []
-        self.indice_invertido = defaultdict(dict)
-        self.normas_documentos = {}
+        self.indice_invertido = {}
         self._cargar_stopwords()
+        self.analizador = Analizador(self.stopwords)
         self._cargar_pesos_campos()  #  cargamos los pesos previamente calculados
 
     def _cargar_stopwords(self):
@@ -66,79 +234,344 @@ class IndiceInvertido:
             self.pesos_campos = []
 
     def construir_indice(self):
-        numero_chunk = 0
+        inicio = time.perf_counter()
         try:
-            for chunk in pd.read_csv(self.ruta_csv, chunksize=TAMANIO_CHUNK, encoding='utf-8'):
-                numero_chunk += 1
-                print(f"procesando chunk {numero_chunk}")
-                self._procesar_chunk(chunk)
-                self._guardar_indice_parcial(numero_chunk)
+            # la suma de cuadrados de cada documento se agrega al archivo en orden de id, chunk por chunk
+            self.archivo_sumas = open(self._ruta_sumas(), 'wb')
+            if self.por_campos:
+                os.makedirs(self.directorio_campos, exist_ok=True)
+                self.archivo_longitudes = open(self._ruta_longitudes(), 'wb')
+            try:
+                if self.workers > 1:
+                    filas = self._construir_en_paralelo()
+                else:
+                    filas = self._construir_en_serie()
+            finally:
+                self.archivo_sumas.close()
+                if self.archivo_longitudes is not None:
+                    self.archivo_longitudes.close()
             self._guardar_normas()
-            print("construccion del indice invertido completa")
+            if self.formato_indice == 'binario':
+                self._fusionar_parciales()
+            if self.posicional:
+                self._fusionar_posiciones()
+            if self.por_campos:
+                self._fusionar_campos()
+            if self.sugerencias:
+                self._guardar_sugerencias()
+            duracion = time.perf_counter() - inicio
+            print(f"construccion del indice invertido completa: {filas} filas en {duracion:.1f} s "
+                  f"({filas / max(duracion, 1e-9):.0f} filas/s, {self.workers} workers)")
         except Exception as e:
             print(f"error al construir el indice: {e}")
 
+    def _construir_en_serie(self) -> int:
+        filas = 0
+        for numero_chunk, chunk in self._leer_chunks():
+            print(f"procesando chunk {numero_chunk}")
+            self._procesar_chunk(chunk)
+            if self.posicional:
+                ruta_posiciones = self._ruta_posiciones_parcial(numero_chunk)
+                guardar_posiciones(posiciones_chunk(chunk, self.pesos_campos, self.analizador), ruta_posiciones)
+                self.rutas_posiciones.append(ruta_posiciones)
+            if self.por_campos:
+                frecuencias, longitudes = frecuencias_campos_chunk(chunk, self.analizador)
+                self._agregar_campos(chunk, guardar_campos_parcial(frecuencias, self.directorio_campos, numero_chunk),
+                                     longitudes)
+            filas += len(chunk)
+            if self._tamanio_buffer() >= self.memoria_buffer:
+                self._guardar_indice_parcial(len(self.rutas_parciales) + 1)
+        if self.indice_invertido:
+            self._guardar_indice_parcial(len(self.rutas_parciales) + 1)
+        return filas
+
+    def _construir_en_paralelo(self) -> int:
+        # como mucho 2 chunks por worker en vuelo para no leer todo el csv a memoria; cada proceso escribe
+        # un parcial por chunk, asi su memoria la acota el chunk. los resultados se recogen en orden de chunk,
+        # asi las normas y el indice final salen igual que en serie
+        pendientes = deque()
+        filas = 0
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_inicializar_proceso,
+                                 initargs=(self.pesos_campos, self.stopwords)) as pool:
+            for numero_chunk, chunk in self._leer_chunks():
+                if len(pendientes) >= 2 * self.workers:
+                    self._recoger_chunk(*pendientes.popleft())
+                print(f"procesando chunk {numero_chunk}")
+                ruta_parcial = self._ruta_indice_parcial(numero_chunk)
+                ruta_posiciones = None
+                if self.posicional:
+                    ruta_posiciones = self._ruta_posiciones_parcial(numero_chunk)
+                    self.rutas_posiciones.append(ruta_posiciones)
+                futuro = pool.submit(_indexar_chunk_en_proceso, chunk, ruta_parcial, self.formato_indice,
+                                     ruta_posiciones, self.directorio_campos if self.por_campos else None,
+                                     numero_chunk)
+                pendientes.append((chunk.columns, ruta_parcial, futuro))
+                filas += len(chunk)
+            while pendientes:
+                self._recoger_chunk(*pendientes.popleft())
+        return filas
+
+    def _leer_chunks(self):
+        # de paso se guardan las filas en documentos.bin, asi el motor de consulta no carga el csv entero
+        ruta_documentos = os.path.join(self.ruta_indice, NOMBRE_ALMACEN)
+        escritor = None
+        try:
+            for numero_chunk, chunk in enumerate(pd.read_csv(self.ruta_csv, chunksize=TAMANIO_CHUNK,
+                                                             encoding='utf-8'), start=1):
+                if escritor is None:
+                    escritor = EscritorAlmacenDocumentos(ruta_documentos, chunk.columns)
+                escritor.agregar_chunk(chunk)
+                if self.sugerencias:
+                    contar_textos(chunk, self.conteos_sugerencias)
+                yield numero_chunk, chunk
+        finally:
+            if escritor is not None:
+                escritor.cerrar()
+                print(f"almacen de documentos guardado en {ruta_documentos}")
+
+    def _recoger_chunk(self, columnas, ruta_parcial: str, futuro):
+        normas, rutas_campos, longitudes = futuro.result()
+        self._agregar_sumas(normas)
+        self.rutas_parciales.append(ruta_parcial)
+        if self.por_campos:
+            self._agregar_campos(columnas, rutas_campos, longitudes)
+        print(f"Índice parcial guardado en {ruta_parcial}")
+
     def _procesar_chunk(self, chunk: pd.DataFrame):
-        for indice, fila in chunk.iterrows():
-            id_documento = str(indice)  # Convertir id_documento a cadena para consistencia
-            self.normas_documentos[id_documento] = 0
-            frecuencia_terminos = defaultdict(float)
-            
-            for idx_campo, campo in enumerate(fila):
-                if idx_campo >= len(self.pesos_campos):
-                    continue  # saltar campos sin pesos definidos
-                peso = self.pesos_campos[idx_campo]
-                if peso == 0:
-                    continue  # saltar campos con peso cero
-                tokens = nltk.word_tokenize(str(campo).lower())
-                tokens = [token.strip() for token in tokens]
-                for token in tokens:
-                    if token not in self.stopwords:
-                        lematizado = self.stemmer.stem(token)
-                        frecuencia_terminos[lematizado] += peso
-                    else:
-                        pass  # stopwords eliminadas
-                
-            # actualizar indice invertido y normas
-            for termino, frecuencia in frecuencia_terminos.items():
-                self.indice_invertido[termino][id_documento] = math.log10(1 + frecuencia)
-                self.normas_documentos[id_documento] += self.indice_invertido[termino][id_documento] ** 2
+        indice_invertido, sumas = indexar_chunk(chunk, self.pesos_campos, self.analizador)
+        # se mide lo que crece el buffer: tablas de los dicts, claves nuevas y un float por posting
+        for termino, postings in indice_invertido.items():
+            actuales = self.indice_invertido.get(termino)
+            if actuales is None:
+                self.indice_invertido[termino] = postings
+                self.tamanio_buffer += sys.getsizeof(termino) + sys.getsizeof(postings)
+            else:
+                antes = sys.getsizeof(actuales)
+                actuales.update(postings)
+                self.tamanio_buffer += sys.getsizeof(actuales) - antes
+            self.tamanio_buffer += BYTES_POR_FLOAT * len(postings)
+        self.tamanio_buffer += BYTES_POR_ENTERO * len(chunk)  # un objeto int por id de documento
+        self._agregar_sumas(sumas)
+
+    def _tamanio_buffer(self) -> int:
+        return self.tamanio_buffer + sys.getsizeof(self.indice_invertido)
+
+    def _ruta_sumas(self) -> str:
+        return os.path.join(self.ruta_indice, "sumas_normas.tmp")
+
+    def _agregar_sumas(self, sumas: np.ndarray):
+        self.archivo_sumas.write(np.asarray(sumas, dtype='<f8').tobytes())
+
+    def _ruta_longitudes(self) -> str:
+        return os.path.join(self.directorio_campos, "longitudes.tmp")
+
+    def _agregar_campos(self, columnas, rutas_campos: Dict[str, str], longitudes: np.ndarray):
+        # los parciales de cada campo se fusionan al final; las longitudes van al archivo en orden de id
+        self.columnas_campos = columnas_campos(columnas)
+        for campo, ruta in rutas_campos.items():
+            self.rutas_campos[campo].append(ruta)
+        self.archivo_longitudes.write(np.asarray(longitudes, dtype='<u4').tobytes())
+
+    def _ruta_indice_parcial(self, numero_chunk: int) -> str:
+        extension = "bin" if self.formato_indice == 'binario' else "json"
+        return os.path.join(self.ruta_indice, f"indice_parcial_{numero_chunk}.{extension}")
+
+    def _ruta_posiciones_parcial(self, numero_chunk: int) -> str:
+        return os.path.join(self.ruta_indice, f"posiciones_parcial_{numero_chunk}.bin")
 
     def _guardar_indice_parcial(self, numero_chunk: int):
-        ruta_indice_parcial = os.path.join(self.ruta_indice, f"indice_parcial_{numero_chunk}.json")
+        ruta_indice_parcial = self._ruta_indice_parcial(numero_chunk)
         try:
-            with open(ruta_indice_parcial, 'w', encoding='utf-8') as archivo:
-                json.dump(self.indice_invertido, archivo)
-            print(f"Índice parcial guardado en {ruta_indice_parcial}")
+            guardar_indice_parcial(self.indice_invertido, ruta_indice_parcial, self.formato_indice)
+            self.rutas_parciales.append(ruta_indice_parcial)
+            print(f"Índice parcial guardado en {ruta_indice_parcial} ({self._tamanio_buffer() / 1e6:.1f} MB en memoria)")
             self.indice_invertido.clear()  # limpiar indice en memoria después de guardar
+            self.tamanio_buffer = 0
         except Exception as e:
             print(f"Error al guardar el índice parcial: {e}")
 
+    def _fusionar_parciales(self):
+        # la fusion se hace una sola vez al construir; el servidor solo abre indice_final.bin
+        # con las normas se guarda la cota max(peso / norma) de cada termino para la poda MaxScore
+        ruta_final = os.path.join(self.ruta_indice, NOMBRE_INDICE_FINAL)
+        normas = cargar_normas(self.ruta_normas)  # mapeado en memoria
+        fusionar_indices_parciales(self.rutas_parciales, ruta_final, self.memoria_fusion, normas=normas)
+        # pasada de estadisticas globales: cada posting guarda tf·idf/norma listo para sumar
+        calcular_impactos(ruta_final, os.path.join(self.ruta_indice, NOMBRE_INDICE_IMPACTOS), normas)
+
+    def _fusionar_posiciones(self):
+        # los parciales posicionales solo sirven para esta fusion, se borran al terminar
+        fusionar_posiciones(self.rutas_posiciones, os.path.join(self.ruta_indice, NOMBRE_INDICE_POSICIONES),
+                            self.memoria_fusion)
+        for ruta in self.rutas_posiciones:
+            os.remove(ruta)
+        self.rutas_posiciones = []
+
+    def _fusionar_campos(self):
+        fusionar_campos(self.rutas_campos, self.directorio_campos, self.memoria_fusion)
+        self.rutas_campos = defaultdict(list)
+        convertir_longitudes(self._ruta_longitudes(), os.path.join(self.directorio_campos, NOMBRE_LONGITUDES),
+                             len(self.columnas_campos))
+        os.remove(self._ruta_longitudes())
+        # los pesos de la construccion quedan como los pesos por defecto de la consulta por campos
+        nombres = [nombre for _, nombre in self.columnas_campos]
+        pesos = {nombre: float(self.pesos_campos[posicion]) if posicion < len(self.pesos_campos) else 0.0
+                 for posicion, nombre in self.columnas_campos}
+        guardar_manifiesto_campos(self.directorio_campos, nombres, pesos)
+        print(f"indice por campos guardado en {self.directorio_campos}: {', '.join(nombres)}")
+
+    def _guardar_sugerencias(self):
+        # los terminos salen del diccionario de indice_final.bin (con formato json solo titulos y artistas)
+        ruta = os.path.join(self.ruta_indice, NOMBRE_SUGERENCIAS)
+        guardar_sugerencias(ruta, self.conteos_sugerencias, os.path.join(self.ruta_indice, NOMBRE_INDICE_FINAL))
+        self.conteos_sugerencias = defaultdict(Counter)
+        print(f"sugerencias guardadas en {ruta}")
+
     def _guardar_normas(self):
+        # arreglo float32 indexado por id de documento, convertido por bloques desde el archivo de sumas
         try:
-            # Convertir id_documento a cadena para consistencia
-            normas_str_keys = {str(k): round(math.sqrt(v), 3) for k, v in self.normas_documentos.items()}
-            with open(self.ruta_normas, 'w', encoding='utf-8') as archivo:
-                json.dump(normas_str_keys, archivo)
+            convertir_sumas_a_normas(self._ruta_sumas(), self.ruta_normas)
+            os.remove(self._ruta_sumas())
             print(f"Normas guardadas en {self.ruta_normas}")
         except Exception as e:
             print(f"Error al guardar las normas: {e}")
 
 class MotorConsulta:
-    def __init__(self, ruta_csv: str, ruta_indice: str, ruta_normas: str, ruta_stoplist: str, tamano_bloque: int = 1000):
+    def __init__(self, ruta_csv: str, ruta_indice: str, ruta_normas: str, ruta_stoplist: str, tamano_bloque: int = 1000,
+                 modo_carga: str = 'memoria', max_postings_cache: int = 200000, poda_maxscore: bool = True,
+                 usar_impactos: bool = False, puntuador: str = 'diccionarios', max_resultados_cache: int = 0,
+                 ttl_resultados_cache: float = 300.0, intervalo_refresco: float = 1.0,
+                 diccionario_mapeado: bool = True):
         self.ruta_csv = ruta_csv
         self.ruta_indice = ruta_indice
         self.ruta_normas = ruta_normas
         self.ruta_stoplist = ruta_stoplist
         self.tamano_bloque = tamano_bloque
-        self.stemmer = SnowballStemmer('spanish')
         self.stopwords = set()
         self._cargar_stopwords()
-        self.indice_invertido = self._cargar_indice_por_bloques()
-        self.normas_documentos = self._cargar_normas()
-        self.dataframe = pd.read_csv(self.ruta_csv, index_col=None, encoding='utf-8', low_memory=False)
-        self.dataframe.reset_index(drop=True, inplace=True)
-        self.dataframe.index = self.dataframe.index.map(str)  
+        self.analizador = Analizador(self.stopwords)
+        # modo 'memoria': todos los postings en un dict (como antes)
+        # modo 'perezoso': solo el diccionario de terminos queda residente y los postings se leen
+        # de indice_final.bin bajo demanda, pasando por una cache LRU
+        self.lector_indice = None
+        self.cache_postings = None
+        self.poda_maxscore = poda_maxscore
+        self.impactos_maximos = {}  # cota max(peso / norma) por termino, viene en indice_final.bin
+        # con segmentos.json (ver Segmentos.py) se sirven los segmentos vivos y se abre la version nueva
+        # cuando cambia el manifiesto; el idf cambia con cada alta o baja, asi que se puntua con idf y normas
+        self.segmentos = None
+        self.intervalo_refresco = intervalo_refresco
+        self._ultimo_refresco = time.monotonic()
+        if os.path.exists(os.path.join(self.ruta_indice, NOMBRE_MANIFIESTO)):
+            if usar_impactos or puntuador != 'diccionarios':
+                log.warning("indice por segmentos: se puntua con idf y normas en consulta "
+                            "y el puntuador por diccionarios")
+            usar_impactos = False
+            puntuador = 'diccionarios'
+            modo_carga = 'segmentos'
+        # con usar_impactos se sirve indice_impactos.bin: los postings ya traen tf·idf/norma y no hacen
+        # falta ni el idf ni las normas en consulta
+        ruta_impactos = os.path.join(self.ruta_indice, NOMBRE_INDICE_IMPACTOS)
+        if usar_impactos and not os.path.exists(ruta_impactos):
+            log.warning("no existe %s, se puntua con idf y normas en consulta", ruta_impactos)
+            usar_impactos = False
+        self.usar_impactos = usar_impactos
+        ruta_final = ruta_impactos if usar_impactos else os.path.join(self.ruta_indice, NOMBRE_INDICE_FINAL)
+        self.ruta_indice_final = ruta_final
+        # puntuador 'diccionarios': acumula termino a termino sobre los postings (TopK)
+        # puntuador 'matriz': matriz CSR con los pesos normalizados, un producto disperso por consulta o por lote
+        if puntuador == 'matriz' and not scipy_disponible():
+            log.warning("scipy no esta instalado, se usa el puntuador por diccionarios")
+            puntuador = 'diccionarios'
+        if puntuador == 'matriz' and not os.path.exists(ruta_final):
+            log.warning("no existe %s, el puntuador 'matriz' necesita el indice fusionado; se usa el de diccionarios",
+                        ruta_final)
+            puntuador = 'diccionarios'
+        self.puntuador = puntuador
+        if puntuador == 'matriz':
+            modo_carga = 'perezoso'  # los postings viven en la matriz, no hace falta tenerlos tambien en dicts
+        if modo_carga == 'perezoso' and not os.path.exists(ruta_final):
+            log.warning("no existe %s, el modo perezoso necesita el indice fusionado; se carga en memoria", ruta_final)
+            modo_carga = 'memoria'
+        self.modo_carga = modo_carga
+        self.max_postings_cache = max_postings_cache
+        if modo_carga == 'perezoso':
+            # con el .dicm del snapshot el diccionario tambien queda mapeado (compartido entre procesos)
+            self.lector_indice = LectorIndiceBinario(ruta_final, usar_mmap=True,
+                                                     diccionario_mapeado=diccionario_mapeado)
+            self.cache_postings = CachePostingsLRU(max_postings_cache)
+            self.impactos_maximos = self.lector_indice.impactos_maximos
+            self.indice_invertido = None
+            log.info("diccionario de %d terminos cargado (postings en disco)", len(self.lector_indice))
+        elif modo_carga == 'segmentos':
+            self.indice_invertido = None
+        else:
+            self.indice_invertido = self._cargar_indice_por_bloques()
+        self.normas_documentos = None if self.usar_impactos or modo_carga == 'segmentos' else self._cargar_normas()
+        self.numero_documentos = len(self.normas_documentos) if self.normas_documentos is not None else 0  # N del idf
+        self.matriz = None
+        if puntuador == 'matriz':
+            self.matriz = MatrizTerminoDocumento.desde_indice(ruta_final, self.normas_documentos)
+        # indice posicional (IndiceInvertido(..., posicional=True)) para rankear_frase; los segmentos no lo traen
+        self.posiciones = None
+        ruta_posiciones = os.path.join(self.ruta_indice, NOMBRE_INDICE_POSICIONES)
+        if modo_carga != 'segmentos' and os.path.exists(ruta_posiciones):
+            self.posiciones = LectorPosiciones(ruta_posiciones)
+            log.info("indice posicional abierto desde %s", ruta_posiciones)
+        # indice por campos (IndiceInvertido(..., por_campos=True)) para rankear_campos; tampoco en segmentos
+        self.campos = None
+        if modo_carga != 'segmentos' and os.path.exists(os.path.join(self.ruta_indice, DIRECTORIO_CAMPOS,
+                                                                      NOMBRE_MANIFIESTO_CAMPOS)):
+            self.campos = IndiceCampos(self.ruta_indice)
+            log.info("indice por campos abierto: %s", ', '.join(self.campos.campos))
+        # prefijos para autocompletar (sugerencias.npz); tampoco en segmentos
+        self.sugerencias = None
+        ruta_sugerencias = os.path.join(self.ruta_indice, NOMBRE_SUGERENCIAS)
+        if modo_carga != 'segmentos' and os.path.exists(ruta_sugerencias):
+            self.sugerencias = IndiceSugerencias(ruta_sugerencias)
+            log.info("sugerencias cargadas: %s", self.sugerencias.estadisticas())
+        # trigramas del vocabulario para la expansion difusa; se arman con la primera consulta que los necesita
+        self.trigramas = None
+        self._candado_trigramas = threading.Lock()
+        # las filas del top k se leen de documentos.bin; sin el almacen se carga el csv completo como antes
+        self.almacen_documentos = None
+        self.dataframe = None
+        ruta_documentos = os.path.join(self.ruta_indice, NOMBRE_ALMACEN)
+        if modo_carga == 'segmentos':
+            self._abrir_segmentos(VistaSegmentos(self.ruta_indice))
+            log.info("indice por segmentos version %s: %d segmentos, %d documentos", self.segmentos.version,
+                     len(self.segmentos.segmentos), self.numero_documentos)
+        elif os.path.exists(ruta_documentos):
+            self.almacen_documentos = AlmacenDocumentos(ruta_documentos)
+            log.info("almacen de %d documentos abierto desde %s", len(self.almacen_documentos), ruta_documentos)
+        else:
+            log.warning("no existe %s, se carga el csv completo "
+                        "(para generarlo: python -m app.AlmacenDocumentos <csv> %s)", ruta_documentos, self.ruta_indice)
+            self.dataframe = pd.read_csv(self.ruta_csv, index_col=None, encoding='utf-8', low_memory=False)
+            self.dataframe.reset_index(drop=True, inplace=True)  # el id de documento es la posicion de la fila
+        # cache de resultados delante de buscar (0 la desactiva); se vacia sola si cambia version_indice
+        self.cache_resultados = None
+        if max_resultados_cache > 0:
+            self.cache_resultados = CacheResultadosLRU(max_resultados_cache, ttl_resultados_cache)
+        self.version_indice = self._calcular_version_indice()
+        self.version_snapshot = None  # la pone desde_snapshot
+
+    @classmethod
+    def desde_snapshot(cls, ruta_snapshots: str, verificar: bool = False, **opciones) -> 'MotorConsulta':
+        """motor sobre el snapshot actual de ruta_snapshots (ver Snapshot.py), listo en lo que tarda abrir los mmap
+
+        por defecto en modo perezoso y con indice_impactos.bin si el snapshot lo trae; el resto de opciones
+        (cache de resultados, puntuador...) se pasan igual que al constructor
+        """
+        directorio, manifiesto = abrir_snapshot(ruta_snapshots, verificar)
+        opciones.setdefault('modo_carga', 'perezoso')
+        opciones.setdefault('usar_impactos', NOMBRE_INDICE_IMPACTOS in manifiesto["archivos"])
+        # el snapshot trae documentos.bin, asi que el csv no se lee
+        motor = cls(None, directorio, os.path.join(directorio, NOMBRE_NORMAS),
+                    os.path.join(directorio, NOMBRE_STOPLIST), **opciones)
+        motor.version_snapshot = manifiesto["version"]
+        log.info("snapshot version %s abierto desde %s", manifiesto['version'], directorio)
+        return motor
 
     def _cargar_stopwords(self):
         try:
@@ -147,55 +580,133 @@ class MotorConsulta:
                     palabra = linea.strip().lower()
                     if palabra:
                         self.stopwords.add(palabra)
-            print("Stopwords cargadas (motorconsulta):", self.stopwords)
+            log.info("%d stopwords cargadas desde %s", len(self.stopwords), self.ruta_stoplist)
         except FileNotFoundError:
-            print(f"Archivo de stopwords no encontrado en {self.ruta_stoplist}")
+            log.warning("archivo de stopwords no encontrado en %s", self.ruta_stoplist)
         
         caracteres_especiales = set("'«[]¿?$+-*'.,»:;!,º«»()@¡“/#|*%'&`")
         self.stopwords.update(caracteres_especiales)
+    def _calcular_version_indice(self) -> Tuple:
+        if self.segmentos is not None:
+            return os.path.join(self.ruta_indice, NOMBRE_MANIFIESTO), self.segmentos.version
+        # tamaño y fecha de modificacion de los archivos que se estan sirviendo
+        firma = []
+        for ruta in (self.ruta_indice_final, self.ruta_normas, os.path.join(self.ruta_indice, NOMBRE_ALMACEN)):
+            if os.path.exists(ruta):
+                estado = os.stat(ruta)
+                firma.append((ruta, estado.st_size, estado.st_mtime_ns))
+        return tuple(firma)
+
+    def actualizar_version_indice(self):
+        """a llamar despues de cambiar el indice servido: invalida la cache de resultados"""
+        self.version_indice = self._calcular_version_indice()
+
+    def _abrir_segmentos(self, vista: VistaSegmentos):
+        # cache de postings nueva por version: un hilo que termina una consulta vieja no la ensucia
+        self._segmentos_y_cache = (vista, CachePostingsLRU(self.max_postings_cache))
+        self.segmentos, self.cache_postings = self._segmentos_y_cache
+        self.normas_documentos = vista.normas
+        self.numero_documentos = vista.numero_documentos
+        self.almacen_documentos = vista
+        self.impactos_maximos = {}  # las cotas dependen de los postings vivos, se recalculan por version
+        self.version_indice = self._calcular_version_indice()
+
+    def refrescar_segmentos(self, forzar: bool = False) -> bool:
+        """abre la version nueva del indice por segmentos si cambio el manifiesto (como mucho cada intervalo_refresco s)
+
+        si el motor arranco con el indice completo y despues aparece segmentos.json (la primera alta), pasa a
+        servir los segmentos sin reiniciar
+        """
+        ahora = time.monotonic()
+        if not forzar and ahora - self._ultimo_refresco < self.intervalo_refresco:
+            return False
+        self._ultimo_refresco = ahora
+        if self.segmentos is None and not os.path.exists(os.path.join(self.ruta_indice, NOMBRE_MANIFIESTO)):
+            return False
+        try:
+            manifiesto = leer_manifiesto(self.ruta_indice)
+            if manifiesto is None or (self.segmentos is not None and manifiesto["version"] == self.segmentos.version):
+                return False
+            vista = VistaSegmentos(self.ruta_indice, manifiesto)
+        except (OSError, ValueError) as e:
+            # el escritor pudo confirmar otra version mientras se abria esta; se reintenta en el proximo refresco
+            log.warning("no se pudo abrir la version nueva de los segmentos: %s", e)
+            return False
+        self._abrir_segmentos(vista)
+        if self.modo_carga != 'segmentos':
+            self.modo_carga, self.puntuador, self.usar_impactos = 'segmentos', 'diccionarios', False
+            self.matriz = self.indice_invertido = self.lector_indice = self.dataframe = self.posiciones = None
+            self.campos = None
+        log.info("indice por segmentos actualizado a la version %s (%d documentos)", vista.version,
+                 vista.numero_documentos)
+        return True
+
     # LECTURA MEDIANTE BLOQUES Y LUEGO LIMPIAR CUANDO SE PROCESE :D
-    def _cargar_indice_por_bloques(self) -> Dict[str, Dict[str, float]]:
+    def _cargar_indice_por_bloques(self) -> Dict[str, Dict[int, float]]:
         indice_completo = defaultdict(dict)
         bloque_actual = defaultdict(dict)
         contador = 0
         bloque_numero = 0
         try:
-            archivos_parciales = [
-                archivo for archivo in os.listdir(self.ruta_indice)
-                if archivo.startswith("indice_parcial_") and archivo.endswith(".json")
-            ]
+            ruta_final = self.ruta_indice_final
+            if os.path.exists(ruta_final):
+                with LectorIndiceBinario(ruta_final) as lector:
+                    indice_completo = lector.cargar_todo()
+                    self.impactos_maximos = lector.impactos_maximos
+                log.info("indice final cargado desde %s", ruta_final)
+                return indice_completo
+
+            # indices construidos antes de la fusion externa: se consolidan en memoria
+            archivos_parciales = self._listar_indices_parciales()
 
             for archivo in archivos_parciales:
                 ruta_archivo = os.path.join(self.ruta_indice, archivo)
-                with open(ruta_archivo, 'r', encoding='utf-8') as archivo_json:
-                    indice_parcial = json.load(archivo_json)
-                    for termino, postings in indice_parcial.items():
-                        bloque_actual[termino].update(postings)
-                        contador += 1
-
-                        # si alcanzamos el tamaño del bloque, consolidamos en memoria
-                        if contador >= self.tamano_bloque:
-                            bloque_numero += 1
-                            #print(f"Consolidando bloque {bloque_numero}")
-                            self._consolidar_bloque_en_memoria(indice_completo, bloque_actual)
-                            bloque_actual.clear()
-                            contador = 0
+                indice_parcial = self._leer_indice_parcial(ruta_archivo)
+                for termino, postings in indice_parcial.items():
+                    bloque_actual[termino].update(postings)
+                    contador += 1
+
+                    # si alcanzamos el tamaño del bloque, consolidamos en memoria
+                    if contador >= self.tamano_bloque:
+                        bloque_numero += 1
+                        #print(f"Consolidando bloque {bloque_numero}")
+                        self._consolidar_bloque_en_memoria(indice_completo, bloque_actual)
+                        bloque_actual.clear()
+                        contador = 0
 
             if bloque_actual:
                 bloque_numero += 1
-                print(f"Consolidando bloque restante {bloque_numero}")
+                log.info("consolidando bloque restante %d", bloque_numero)
                 self._consolidar_bloque_en_memoria(indice_completo, bloque_actual)
                
-            print("indice consolidado por bloques cargado en memoria")
-                # Guardar el índice completo en un archivo JSON
-            ruta_indice_completo = os.path.join(self.ruta_indice, "indice_completo.json")
-            with open(ruta_indice_completo, 'w', encoding='utf-8') as archivo_completo:
-                json.dump(indice_completo, archivo_completo, ensure_ascii=False, indent=4)
-            print(f"Índice completo guardado en {ruta_indice_completo}")
+            log.info("indice consolidado por bloques cargado en memoria")
+            log.info("para no repetir esta consolidacion en cada arranque ejecutar: python -m app.FusionExterna %s",
+                     self.ruta_indice)
             return indice_completo
         except Exception as e:
-            print(f"error al cargar el índice por bloques: {e}")
+            log.error("error al cargar el indice por bloques: %s", e)
             return {}
+    def _listar_indices_parciales(self):
+        # si un parcial ya fue convertido a binario se prefiere el .bin sobre el .json
+        parciales = {}
+        for archivo in os.listdir(self.ruta_indice):
+            if not archivo.startswith("indice_parcial_"):
+                continue
+            nombre, extension = os.path.splitext(archivo)
+            if extension == ".bin" or (extension == ".json" and nombre not in parciales):
+                parciales[nombre] = archivo
+        return list(parciales.values())
+
+    def _leer_indice_parcial(self, ruta_archivo: str) -> Dict[str, Dict[int, float]]:
+        if ruta_archivo.endswith(".bin"):
+            with LectorIndiceBinario(ruta_archivo) as lector:
+                return lector.cargar_todo()
+        with open(ruta_archivo, 'r', encoding='utf-8') as archivo_json:
+            indice_parcial = json.load(archivo_json)
+        # en json las claves siempre son texto
+        return {termino: {int(id_documento): peso for id_documento, peso in postings.items()}
+                for termino, postings in indice_parcial.items()}
+
     def _consolidar_bloque_en_memoria(self, indice_completo: Dict, bloque_actual: Dict):
         for termino, postings in bloque_actual.items():
             indice_completo[termino].update(postings)
@@ -219,84 +730,425 @@ class MotorConsulta:
             print(f"Error al cargar el índice invertido: {e}")
             return {}
 """
-    def _cargar_normas(self) -> Dict[str, float]:
-        print("Estoy  aqui")
+    def _cargar_normas(self) -> np.ndarray:
+        # normas.npy se abre con mmap; un normas.json anterior se convierte al vuelo
         try:
-            with open(self.ruta_normas, 'r', encoding='utf-8') as archivo:
-                normas = json.load(archivo)
-            print("Normas de documentos cargadas")
+            normas = cargar_normas(self.ruta_normas)
+            log.info("normas de documentos cargadas")
             return normas
         except Exception as e:
-            print(f"Error al cargar las normas: {e}")
-            return {}
+            log.error("error al cargar las normas: %s", e)
+            return np.zeros(0, dtype=np.float32)
+
+    def procesar_consulta(self, consulta: str, difusa: bool = False) -> Dict[str, float]:
+        with etapa("analizar"):
+            terminos_consulta = self._pesos_terminos(self.analizador.analizar(consulta))
+            return self.expandir_difusos(terminos_consulta) if difusa else terminos_consulta
+
+    def expandir_difusos(self, terminos_consulta: Dict[str, float]) -> Dict[str, float]:
+        """cambia cada termino que no esta en el indice por los mas cercanos del vocabulario (ver Trigramas.py)
+
+        hasta MAX_EXPANSIONES por termino, los de menos ediciones y mas df primero, con el peso de la consulta
+        multiplicado por PESO_POR_EDICION por cada edicion. los terminos que estan no se tocan
+        """
+        faltan = [termino for termino in terminos_consulta
+                  if distancia_maxima(termino) > 0 and not self._df(termino)]
+        if not faltan:
+            return terminos_consulta
+        indice = self._indice_trigramas()
+        if indice is None:
+            return terminos_consulta
+        expandida = {termino: peso for termino, peso in terminos_consulta.items() if termino not in faltan}
+        for termino in faltan:
+            cercanos = sorted(indice.buscar(termino), key=lambda par: (par[1], -self._df(par[0]), par[0]))
+            for cercano, ediciones in cercanos[:MAX_EXPANSIONES]:
+                peso = round(terminos_consulta[termino] * PESO_POR_EDICION ** ediciones, 3)
+                expandida[cercano] = max(expandida.get(cercano, 0.0), peso)
+            if not cercanos:
+                expandida[termino] = terminos_consulta[termino]  # sin parecidos queda como estaba
+        return expandida
 
-    def procesar_consulta(self, consulta: str) -> Dict[str, float]:
-        tokens = nltk.word_tokenize(consulta.lower())
-        tokens = [token.strip() for token in tokens]
-        tokens_sin_stopwords = [token for token in tokens if token not in self.stopwords]
+    def _indice_trigramas(self):
+        if self.trigramas is None:
+            if self.segmentos is not None:
+                return None  # el vocabulario de los segmentos cambia con cada alta; no hay expansion
+            with self._candado_trigramas:
+                if self.trigramas is None:
+                    inicio = time.perf_counter()
+                    vocabulario = self.lector_indice.diccionario if self.lector_indice is not None \
+                        else self.indice_invertido
+                    self.trigramas = IndiceTrigramas(vocabulario.keys())
+                    duracion = time.perf_counter() - inicio
+                    log.info("trigramas de %d terminos armados en %.2f s", len(self.trigramas), duracion)
+        return self.trigramas
+
+    def _pesos_terminos(self, terminos: List[str]) -> Dict[str, float]:
         frecuencia_terminos = defaultdict(int)
-        for token in tokens_sin_stopwords:
-            lematizado = self.stemmer.stem(token)
+        for lematizado in terminos:
             frecuencia_terminos[lematizado] += 1
         # aplicar normalizacion logaritmica
         for termino in frecuencia_terminos:
             frecuencia_terminos[termino] = round(math.log10(1 + frecuencia_terminos[termino]), 3)
         return dict(frecuencia_terminos)
 
-    def buscar(self, consulta: str, top_k: int = 10) -> Dict[str, Dict]:
-        print("ENTRO")
-        terminos_consulta = self.procesar_consulta(consulta)
+    def rankear(self, consulta: str, top_k: int = 10,
+                terminos_consulta: Dict[str, float] = None) -> List[Tuple[int, float]]:
+        """ids de los top k documentos con su similitud coseno, sin cargar los documentos
+
+        si ya se tiene la salida de procesar_consulta se puede pasar en terminos_consulta para no analizar dos veces
+        """
+        self.refrescar_segmentos()
+        if terminos_consulta is None:
+            terminos_consulta = self.procesar_consulta(consulta)
         if not terminos_consulta:
-            print("no hay terminos validos en la consulta despues del procesamiento")
-            return {}
-        
+            log.debug("no hay terminos validos en la consulta despues del procesamiento")
+            return []
+        if self.matriz is not None:
+            with etapa("puntuar"):  # el producto disperso puntua y elige el top k de una vez
+                return self.matriz.top_k(terminos_consulta, top_k)
+        return self._rankear_terminos(terminos_consulta, top_k, self._obtener_postings)
+
+    def rankear_frase(self, consulta: str, top_k: int = 10, distancia: int = 0) -> List[Tuple[int, float]]:
+        """top k de los documentos que contienen la frase, con la misma similitud coseno que rankear
+
+        los terminos tienen que aparecer en ese orden, seguidos o con a lo mas `distancia` posiciones de mas
+        entre el primero y el ultimo. se intersectan primero las listas de documentos y solo se decodifican
+        las posiciones de los que quedan; sin indice posicional la frase se resuelve como un AND de sus terminos
+        """
+        self.refrescar_segmentos()
+        terminos = self.analizador.analizar(consulta)
+        if top_k <= 0:
+            return []
+        if not terminos:
+            log.debug("no hay terminos validos en la consulta despues del procesamiento")
+            return []
+        terminos_consulta = self.procesar_consulta(consulta)
+        if self.posiciones is None:
+            log.debug("no hay indice posicional, la frase se busca como un AND de sus terminos")
+            documentos = self._documentos_con_todos(terminos_consulta)
+            return self._rankear_terminos(terminos_consulta, top_k, self._obtener_postings, documentos) if documentos else []
+
+        listas_posiciones = self.posiciones.listas(terminos)
+        if listas_posiciones is None:
+            return []
+        candidatos = self.posiciones.documentos_con_todos(listas_posiciones)
+        if not len(candidatos):
+            return []
+        # se rankean los candidatos (tienen todos los terminos) y la frase se comprueba en orden de similitud,
+        # por tandas cada vez mas grandes, hasta juntar top_k: con palabras comunes casi nunca hay que mirar todos
+        norma_consulta, listas = self._listas_consulta(terminos_consulta, self._obtener_postings,
+                                                       set(candidatos.tolist()))
+        encontrados = []
+        revisados = 0
+        tanda = max(4 * top_k, 64)
+        while len(encontrados) < top_k and revisados < len(candidatos):
+            ranking = self._seleccionar(listas, norma_consulta, tanda)
+            nuevos = ranking[revisados:]
+            ids = np.array(sorted(id_documento for id_documento, _ in nuevos), dtype=np.int64)
+            con_frase = set(self.posiciones.verificar(terminos, listas_posiciones, ids, distancia).tolist())
+            encontrados.extend(item for item in nuevos if item[0] in con_frase)
+            if len(ranking) < tanda:
+                break
+            revisados = len(ranking)
+            tanda *= 4
+        return encontrados[:top_k]
+
+    def rankear_campos(self, consulta: str, top_k: int = 10, pesos_campos: Dict[str, float] = None,
+                       modelo: str = 'coseno') -> List[Tuple[int, float]]:
+        """top k con pesos de campo elegidos en la consulta ({campo: peso}; sin pesos, los de la construccion)
+
+        modelo 'coseno' (el de rankear, solo con los pesos de la construccion) o 'bm25f' (con cualquier peso);
+        solo se leen los postings de los campos con peso.
+        sin indice por campos se usa rankear, con los pesos de la construccion. ValueError si los pesos
+        o el modelo no sirven
+        """
+        self.refrescar_segmentos()
+        terminos = self.analizador.analizar(consulta)
+        if not terminos:
+            log.debug("no hay terminos validos en la consulta despues del procesamiento")
+            return []
+        if self.campos is None:
+            log.debug("no hay indice por campos, se rankea con los pesos de la construccion")
+            return self.rankear(consulta, top_k, self._pesos_terminos(terminos))
+        pesos = self.campos.validar_pesos(pesos_campos, modelo)
+        # bm25f cuenta las repeticiones del termino en la consulta; coseno usa el mismo log que procesar_consulta
+        terminos_consulta = self._pesos_terminos(terminos) if modelo == 'coseno' else dict(Counter(terminos))
+        return self.campos.top_k(terminos_consulta, pesos, modelo, top_k)
+
+    def sugerir(self, prefijo: str, cantidad: int = MAX_SUGERENCIAS) -> Dict[str, List[Dict]]:
+        """completaciones del prefijo escrito: {"terminos", "titulos", "artistas"} con texto y peso
+
+        no toca los postings ni la cache de resultados; sin sugerencias.npz las listas vienen vacias
+        """
+        if self.sugerencias is None:
+            return {"terminos": [], "titulos": [], "artistas": []}
+        return self.sugerencias.sugerir(prefijo, cantidad)
+
+    def _documentos_con_todos(self, terminos_consulta: Dict[str, float]) -> set:
+        arbol = ('y', tuple(('termino', termino) for termino in terminos_consulta))
+        return set(evaluar(arbol, self._ids_ordenados, self._df, self._ids_frase).tolist())
+
+    def rankear_booleana(self, consulta: str, top_k: int = 10) -> List[Tuple[int, float]]:
+        """top k de los documentos que cumplen una consulta con AND, OR, NOT, parentesis y "frases"
+
+        primero se resuelve el conjunto de documentos sobre las listas de ids ordenadas (ver ConsultaBooleana.py)
+        y solo esos se puntuan, con la similitud coseno de los terminos que no estan bajo un NOT.
+        ValueError si la consulta esta mal formada
+        """
+        self.refrescar_segmentos()
+        arbol = analizar_consulta_booleana(consulta, self.analizador)
+        if arbol is None:
+            log.debug("no hay terminos validos en la consulta despues del procesamiento")
+            return []
+        documentos = evaluar(arbol, self._ids_ordenados, self._df, self._ids_frase)
+        terminos_consulta = self._pesos_terminos(terminos_positivos(arbol))
+        if not len(documentos) or not terminos_consulta or top_k <= 0:
+            return []
+        return self._rankear_terminos(terminos_consulta, top_k, self._obtener_postings, set(documentos.tolist()))
+
+    def _ids_ordenados(self, termino: str) -> np.ndarray:
+        postings = self._obtener_postings(termino)
+        if not postings:
+            return VACIA
+        ids = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+        if len(ids) > 1 and not (ids[1:] > ids[:-1]).all():
+            ids.sort()  # los postings decodificados ya vienen en orden de id; por si acaso
+        return ids
+
+    def _df(self, termino: str) -> int:
+        # en modo perezoso el df esta en el diccionario y no hace falta leer la lista
+        if self.lector_indice is not None and self.segmentos is None:
+            return self.lector_indice.df(termino)
+        return len(self._obtener_postings(termino) or {})
+
+    def _ids_frase(self, terminos: Tuple[str, ...]) -> np.ndarray:
+        if self.posiciones is not None:
+            return self.posiciones.buscar_frase(list(terminos))
+        arbol = ('y', tuple(('termino', termino) for termino in terminos))  # sin posiciones: AND de los terminos
+        return evaluar(arbol, self._ids_ordenados, self._df, self._ids_frase)
+
+    def _rankear_terminos(self, terminos_consulta: Dict[str, float], top_k: int,
+                          obtener_postings, documentos: set = None) -> List[Tuple[int, float]]:
+        norma_consulta, listas = self._listas_consulta(terminos_consulta, obtener_postings, documentos)
+        return self._seleccionar(listas, norma_consulta, top_k)
+
+    def _listas_consulta(self, terminos_consulta: Dict[str, float], obtener_postings,
+                         documentos: set = None) -> Tuple[float, List]:
+        # con documentos solo se puntuan esos (el idf y la cota de cada termino siguen siendo los de la lista entera)
         norma_consulta = math.sqrt(sum(freq ** 2 for freq in terminos_consulta.values()))
-        puntuaciones = defaultdict(float)
-
-        for termino, frecuencia_q in terminos_consulta.items():
-            if termino in self.indice_invertido:
-                postings = self.indice_invertido[termino]
-                print("_-----------")
-                print(postings)
-                print("_-----------")
-                idf = math.log10(len(self.normas_documentos) / len(postings)) if len(postings) > 0 else 1
-                for id_documento, frecuencia_d in postings.items():
-                    puntuaciones[id_documento] += frecuencia_q * frecuencia_d * idf
-
-        # normalizar las puntuaciones por las normas de los documentos y la norma de la consulta
-        similitud_coseno = {}
-        for id_documento in puntuaciones:
-            if self.normas_documentos.get(id_documento, 0) > 0 and norma_consulta > 0:
-                similitud_coseno[id_documento] = puntuaciones[id_documento] / (self.normas_documentos[id_documento] * norma_consulta)
-            else:
-                similitud_coseno[id_documento] = 0.0
+        listas = []
+        with etapa("postings"):
+            postings_terminos = [obtener_postings(termino) for termino in terminos_consulta]
+
+        for (termino, frecuencia_q), postings in zip(terminos_consulta.items(), postings_terminos):
+            if postings is not None:
+                if self.usar_impactos:
+                    idf = 1.0  # el impacto ya incluye idf y norma
+                else:
+                    idf = math.log10(self.numero_documentos / len(postings)) if len(postings) > 0 else 1
+                impacto = self._impacto_maximo(termino, postings)
+                if documentos is not None:
+                    postings = {id_documento: postings[id_documento] for id_documento in documentos
+                                if id_documento in postings}
+                listas.append((frecuencia_q, idf, postings, impacto))
+        return norma_consulta, listas
+
+    def _seleccionar(self, listas: List, norma_consulta: float, top_k: int) -> List[Tuple[int, float]]:
+        # top k con heap acotado y poda MaxScore (mismo resultado que ordenar todas las similitudes)
+        seleccionar = top_k_maxscore if self.poda_maxscore else top_k_exhaustivo
+        normas = None if self.usar_impactos else self.normas_documentos
+        return seleccionar(listas, normas, norma_consulta, top_k)
+
+    def rankear_lote(self, consultas: List[str], top_k: Union[int, List[int]] = 10,
+                     terminos_consultas: List[Dict[str, float]] = None) -> List[List[Tuple[int, float]]]:
+        """rankear para varias consultas (top_k comun o uno por consulta), en el mismo orden
+
+        cada consulta se analiza una vez y los postings de cada termino distinto se leen una sola vez;
+        con el puntuador 'matriz' se puntuan todas con un solo producto
+        """
+        self.refrescar_segmentos()
+        if terminos_consultas is None:
+            terminos_consultas = [self.procesar_consulta(consulta) for consulta in consultas]
+        tops = top_k if isinstance(top_k, list) else [top_k] * len(terminos_consultas)
+        if len(tops) != len(terminos_consultas):
+            raise ValueError(f"se recibieron {len(tops)} top_k para {len(terminos_consultas)} consultas")
+        if self.matriz is not None:
+            return self.matriz.top_k_lote(terminos_consultas, tops)
+
+        postings_lote = {}
+        for terminos_consulta in terminos_consultas:
+            for termino in terminos_consulta:
+                if termino not in postings_lote:
+                    postings_lote[termino] = self._obtener_postings(termino)
+        return [self._rankear_terminos(terminos_consulta, top, postings_lote.get) if terminos_consulta else []
+                for terminos_consulta, top in zip(terminos_consultas, tops)]
+
+    def buscar(self, consulta: str, top_k: int = 10, terminos_consulta: Dict[str, float] = None,
+               difusa: bool = False) -> Dict[str, Dict]:
+        self.refrescar_segmentos()
+        version = self.version_indice
+        if terminos_consulta is None:
+            # con difusa los terminos mal escritos se cambian por los parecidos (ver expandir_difusos)
+            terminos_consulta = self.procesar_consulta(consulta, difusa)
+        if self.cache_resultados is not None:
+            clave = clave_resultados(terminos_consulta, top_k)
+            resultados = self.cache_resultados.obtener(clave, version)
+            if resultados is not None:
+                return resultados
+        ranking = self.rankear(consulta, top_k, terminos_consulta)
+        resultados = self._resultados(ranking, self._cargar_documentos(doc_id for doc_id, _ in ranking))
+        # si el indice cambio a mitad de la consulta el resultado no se guarda
+        if self.cache_resultados is not None and version == self.version_indice:
+            self.cache_resultados.guardar(clave, version, resultados)
+        return resultados
+
+    def buscar_frase(self, consulta: str, top_k: int = 10, distancia: int = 0) -> Dict[str, Dict]:
+        """buscar con rankear_frase; comparte la cache de resultados con buscar (con otra clave)"""
+        self.refrescar_segmentos()
+        version = self.version_indice
+        clave = ("frase", tuple(self.analizador.analizar(consulta)), distancia, top_k)
+        if self.cache_resultados is not None:
+            resultados = self.cache_resultados.obtener(clave, version)
+            if resultados is not None:
+                return resultados
+        ranking = self.rankear_frase(consulta, top_k, distancia)
+        resultados = self._resultados(ranking, self._cargar_documentos(doc_id for doc_id, _ in ranking))
+        if self.cache_resultados is not None and version == self.version_indice:
+            self.cache_resultados.guardar(clave, version, resultados)
+        return resultados
+
+    def buscar_booleana(self, consulta: str, top_k: int = 10) -> Dict[str, Dict]:
+        """buscar con rankear_booleana; la clave de la cache es el arbol de la consulta"""
+        self.refrescar_segmentos()
+        version = self.version_indice
+        clave = ("booleana", analizar_consulta_booleana(consulta, self.analizador), top_k)
+        if self.cache_resultados is not None:
+            resultados = self.cache_resultados.obtener(clave, version)
+            if resultados is not None:
+                return resultados
+        ranking = self.rankear_booleana(consulta, top_k)
+        resultados = self._resultados(ranking, self._cargar_documentos(doc_id for doc_id, _ in ranking))
+        if self.cache_resultados is not None and version == self.version_indice:
+            self.cache_resultados.guardar(clave, version, resultados)
+        return resultados
 
-        # ordenar y recuperar los Top K resultados
-        resultados_top_ids = dict(sorted(similitud_coseno.items(), key=lambda item: item[1], reverse=True)[:top_k])
+    def buscar_campos(self, consulta: str, top_k: int = 10, pesos_campos: Dict[str, float] = None,
+                      modelo: str = 'coseno') -> Dict[str, Dict]:
+        """buscar con rankear_campos; la clave de la cache lleva los pesos y el modelo"""
+        self.refrescar_segmentos()
+        version = self.version_indice
+        pesos = self.campos.validar_pesos(pesos_campos, modelo) if self.campos is not None else None
+        clave = ("campos", modelo, tuple(pesos.items()) if pesos else None,
+                 tuple(sorted(self.analizador.analizar(consulta))), top_k)
+        if self.cache_resultados is not None:
+            resultados = self.cache_resultados.obtener(clave, version)
+            if resultados is not None:
+                return resultados
+        ranking = self.rankear_campos(consulta, top_k, pesos, modelo)
+        resultados = self._resultados(ranking, self._cargar_documentos(doc_id for doc_id, _ in ranking))
+        if self.cache_resultados is not None and version == self.version_indice:
+            self.cache_resultados.guardar(clave, version, resultados)
+        return resultados
 
-        # cargar los datos de los documentos correspondientes y agregar la similitud del coseno
-        documentos_resultados = self._cargar_documentos(resultados_top_ids.keys())
-        for doc_id in documentos_resultados:
-            documentos_resultados[doc_id]['similitud_coseno'] = round(resultados_top_ids[doc_id], 3)  # redondear la similitud
+    def buscar_lote(self, consultas: List[str], top_k: Union[int, List[int]] = 10) -> List[Dict[str, Dict]]:
+        """buscar para varias consultas; los documentos que se repiten entre consultas se cargan una vez"""
+        self.refrescar_segmentos()
+        version = self.version_indice
+        terminos_consultas = [self.procesar_consulta(consulta) for consulta in consultas]
+        tops = top_k if isinstance(top_k, list) else [top_k] * len(consultas)
+        resultados = [None] * len(consultas)
+        if self.cache_resultados is not None:
+            claves = [clave_resultados(terminos, top) for terminos, top in zip(terminos_consultas, tops)]
+            resultados = [self.cache_resultados.obtener(clave, version) for clave in claves]
+        pendientes = [posicion for posicion, resultado in enumerate(resultados) if resultado is None]
+        if not pendientes:
+            return resultados
 
+        rankings = self.rankear_lote([consultas[posicion] for posicion in pendientes],
+                                     [tops[posicion] for posicion in pendientes],
+                                     [terminos_consultas[posicion] for posicion in pendientes])
+        ids_documentos = dict.fromkeys(doc_id for ranking in rankings for doc_id, _ in ranking)
+        documentos = self._cargar_documentos(ids_documentos)
+        for posicion, ranking in zip(pendientes, rankings):
+            resultados[posicion] = self._resultados(ranking, documentos)
+            if self.cache_resultados is not None and version == self.version_indice:
+                self.cache_resultados.guardar(claves[posicion], version, resultados[posicion])
+        return resultados
+
+    def _resultados(self, ranking: List[Tuple[int, float]], documentos: Dict[int, Dict]) -> Dict[str, Dict]:
+        # datos de cada documento del ranking con su similitud del coseno, en el orden del ranking
+        documentos_resultados = {}
+        for doc_id, similitud in ranking:
+            if doc_id in documentos:
+                registro = dict(documentos[doc_id])  # copia: el mismo documento puede estar en varias consultas
+                registro['similitud_coseno'] = round(similitud, 3)  # redondear la similitud
+                documentos_resultados[str(doc_id)] = registro  # en la respuesta json el id va como texto
         return documentos_resultados
 
-    def _cargar_documentos(self, ids_documentos) -> Dict[str, Dict]:
+    def _obtener_postings(self, termino: str):
+        if self.segmentos is not None:
+            segmentos, cache = self._segmentos_y_cache
+            return cache.obtener(termino, segmentos.postings)
+        if self.lector_indice is None:
+            return self.indice_invertido.get(termino)
+        if termino not in self.lector_indice:
+            return None
+        return self.cache_postings.obtener(termino, self.lector_indice.postings)
+
+    def _impacto_maximo(self, termino: str, postings: Dict[int, float]) -> float:
+        impacto = self.impactos_maximos.get(termino)
+        if impacto is None and self.usar_impactos:
+            impacto = max(postings.values(), default=0.0)
+            self.impactos_maximos[termino] = impacto
+        elif impacto is None:
+            # indices sin cotas (parciales antiguos): se calcula una vez y se recuerda
+            ids = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+            pesos = np.fromiter(postings.values(), dtype=np.float64, count=len(postings))
+            normas = np.zeros(len(ids))
+            dentro = ids < len(self.normas_documentos)
+            normas[dentro] = self.normas_documentos[ids[dentro]]
+            validos = normas > 0
+            impacto = float(np.max(pesos[validos] / normas[validos])) if validos.any() else 0.0
+            self.impactos_maximos[termino] = impacto
+        return impacto
+
+    def estadisticas_cache(self) -> Dict[str, float]:
+        """contadores de aciertos/fallos de la cache de postings (solo modo perezoso)"""
+        if self.cache_postings is None:
+            return {}
+        return self.cache_postings.estadisticas()
+
+    def estadisticas_cache_resultados(self) -> Dict[str, float]:
+        """aciertos, fallos, desalojos y vencimientos de la cache de resultados (vacio si esta desactivada)"""
+        if self.cache_resultados is None:
+            return {}
+        return self.cache_resultados.estadisticas()
+
+    def _cargar_documentos(self, ids_documentos) -> Dict[int, Dict]:
         """cargar los datos de los documentos a partir de sus id's"""
         documentos = {}
-        try:
-            for id_doc in ids_documentos:
-                if id_doc in self.dataframe.index:
-                    registro = self.dataframe.loc[id_doc].to_dict()
-                    documentos[id_doc] = registro
-                else:
-                    print(f"ID {id_doc} no encontrado en el DataFrame")
-        except Exception as e:
-            print(f"Error al cargar los documentos: {e}")
+        with etapa("documentos"):
+            try:
+                for id_doc in ids_documentos:
+                    if self.almacen_documentos is not None and id_doc in self.almacen_documentos:
+                        documentos[id_doc] = self.almacen_documentos.obtener(id_doc)
+                    elif self.dataframe is not None and id_doc in self.dataframe.index:
+                        registro = self.dataframe.loc[id_doc].to_dict()
+                        documentos[id_doc] = registro
+                    else:
+                        log.warning("documento %s no encontrado", id_doc)
+            except Exception as e:
+                log.error("error al cargar los documentos: %s", e)
         return documentos
 
 # Ejemplo de Uso
 if __name__ == "__main__":
+    import argparse
+    # uso: python -m app.Final2 [--workers N]
+    parser = argparse.ArgumentParser(description="construye el indice invertido a partir del csv")
+    parser.add_argument("--workers", type=int, default=1, help="procesos para tokenizar los chunks en paralelo")
+    argumentos = parser.parse_args()
+
     # Paso 1:  para calcular y guardar los pesos
 
     # Paso 2: construir el rndice rnvertido 
@@ -305,7 +1157,8 @@ if __name__ == "__main__":
         ruta_stoplist=RUTA_STOPLIST,
         ruta_indice=RUTA_INDICE_LOCAL,
         ruta_normas=RUTA_NORMAS,
-        ruta_pesos=RUTA_PESOS_CAMPO  # Ruta para los pesos preprocesados
+        ruta_pesos=RUTA_PESOS_CAMPO,  # Ruta para los pesos preprocesados
+        workers=argumentos.workers
     )
     indice.construir_indice()
 
@@ -0,0 +1,158 @@
+import os
+import heapq
+import numpy as np
+from typing import List, Tuple
+
+from .IndiceBinario import (EscritorIndiceBinario, RecorredorIndiceBinario, ESCALA_PESOS, codificar_varint,
+                            codificar_postings, decodificar_varints)
+
+# FUSION EXTERNA (SPIMI) DE LOS INDICES PARCIALES
+# los indice_parcial_N.bin tienen los terminos ordenados, asi que se pueden fusionar en streaming
+# con un heap de k vias sin cargar ningun parcial completo en memoria
+
+MEMORIA_MAXIMA = 256 * 1024 * 1024  # techo de memoria para los buffers de la fusion
+TAMANIO_BUFFER_MINIMO = 64 * 1024
+NOMBRE_INDICE_FINAL = "indice_final.bin"
+
+
+def _longitud_primer_varint(datos: bytes) -> int:
+    posicion = 0
+    while datos[posicion] >= 0x80:
+        posicion += 1
+    return posicion + 1
+
+
+def _combinar_postings(contribuciones: List[Tuple[int, int, bytes, int]], escala: int) -> Tuple[bytes, int]:
+    """une los postings de un termino que viene de varios parciales (ordenados por numero de parcial)
+
+    cada parcial cubre un rango de documentos distinto, asi que basta con reescribir el primer delta
+    de cada lista y copiar el resto de bytes tal cual; si los rangos se solapan se reconstruye la lista
+    """
+    salida = bytearray()
+    anterior = 0
+    total = 0
+    for _, df, datos, escala_parcial in contribuciones:
+        valores = decodificar_varints(datos)
+        ids = valores[0::2].cumsum()
+        if escala_parcial != escala or int(ids[0]) <= anterior and total > 0:
+            return _combinar_con_solape(contribuciones, escala)
+        codificar_varint(int(ids[0]) - anterior, salida)
+        salida += datos[_longitud_primer_varint(datos):]
+        anterior = int(ids[-1])
+        total += df
+    return bytes(salida), total
+
+
+def _combinar_con_solape(contribuciones, escala: int) -> Tuple[bytes, int]:
+    postings = {}
+    for _, _, datos, escala_parcial in contribuciones:
+        valores = decodificar_varints(datos)
+        # igual que dict.update en la carga anterior: el ultimo parcial gana
+        postings.update(zip(valores[0::2].cumsum().tolist(), (valores[1::2] / escala_parcial).tolist()))
+    return codificar_postings(postings, escala), len(postings)
+
+
+def impacto_maximo(datos: bytes, escala: int, normas: np.ndarray) -> float:
+    """cota superior de peso / norma en la lista (los documentos con norma 0 puntuan 0)"""
+    valores = decodificar_varints(datos)
+    ids = valores[0::2].cumsum()
+    dentro = ids < len(normas)
+    normas_lista = np.zeros(len(ids))
+    normas_lista[dentro] = normas[ids[dentro]]
+    validos = normas_lista > 0
+    if not validos.any():
+        return 0.0
+    maximo = float(np.max((valores[1::2][validos] / escala) / normas_lista[validos]))
+    # se guarda como float32 redondeando hacia arriba para que siga siendo cota
+    cota = np.float32(maximo)
+    if float(cota) < maximo:
+        cota = np.nextafter(cota, np.float32(np.inf))
+    return float(cota)
+
+
+def _fusionar_grupo(rutas: List[str], ruta_salida: str, tamanio_buffer: int, escala: int,
+                    normas: np.ndarray = None):
+    abiertos = [RecorredorIndiceBinario(ruta, tamanio_buffer) for ruta in rutas]
+    escalas = [recorredor.escala for recorredor in abiertos]
+    recorredores = [iter(recorredor) for recorredor in abiertos]
+    heap = []
+    for orden, recorredor in enumerate(recorredores):
+        siguiente = next(recorredor, None)
+        if siguiente is not None:
+            termino, df, datos = siguiente
+            heap.append((termino, orden, df, datos))
+    heapq.heapify(heap)
+
+    with EscritorIndiceBinario(ruta_salida, escala, tamanio_buffer, con_impactos=normas is not None) as escritor:
+        while heap:
+            termino = heap[0][0]
+            contribuciones = []
+            while heap and heap[0][0] == termino:
+                _, orden, df, datos = heapq.heappop(heap)
+                contribuciones.append((orden, df, datos, escalas[orden]))
+                siguiente = next(recorredores[orden], None)
+                if siguiente is not None:
+                    heapq.heappush(heap, (siguiente[0], orden, siguiente[1], siguiente[2]))
+            contribuciones.sort()
+            datos, df = _combinar_postings(contribuciones, escala)
+            cota = impacto_maximo(datos, escala, normas) if normas is not None else 0.0
+            escritor.agregar_termino_codificado(termino, datos, df, cota)
+
+
+def fusionar_indices_parciales(rutas_parciales: List[str], ruta_salida: str, memoria_maxima: int = MEMORIA_MAXIMA,
+                               escala: int = ESCALA_PESOS, normas: np.ndarray = None) -> str:
+    """fusiona los parciales (en orden de chunk) en un unico indice binario
+
+    cada parcial abierto usa dos buffers (diccionario y postings) y la salida otros dos; si con el techo
+    de memoria no entran todos los parciales a la vez se fusiona por pasadas en archivos intermedios.
+    si se pasan las normas, el indice final guarda por termino la cota max(peso / norma) para MaxScore
+    """
+    if not rutas_parciales:
+        raise ValueError("no hay indices parciales que fusionar")
+    max_abiertos = max(2, memoria_maxima // (2 * TAMANIO_BUFFER_MINIMO) - 1)
+    pasada = 0
+    temporales = []
+    while len(rutas_parciales) > max_abiertos:
+        pasada += 1
+        siguientes = []
+        for inicio in range(0, len(rutas_parciales), max_abiertos):
+            grupo = rutas_parciales[inicio:inicio + max_abiertos]
+            ruta_intermedia = f"{ruta_salida}.pasada{pasada}_{len(siguientes)}"
+            _fusionar_grupo(grupo, ruta_intermedia, memoria_maxima // (2 * len(grupo) + 2), escala)
+            siguientes.append(ruta_intermedia)
+        for ruta in temporales:
+            os.remove(ruta)
+        temporales = siguientes
+        rutas_parciales = siguientes
+        print(f"pasada {pasada} de fusion: {len(rutas_parciales)} archivos intermedios")
+
+    # sin copiar: puede ser el memmap de normas.npy, se leen solo los ids de cada lista
+    arreglo_normas = np.asarray(normas) if normas is not None else None
+    _fusionar_grupo(rutas_parciales, ruta_salida, memoria_maxima // (2 * len(rutas_parciales) + 2), escala,
+                    arreglo_normas)
+    for ruta in temporales:
+        os.remove(ruta)
+    print(f"indice final guardado en {ruta_salida}")
+    return ruta_salida
+
+
+def listar_parciales_binarios(ruta_indice: str) -> List[str]:
+    parciales = [archivo for archivo in os.listdir(ruta_indice)
+                 if archivo.startswith("indice_parcial_") and archivo.endswith(".bin")]
+    parciales.sort(key=lambda archivo: int(archivo[len("indice_parcial_"):-len(".bin")]))
+    return [os.path.join(ruta_indice, archivo) for archivo in parciales]
+
+
+if __name__ == "__main__":
+    import argparse
+    from .Normas import cargar_normas
+    # uso: python -m app.FusionExterna <directorio con indice_parcial_N.bin> [--memoria MB] [--normas normas.npy]
+    parser = argparse.ArgumentParser(description="fusion externa de los indices parciales binarios")
+    parser.add_argument("ruta_indice")
+    parser.add_argument("--memoria", type=int, default=MEMORIA_MAXIMA // (1024 * 1024), help="techo de memoria en MB")
+    parser.add_argument("--normas", help="normas.npy (o un normas.json anterior) para guardar las cotas de MaxScore")
+    argumentos = parser.parse_args()
+    normas = cargar_normas(argumentos.normas) if argumentos.normas else None
+    fusionar_indices_parciales(listar_parciales_binarios(argumentos.ruta_indice),
+                               os.path.join(argumentos.ruta_indice, NOMBRE_INDICE_FINAL),
+                               argumentos.memoria * 1024 * 1024, normas=normas)
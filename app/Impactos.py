@@ -0,0 +1,108 @@
+import math
+import numpy as np
+from typing import Dict, List
+
+from .IndiceBinario import (EscritorIndiceBinario, RecorredorIndiceBinario, ESCALA_IMPACTOS, TAMANIO_BUFFER,
+                            codificar_varints, decodificar_varints)
+from .Normas import cargar_normas
+
+# PASADA DE ESTADISTICAS GLOBALES
+# con el indice final ya fusionado se conocen df y N, asi que cada posting puede guardar directamente
+# su impacto tf·idf/norma. en consulta la similitud queda como sum(frecuencia_q * impacto) / norma_consulta,
+# sin calcular idf ni buscar la norma de cada documento candidato
+
+NOMBRE_INDICE_IMPACTOS = "indice_impactos.bin"
+
+
+def _cota_float32(maximo: float) -> float:
+    cota = np.float32(maximo)
+    if float(cota) < maximo:
+        cota = np.nextafter(cota, np.float32(np.inf))
+    return float(cota)
+
+
+def calcular_impactos(ruta_final: str, ruta_salida: str, normas: np.ndarray, numero_documentos: int = None,
+                      tamanio_buffer: int = TAMANIO_BUFFER) -> str:
+    """recorre indice_final.bin en streaming y escribe el indice de impactos precalculados"""
+    arreglo_normas = np.asarray(normas)  # sin copiar: puede ser el memmap de normas.npy
+    if numero_documentos is None:
+        numero_documentos = len(normas)
+    recorredor = RecorredorIndiceBinario(ruta_final, tamanio_buffer)
+    with EscritorIndiceBinario(ruta_salida, ESCALA_IMPACTOS, tamanio_buffer, con_impactos=True,
+                               impactos_precalculados=True) as escritor:
+        for termino, df, datos in recorredor:
+            valores = decodificar_varints(datos)
+            ids = valores[0::2].cumsum()
+            pesos = valores[1::2] / recorredor.escala
+            # mismo idf que usaba buscar: log10(N / df)
+            idf = math.log10(numero_documentos / df) if df > 0 else 1
+            normas_lista = np.zeros(len(ids))
+            dentro = ids < len(arreglo_normas)
+            normas_lista[dentro] = arreglo_normas[ids[dentro]]
+            impactos = np.zeros(len(ids))
+            validos = normas_lista > 0  # documentos sin norma puntuan 0, como antes
+            impactos[validos] = pesos[validos] * idf / normas_lista[validos]
+            cuantizados = np.rint(impactos * ESCALA_IMPACTOS).astype(np.int64)
+            valores[1::2] = cuantizados
+            cota = _cota_float32(int(cuantizados.max()) / ESCALA_IMPACTOS) if len(cuantizados) else 0.0
+            escritor.agregar_termino_codificado(termino, codificar_varints(valores), df, cota)
+    print(f"indice de impactos guardado en {ruta_salida}")
+    return ruta_salida
+
+
+def verificar_consistencia(motor_clasico, motor_impactos, consultas: List[str], top_k: int = 10,
+                           tolerancia: float = 1e-4) -> Dict[str, float]:
+    """compara el ranking con impactos precalculados contra el puntuador clasico (idf y normas en consulta)
+
+    los impactos se cuantizan, asi que puede haber diferencias en el ultimo decimal o empates que se
+    ordenan distinto. una consulta es consistente si en cada posicion del top k las similitudes coinciden
+    dentro de la tolerancia (si cambia el documento es porque estaba empatado con otro)
+    """
+    iguales = consistentes = 0
+    diferencia_maxima = 0.0
+    inconsistentes = []
+    for consulta in consultas:
+        clasico = motor_clasico.rankear(consulta, top_k)
+        impactos = motor_impactos.rankear(consulta, top_k)
+        if [d for d, _ in clasico] == [d for d, _ in impactos]:
+            iguales += 1
+        diferencias = [abs(a - b) for (_, a), (_, b) in zip(clasico, impactos)]
+        if len(clasico) == len(impactos) and all(diferencia <= tolerancia for diferencia in diferencias):
+            consistentes += 1
+        else:
+            inconsistentes.append(consulta)
+        diferencia_maxima = max([diferencia_maxima] + diferencias)
+    total = max(len(consultas), 1)
+    reporte = {
+        "consultas": len(consultas),
+        "mismo_orden": round(iguales / total, 4),
+        "consistentes": round(consistentes / total, 4),
+        "diferencia_maxima_similitud": diferencia_maxima,
+        "ejemplos_inconsistentes": inconsistentes[:5],
+    }
+    print(f"verificacion de impactos: {reporte}")
+    return reporte
+
+
+if __name__ == "__main__":
+    import os
+    import argparse
+    # uso: python -m app.Impactos <ruta_indice> <normas.npy> [--verificar csv stoplist consultas.txt]
+    parser = argparse.ArgumentParser(description="precalcula impactos tf·idf/norma a partir de indice_final.bin")
+    parser.add_argument("ruta_indice")
+    parser.add_argument("ruta_normas")
+    parser.add_argument("--verificar", nargs=3, metavar=("CSV", "STOPLIST", "CONSULTAS"))
+    argumentos = parser.parse_args()
+    normas = cargar_normas(argumentos.ruta_normas)
+    calcular_impactos(os.path.join(argumentos.ruta_indice, "indice_final.bin"),
+                      os.path.join(argumentos.ruta_indice, NOMBRE_INDICE_IMPACTOS), normas)
+    if argumentos.verificar:
+        from .Final2 import MotorConsulta
+        ruta_csv, ruta_stoplist, ruta_consultas = argumentos.verificar
+        with open(ruta_consultas, 'r', encoding='utf-8') as archivo:
+            consultas = [linea.strip() for linea in archivo if linea.strip()]
+        clasico = MotorConsulta(ruta_csv, argumentos.ruta_indice, argumentos.ruta_normas, ruta_stoplist,
+                                modo_carga='perezoso')
+        con_impactos = MotorConsulta(ruta_csv, argumentos.ruta_indice, argumentos.ruta_normas, ruta_stoplist,
+                                     modo_carga='perezoso', usar_impactos=True)
+        verificar_consistencia(clasico, con_impactos, consultas)
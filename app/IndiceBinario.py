@@ -0,0 +1,568 @@
+import os
+import json
+import mmap
+import logging
+import shutil
+import zlib
+import struct
+import numpy as np
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Tuple
+
+# FORMATO BINARIO DEL INDICE INVERTIDO
+#
+#   [cabecera][postings termino 1][postings termino 2]...[diccionario]
+#
+# cabecera: magic, version, flags, numero de terminos, offset del diccionario y escala
+# postings: pares (delta id_documento, peso cuantizado) codificados como varint; al leerlos los ids son int
+# diccionario: por cada termino (ordenados) -> termino, df, offset y longitud de sus postings
+#              (+ float32 con el impacto maximo peso/norma si la cabecera tiene FLAG_IMPACTO_MAXIMO)
+#
+# <indice>.dicc.npz (opcional, ver guardar_diccionario_arreglos): el mismo diccionario en arreglos de numpy.
+# recorrer el diccionario varint a varint en python es lo que mas tarda al abrir un indice grande; con los
+# arreglos el dict se arma de una vez. guarda el crc32 del diccionario del .bin y se ignora si no coincide
+#
+# <indice>.dicm (opcional, ver guardar_diccionario_mapeado): el diccionario en arreglos fijos para consultarlo
+# con mmap sin armar un dict: [cabecera][inicios][offsets][longitudes][dfs][impactos][terminos seguidos].
+# LectorIndiceBinario con usar_mmap lo usa si existe: los terminos se buscan por busqueda binaria (el
+# diccionario esta ordenado) y no se crea ningun objeto por termino, asi que varios procesos que sirven el
+# mismo indice comparten estas paginas en vez de tener cada uno su dict
+
+MAGIC = b'IIBD'
+VERSION = 1
+FORMATO_CABECERA = '<4sHHIQI'
+TAMANIO_CABECERA = struct.calcsize(FORMATO_CABECERA)
+ESCALA_PESOS = 4096  # los pesos log(1 + tf) se guardan como round(peso * ESCALA_PESOS)
+TAMANIO_BUFFER = 1024 * 1024  # buffer de lectura/escritura por archivo abierto
+FLAG_IMPACTO_MAXIMO = 1  # cota superior por termino para la poda MaxScore
+FLAG_IMPACTOS = 2  # los postings guardan tf·idf/norma listos para sumar en vez de log(1 + tf)
+FLAG_POSICIONES = 4  # los postings son listas de posiciones (ver Posiciones.py), no pesos
+ESCALA_IMPACTOS = 65536
+FORMATO_IMPACTO = '<f'
+SUFIJO_DICCIONARIO = '.dicc.npz'
+SUFIJO_DICCIONARIO_MAPEADO = '.dicm'
+MAGIC_DICCIONARIO = b'DICM'
+FORMATO_CABECERA_DICCIONARIO = '<4sHHQQ'  # magic, version, reservado, numero de terminos, crc32 del diccionario
+TAMANIO_CABECERA_DICCIONARIO = struct.calcsize(FORMATO_CABECERA_DICCIONARIO)
+
+log = logging.getLogger(__name__)
+
+
+def codificar_varint(valor: int, salida: bytearray):
+    while valor >= 0x80:
+        salida.append((valor & 0x7F) | 0x80)
+        valor >>= 7
+    salida.append(valor)
+
+
+def decodificar_varint(datos, posicion: int) -> Tuple[int, int]:
+    resultado = 0
+    desplazamiento = 0
+    while True:
+        byte = datos[posicion]
+        posicion += 1
+        resultado |= (byte & 0x7F) << desplazamiento
+        if byte < 0x80:
+            return resultado, posicion
+        desplazamiento += 7
+
+
+def codificar_postings(postings: Dict, escala: int = ESCALA_PESOS) -> bytes:
+    """codifica {id_documento: peso} ordenando por id y guardando deltas"""
+    salida = bytearray()
+    anterior = 0
+    for id_documento, peso in sorted((int(k), v) for k, v in postings.items()):
+        codificar_varint(id_documento - anterior, salida)
+        codificar_varint(int(round(peso * escala)), salida)
+        anterior = id_documento
+    return bytes(salida)
+
+
+def decodificar_varints(datos) -> np.ndarray:
+    """decodifica de golpe una secuencia de varints con numpy (mucho mas rapido que byte a byte)"""
+    bytes_ = np.frombuffer(datos, dtype=np.uint8)
+    finales = np.flatnonzero(bytes_ < 0x80)
+    if len(finales) == len(bytes_):
+        return bytes_.astype(np.int64)  # todos de un byte (deltas y posiciones chicas)
+    inicios = np.empty(len(finales), dtype=np.int64)
+    inicios[:1] = 0
+    inicios[1:] = finales[:-1] + 1
+    valores = (bytes_[inicios] & 0x7F).astype(np.int64)
+    # byte k de los valores que todavia tienen bytes; cada vuelta deja solo los mas largos
+    largos = np.flatnonzero(finales > inicios)
+    k = 1
+    while len(largos):
+        lugares = inicios[largos] + k
+        valores[largos] |= (bytes_[lugares] & 0x7F).astype(np.int64) << (7 * k)
+        largos = largos[finales[largos] > lugares]
+        k += 1
+    return valores
+
+
+def codificar_varints(valores: np.ndarray) -> bytes:
+    """version vectorizada de codificar_varint para un arreglo de enteros no negativos (< 2**35)"""
+    valores = np.asarray(valores, dtype=np.int64)
+    numero_bytes = 1 + sum((valores >= (1 << (7 * i))).astype(np.int64) for i in range(1, 5))
+    inicios = np.cumsum(numero_bytes) - numero_bytes
+    salida = np.zeros(int(numero_bytes.sum()), dtype=np.uint8)
+    for i in range(5):
+        presentes = numero_bytes > i
+        if not presentes.any():
+            break
+        byte = (valores[presentes] >> (7 * i)) & 0x7F
+        byte |= np.where(numero_bytes[presentes] > i + 1, 0x80, 0)
+        salida[inicios[presentes] + i] = byte
+    return salida.tobytes()
+
+
+def decodificar_arreglos(datos, escala: int = ESCALA_PESOS) -> Tuple[np.ndarray, np.ndarray]:
+    valores = decodificar_varints(datos)
+    return np.cumsum(valores[0::2]), valores[1::2] / escala
+
+
+def decodificar_postings(datos, escala: int = ESCALA_PESOS) -> Dict[int, float]:
+    ids, pesos = decodificar_arreglos(datos, escala)
+    return dict(zip(ids.tolist(), pesos.tolist()))
+
+
+class EscritorIndiceBinario:
+    """escribe un indice binario termino por termino (los terminos deben llegar ordenados)"""
+
+    def __init__(self, ruta: str, escala: int = ESCALA_PESOS, tamanio_buffer: int = TAMANIO_BUFFER,
+                 con_impactos: bool = False, impactos_precalculados: bool = False, posiciones: bool = False):
+        self.ruta = ruta
+        self.escala = escala
+        self.tamanio_buffer = tamanio_buffer
+        self.flags = ((FLAG_IMPACTO_MAXIMO if con_impactos else 0) | (FLAG_IMPACTOS if impactos_precalculados else 0)
+                      | (FLAG_POSICIONES if posiciones else 0))
+        self.archivo = open(ruta, 'wb', buffering=tamanio_buffer)
+        self.archivo.write(b'\x00' * TAMANIO_CABECERA)  # se completa al cerrar
+        # el diccionario se acumula en un buffer y se vuelca a un archivo temporal si crece demasiado
+        self.diccionario = bytearray()
+        self.archivo_diccionario = None
+        self.numero_terminos = 0
+        self.ultimo_termino = None
+
+    def agregar_termino(self, termino: str, postings: Dict):
+        self.agregar_termino_codificado(termino, codificar_postings(postings, self.escala), len(postings))
+
+    def agregar_termino_codificado(self, termino: str, datos: bytes, df: int, impacto_maximo: float = 0.0):
+        if self.ultimo_termino is not None and termino <= self.ultimo_termino:
+            raise ValueError(f"los terminos deben escribirse ordenados: {termino!r} despues de {self.ultimo_termino!r}")
+        offset = self.archivo.tell()
+        self.archivo.write(datos)
+        termino_bytes = termino.encode('utf-8')
+        codificar_varint(len(termino_bytes), self.diccionario)
+        self.diccionario += termino_bytes
+        codificar_varint(df, self.diccionario)
+        codificar_varint(offset, self.diccionario)
+        codificar_varint(len(datos), self.diccionario)
+        if self.flags & FLAG_IMPACTO_MAXIMO:
+            self.diccionario += struct.pack(FORMATO_IMPACTO, impacto_maximo)
+        self.numero_terminos += 1
+        self.ultimo_termino = termino
+        if len(self.diccionario) >= self.tamanio_buffer:
+            self._volcar_diccionario()
+
+    def _volcar_diccionario(self):
+        if self.archivo_diccionario is None:
+            self.archivo_diccionario = open(self.ruta + '.dic', 'w+b')
+        self.archivo_diccionario.write(self.diccionario)
+        self.diccionario.clear()
+
+    def cerrar(self):
+        offset_diccionario = self.archivo.tell()
+        if self.archivo_diccionario is not None:
+            self._volcar_diccionario()
+            self.archivo_diccionario.seek(0)
+            shutil.copyfileobj(self.archivo_diccionario, self.archivo, self.tamanio_buffer)
+            self.archivo_diccionario.close()
+            os.remove(self.ruta + '.dic')
+        else:
+            self.archivo.write(self.diccionario)
+        self.archivo.seek(0)
+        self.archivo.write(struct.pack(FORMATO_CABECERA, MAGIC, VERSION, self.flags, self.numero_terminos,
+                                       offset_diccionario, self.escala))
+        self.archivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        self.cerrar()
+
+
+def guardar_indice_binario(indice: Dict[str, Dict], ruta: str, escala: int = ESCALA_PESOS):
+    with EscritorIndiceBinario(ruta, escala) as escritor:
+        for termino in sorted(indice):
+            escritor.agregar_termino(termino, indice[termino])
+
+
+def leer_cabecera(archivo, ruta: str) -> Tuple[int, int, int, int]:
+    """devuelve (flags, numero de terminos, offset del diccionario, escala)"""
+    cabecera = archivo.read(TAMANIO_CABECERA)
+    if len(cabecera) < TAMANIO_CABECERA:
+        raise ValueError(f"{ruta} no es un indice binario valido")
+    magic, version, flags, numero_terminos, offset_diccionario, escala = struct.unpack(FORMATO_CABECERA, cabecera)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{ruta} no es un indice binario valido (version {version})")
+    return flags, numero_terminos, offset_diccionario, escala
+
+
+class DiccionarioMapeado(Mapping):
+    """termino -> (offset, longitud, df) sobre un .dicm mapeado en memoria (de solo lectura)"""
+
+    def __init__(self, ruta: str, numero_terminos: int, crc: int):
+        self.ruta = ruta
+        with open(ruta, 'rb') as archivo:
+            self.mapa = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, numero, crc_guardado = struct.unpack_from(FORMATO_CABECERA_DICCIONARIO, self.mapa)
+        if magic != MAGIC_DICCIONARIO or version != VERSION or numero != numero_terminos or crc_guardado != crc:
+            self.mapa.close()
+            raise ValueError(f"{ruta} no corresponde al diccionario del indice")
+        self.numero_terminos = numero
+        posicion = TAMANIO_CABECERA_DICCIONARIO
+        arreglos = []
+        for tipo, cantidad in (('<u8', numero + 1), ('<u8', numero), ('<u4', numero), ('<u4', numero), ('<f4', numero)):
+            arreglos.append(np.frombuffer(self.mapa, dtype=tipo, count=cantidad, offset=posicion))
+            posicion += arreglos[-1].nbytes
+        self.inicios, self.offsets, self.longitudes, self.dfs, self.impactos = arreglos
+        self.base_terminos = posicion
+
+    def _termino(self, posicion: int) -> bytes:
+        return self.mapa[self.base_terminos + int(self.inicios[posicion]):
+                         self.base_terminos + int(self.inicios[posicion + 1])]
+
+    def posicion(self, termino: str) -> int:
+        """posicion del termino en el diccionario ordenado, o -1 si no esta"""
+        clave = termino.encode('utf-8')
+        bajo, alto = 0, self.numero_terminos
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            if self._termino(medio) < clave:
+                bajo = medio + 1
+            else:
+                alto = medio
+        return bajo if bajo < self.numero_terminos and self._termino(bajo) == clave else -1
+
+    def __getitem__(self, termino: str) -> Tuple[int, int, int]:
+        posicion = self.posicion(termino)
+        if posicion < 0:
+            raise KeyError(termino)
+        return int(self.offsets[posicion]), int(self.longitudes[posicion]), int(self.dfs[posicion])
+
+    def __contains__(self, termino) -> bool:
+        return isinstance(termino, str) and self.posicion(termino) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        for posicion in range(self.numero_terminos):
+            yield self._termino(posicion).decode('utf-8')
+
+    def __len__(self) -> int:
+        return self.numero_terminos
+
+    def values(self):
+        return zip(self.offsets.tolist(), self.longitudes.tolist(), self.dfs.tolist())
+
+    def cerrar(self):
+        # los arreglos apuntan al mapa: hay que soltarlos antes de cerrarlo
+        self.inicios = self.offsets = self.longitudes = self.dfs = self.impactos = None
+        self.mapa.close()
+
+
+class ImpactosMapeados(Mapping):
+    """termino -> impacto maximo, sobre el mismo .dicm"""
+
+    def __init__(self, diccionario: DiccionarioMapeado):
+        self.diccionario = diccionario
+
+    def __getitem__(self, termino: str) -> float:
+        posicion = self.diccionario.posicion(termino)
+        if posicion < 0:
+            raise KeyError(termino)
+        return float(self.diccionario.impactos[posicion])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.diccionario)
+
+    def __len__(self) -> int:
+        return len(self.diccionario)
+
+
+class LectorIndiceBinario:
+    """lee el diccionario de terminos en memoria y los postings bajo demanda
+
+    con usar_mmap=True los postings se leen del archivo mapeado en memoria (sin seek, asi que
+    varios hilos pueden leer a la vez) y las paginas las comparte el sistema operativo; si ademas existe
+    el .dicm del indice (y diccionario_mapeado no es False) tambien el diccionario queda en el mapa
+    """
+
+    def __init__(self, ruta: str, usar_mmap: bool = False, diccionario_mapeado: bool = True):
+        self.ruta = ruta
+        self.archivo = open(ruta, 'rb')
+        self.flags, self.numero_terminos, self.offset_diccionario, self.escala = leer_cabecera(self.archivo, ruta)
+        self.impactos_precalculados = bool(self.flags & FLAG_IMPACTOS)
+        self.archivo.seek(self.offset_diccionario)
+        datos = self.archivo.read()
+        self.diccionario = None
+        if usar_mmap and diccionario_mapeado:
+            self.diccionario = self._abrir_diccionario_mapeado(datos)
+        if self.diccionario is None:
+            self.diccionario = self._leer_diccionario_arreglos(datos)
+        if self.diccionario is None:
+            self.diccionario = self._leer_diccionario(datos)
+        self.mapa = mmap.mmap(self.archivo.fileno(), 0, access=mmap.ACCESS_READ) if usar_mmap else None
+
+    def _leer_diccionario(self, datos: bytes) -> Dict[str, Tuple[int, int, int]]:
+        diccionario = {}
+        self.impactos_maximos = {}
+        con_impactos = self.flags & FLAG_IMPACTO_MAXIMO
+        posicion = 0
+        for _ in range(self.numero_terminos):
+            longitud_termino, posicion = decodificar_varint(datos, posicion)
+            termino = datos[posicion:posicion + longitud_termino].decode('utf-8')
+            posicion += longitud_termino
+            df, posicion = decodificar_varint(datos, posicion)
+            offset, posicion = decodificar_varint(datos, posicion)
+            longitud, posicion = decodificar_varint(datos, posicion)
+            diccionario[termino] = (offset, longitud, df)
+            if con_impactos:
+                self.impactos_maximos[termino] = struct.unpack_from(FORMATO_IMPACTO, datos, posicion)[0]
+                posicion += 4
+        return diccionario
+
+    def _abrir_diccionario_mapeado(self, datos: bytes):
+        # el .dicm de al lado, si existe y corresponde a este diccionario; si no, None
+        ruta = self.ruta + SUFIJO_DICCIONARIO_MAPEADO
+        if not os.path.exists(ruta):
+            return None
+        try:
+            diccionario = DiccionarioMapeado(ruta, self.numero_terminos, zlib.crc32(datos))
+        except (OSError, ValueError, struct.error) as e:
+            log.warning("no se pudo abrir %s, se lee el diccionario del indice: %s", ruta, e)
+            return None
+        self.impactos_maximos = ImpactosMapeados(diccionario) if self.flags & FLAG_IMPACTO_MAXIMO else {}
+        return diccionario
+
+    def _leer_diccionario_arreglos(self, datos: bytes):
+        # el .dicc.npz de al lado, si existe y corresponde a este diccionario; si no, None
+        ruta = self.ruta + SUFIJO_DICCIONARIO
+        if not os.path.exists(ruta):
+            return None
+        try:
+            with np.load(ruta) as arreglos:
+                if int(arreglos["crc"]) != zlib.crc32(datos):
+                    return None
+                terminos = arreglos["terminos"].tobytes().decode('utf-8').split('\n')
+                columnas = [arreglos[nombre].tolist() for nombre in ("offsets", "longitudes", "dfs")]
+                impactos = arreglos["impactos"].tolist()
+        except (OSError, ValueError, KeyError) as e:
+            log.warning("no se pudo leer %s, se lee el diccionario del indice: %s", ruta, e)
+            return None
+        if len(terminos) != self.numero_terminos:
+            return None
+        self.impactos_maximos = dict(zip(terminos, impactos)) if self.flags & FLAG_IMPACTO_MAXIMO else {}
+        return dict(zip(terminos, zip(*columnas)))
+
+    def __contains__(self, termino: str) -> bool:
+        return termino in self.diccionario
+
+    def __len__(self) -> int:
+        return self.numero_terminos
+
+    def df(self, termino: str) -> int:
+        entrada = self.diccionario.get(termino)
+        return entrada[2] if entrada else 0
+
+    def impacto_maximo(self, termino: str):
+        """max(peso / norma) de la lista del termino, o None si el indice no lo trae"""
+        return self.impactos_maximos.get(termino)
+
+    def leer_bytes(self, termino: str) -> bytes:
+        offset, longitud, _ = self.diccionario[termino]
+        if self.mapa is not None:
+            return self.mapa[offset:offset + longitud]
+        self.archivo.seek(offset)
+        return self.archivo.read(longitud)
+
+    def postings(self, termino: str) -> Dict[int, float]:
+        if termino not in self.diccionario:
+            return {}
+        return decodificar_postings(self.leer_bytes(termino), self.escala)
+
+    def items(self) -> Iterator[Tuple[str, Dict[int, float]]]:
+        # el diccionario se guarda ordenado, asi que esto recorre los terminos en orden
+        for termino in self.diccionario:
+            yield termino, self.postings(termino)
+
+    def arreglos(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """todos los postings como arreglos: (df por termino, ids, pesos), en el orden del diccionario"""
+        dfs = np.fromiter((df for _, _, df in self.diccionario.values()), dtype=np.int64, count=len(self.diccionario))
+        if not len(dfs) or not dfs.sum():
+            return dfs, np.zeros(0, dtype=np.int64), np.zeros(0)
+        # se decodifica toda la zona de postings de una vez y luego se corta por termino
+        self.archivo.seek(TAMANIO_CABECERA)
+        valores = decodificar_varints(self.archivo.read(self.offset_diccionario - TAMANIO_CABECERA))
+        ids = np.cumsum(valores[0::2])
+        cortes = np.cumsum(dfs)
+        # el primer delta de cada termino es absoluto, se resta lo acumulado hasta el termino anterior
+        base = np.concatenate(([0], ids[cortes[:-1] - 1]))
+        ids = ids - np.repeat(base, dfs)
+        return dfs, ids, valores[1::2] / self.escala
+
+    def cargar_todo(self) -> Dict[str, Dict[int, float]]:
+        if not self.diccionario:
+            return {}
+        dfs, ids, pesos = self.arreglos()
+        if not len(ids):
+            return {termino: {} for termino in self.diccionario}
+        pesos = pesos.tolist()
+        cortes = np.cumsum(dfs)
+        # se reutiliza un solo objeto int por documento en todos los terminos
+        minimo = int(ids.min())
+        objetos = np.array(list(range(minimo, int(ids.max()) + 1)), dtype=object)
+        ids = objetos[ids - minimo].tolist()
+        indice = {}
+        inicio = 0
+        for termino, fin in zip(self.diccionario, cortes.tolist()):
+            indice[termino] = dict(zip(ids[inicio:fin], pesos[inicio:fin]))
+            inicio = fin
+        return indice
+
+    def cerrar(self):
+        if isinstance(self.diccionario, DiccionarioMapeado):
+            self.diccionario.cerrar()
+        if self.mapa is not None:
+            self.mapa.close()
+        self.archivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        self.cerrar()
+
+
+class _FlujoBytes:
+    """lectura secuencial de un archivo por bloques, sin cargarlo entero"""
+
+    def __init__(self, archivo, tamanio_buffer: int):
+        self.archivo = archivo
+        self.tamanio_buffer = tamanio_buffer
+        self.buffer = b''
+        self.posicion = 0
+
+    def leer(self, n: int) -> bytes:
+        if self.posicion + n > len(self.buffer):
+            self.buffer = self.buffer[self.posicion:] + self.archivo.read(max(n, self.tamanio_buffer))
+            self.posicion = 0
+        datos = self.buffer[self.posicion:self.posicion + n]
+        self.posicion += n
+        return datos
+
+    def leer_varint(self) -> int:
+        if self.posicion + 10 > len(self.buffer):
+            self.buffer = self.buffer[self.posicion:] + self.archivo.read(self.tamanio_buffer)
+            self.posicion = 0
+        valor, self.posicion = decodificar_varint(self.buffer, self.posicion)
+        return valor
+
+
+class RecorredorIndiceBinario:
+    """recorre un indice binario en orden de terminos con memoria acotada (para la fusion externa)
+
+    a diferencia de LectorIndiceBinario no carga el diccionario: lee diccionario y postings
+    en paralelo con dos manejadores, cada uno con un buffer de tamanio_buffer bytes
+    """
+
+    def __init__(self, ruta: str, tamanio_buffer: int = TAMANIO_BUFFER):
+        self.ruta = ruta
+        self.tamanio_buffer = tamanio_buffer
+        with open(ruta, 'rb') as archivo:
+            self.flags, self.numero_terminos, self.offset_diccionario, self.escala = leer_cabecera(archivo, ruta)
+
+    def __iter__(self) -> Iterator[Tuple[str, int, bytes]]:
+        with open(self.ruta, 'rb', buffering=0) as archivo_diccionario, \
+                open(self.ruta, 'rb', buffering=0) as archivo_postings:
+            archivo_diccionario.seek(self.offset_diccionario)
+            archivo_postings.seek(TAMANIO_CABECERA)
+            diccionario = _FlujoBytes(archivo_diccionario, self.tamanio_buffer)
+            postings = _FlujoBytes(archivo_postings, self.tamanio_buffer)
+            for _ in range(self.numero_terminos):
+                termino = diccionario.leer(diccionario.leer_varint()).decode('utf-8')
+                df = diccionario.leer_varint()
+                diccionario.leer_varint()  # offset: los postings estan contiguos y en el mismo orden
+                longitud = diccionario.leer_varint()
+                if self.flags & FLAG_IMPACTO_MAXIMO:
+                    diccionario.leer(4)  # la cota se recalcula al fusionar
+                yield termino, df, postings.leer(longitud)
+
+
+def guardar_diccionario_arreglos(ruta: str) -> str:
+    """escribe <ruta>.dicc.npz para que LectorIndiceBinario abra el indice sin recorrer el diccionario"""
+    with LectorIndiceBinario(ruta) as lector:
+        lector.archivo.seek(lector.offset_diccionario)
+        crc = zlib.crc32(lector.archivo.read())
+        terminos = list(lector.diccionario)
+        if any('\n' in termino for termino in terminos):
+            raise ValueError(f"{ruta} tiene terminos con saltos de linea, no se puede guardar su diccionario")
+        valores = np.array(list(lector.diccionario.values()), dtype=np.int64).reshape(-1, 3)
+        impactos = np.array([lector.impactos_maximos.get(termino, 0.0) for termino in terminos], dtype=np.float32)
+    salida = ruta + SUFIJO_DICCIONARIO
+    with open(salida, 'wb') as archivo:  # con el archivo abierto np.savez no cambia la extension
+        np.savez(archivo, crc=np.int64(crc),
+                 terminos=np.frombuffer('\n'.join(terminos).encode('utf-8'), dtype=np.uint8),
+                 offsets=valores[:, 0], longitudes=valores[:, 1], dfs=valores[:, 2], impactos=impactos)
+    return salida
+
+
+def guardar_diccionario_mapeado(ruta: str) -> str:
+    """escribe <ruta>.dicm para que los procesos que sirven el indice compartan el diccionario (ver arriba)"""
+    with LectorIndiceBinario(ruta) as lector:
+        lector.archivo.seek(lector.offset_diccionario)
+        crc = zlib.crc32(lector.archivo.read())
+        terminos = [termino.encode('utf-8') for termino in lector.diccionario]
+        valores = np.array(list(lector.diccionario.values()), dtype=np.int64).reshape(-1, 3)
+        impactos = np.array([lector.impactos_maximos.get(termino.decode('utf-8'), 0.0) for termino in terminos],
+                            dtype='<f4')
+    if any(anterior >= siguiente for anterior, siguiente in zip(terminos, terminos[1:])):
+        raise ValueError(f"el diccionario de {ruta} no esta ordenado, no se puede buscar por busqueda binaria")
+    inicios = np.zeros(len(terminos) + 1, dtype='<u8')
+    inicios[1:] = np.cumsum([len(termino) for termino in terminos])
+    salida = ruta + SUFIJO_DICCIONARIO_MAPEADO
+    with open(salida, 'wb') as archivo:
+        archivo.write(struct.pack(FORMATO_CABECERA_DICCIONARIO, MAGIC_DICCIONARIO, VERSION, 0, len(terminos), crc))
+        for arreglo in (inicios, valores[:, 0].astype('<u8'), valores[:, 1].astype('<u4'), valores[:, 2].astype('<u4'),
+                        impactos):
+            archivo.write(arreglo.tobytes())
+        archivo.write(b''.join(terminos))
+    return salida
+
+
+def convertir_json_a_binario(ruta_json: str, ruta_binario: str = None) -> str:
+    """convierte un indice_parcial_N.json existente al formato binario"""
+    if ruta_binario is None:
+        ruta_binario = os.path.splitext(ruta_json)[0] + '.bin'
+    with open(ruta_json, 'r', encoding='utf-8') as archivo:
+        indice = json.load(archivo)
+    guardar_indice_binario(indice, ruta_binario)
+    print(f"{ruta_json} convertido a {ruta_binario}")
+    return ruta_binario
+
+
+def convertir_directorio(ruta_indice: str) -> List[str]:
+    convertidos = []
+    for archivo in sorted(os.listdir(ruta_indice)):
+        if archivo.startswith("indice_parcial_") and archivo.endswith(".json"):
+            convertidos.append(convertir_json_a_binario(os.path.join(ruta_indice, archivo)))
+    return convertidos
+
+
+if __name__ == "__main__":
+    import sys
+    # uso: python -m app.IndiceBinario <directorio con indice_parcial_N.json | archivo.json> ...
+    for ruta in sys.argv[1:]:
+        if os.path.isdir(ruta):
+            convertir_directorio(ruta)
+        else:
+            convertir_json_a_binario(ruta)
@@ -0,0 +1,117 @@
+import math
+import logging
+import numpy as np
+from typing import Dict, List, Optional, Tuple, Union
+
+from .IndiceBinario import LectorIndiceBinario
+
+try:
+    from scipy import sparse
+except ImportError:  # scipy es opcional: solo lo necesita el puntuador 'matriz'
+    sparse = None
+
+# PUNTUADOR CON MATRIZ DISPERSA TERMINO-DOCUMENTO
+# el indice se guarda como una matriz CSR (terminos x documentos) con los pesos ya normalizados,
+# tf·idf / norma del documento, asi que la similitud coseno de una consulta es un producto disperso
+# vector-matriz dividido por la norma de la consulta, y el top k sale con argpartition.
+# varias consultas se apilan como filas de una matriz dispersa y se puntuan con un solo producto.
+#
+# las similitudes son las mismas que las del puntuador por diccionarios salvo el ultimo bit (se suma
+# en otro orden); los empates se ordenan por id de documento y los documentos con similitud 0 (por
+# ejemplo si el unico termino en comun aparece en todos los documentos, idf 0) no se devuelven
+
+log = logging.getLogger(__name__)
+
+
+def scipy_disponible() -> bool:
+    return sparse is not None
+
+
+class MatrizTerminoDocumento:
+    """matriz CSR de pesos normalizados y vocabulario termino -> fila"""
+
+    def __init__(self, matriz, terminos: Dict[str, int]):
+        self.matriz = matriz
+        self.terminos = terminos
+
+    @classmethod
+    def desde_indice(cls, ruta_indice_binario: str, normas: Optional[np.ndarray] = None,
+                     numero_documentos: int = None) -> 'MatrizTerminoDocumento':
+        """construye la matriz desde indice_impactos.bin (pesos ya normalizados) o desde indice_final.bin
+
+        con indice_final.bin hacen falta las normas: el peso queda log(1 + tf) * log10(N / df) / norma,
+        con N = len(normas) como en MotorConsulta.rankear
+        """
+        if sparse is None:
+            raise ImportError("el puntuador 'matriz' necesita scipy (pip install scipy)")
+        with LectorIndiceBinario(ruta_indice_binario) as lector:
+            terminos = {termino: fila for fila, termino in enumerate(lector.diccionario)}
+            dfs, ids, pesos = lector.arreglos()
+            precalculados = lector.impactos_precalculados
+        if not precalculados:
+            if normas is None:
+                raise ValueError(f"{ruta_indice_binario} no trae impactos precalculados, hacen falta las normas")
+            idf = np.log10(len(normas) / np.maximum(dfs, 1))
+            normas_postings = np.zeros(len(ids))
+            dentro = ids < len(normas)
+            normas_postings[dentro] = normas[ids[dentro]]
+            validos = normas_postings > 0  # documentos sin norma puntuan 0, como antes
+            normalizados = np.zeros(len(ids))
+            normalizados[validos] = (pesos * np.repeat(idf, dfs))[validos] / normas_postings[validos]
+            pesos = normalizados
+            if numero_documentos is None:
+                numero_documentos = len(normas)
+        columnas = max(numero_documentos or 0, int(ids.max()) + 1 if len(ids) else 0)
+        indptr = np.concatenate(([0], np.cumsum(dfs)))
+        matriz = sparse.csr_matrix((pesos, ids, indptr), shape=(len(terminos), columnas))
+        matriz.eliminate_zeros()
+        log.info("matriz termino-documento de %d x %d (%d postings)", matriz.shape[0], matriz.shape[1], matriz.nnz)
+        return cls(matriz, terminos)
+
+    @property
+    def numero_documentos(self) -> int:
+        return self.matriz.shape[1]
+
+    def _matriz_consultas(self, consultas: List[Dict[str, float]]):
+        """una fila por consulta con frecuencia_q / norma_consulta en las columnas de sus terminos"""
+        filas, columnas, valores = [], [], []
+        for numero, terminos_consulta in enumerate(consultas):
+            # la norma incluye los terminos que no estan en el indice, igual que en rankear
+            norma_consulta = math.sqrt(sum(frecuencia ** 2 for frecuencia in terminos_consulta.values()))
+            if norma_consulta <= 0:
+                continue
+            for termino, frecuencia_q in terminos_consulta.items():
+                fila = self.terminos.get(termino)
+                if fila is not None:
+                    filas.append(numero)
+                    columnas.append(fila)
+                    valores.append(frecuencia_q / norma_consulta)
+        return sparse.csr_matrix((valores, (filas, columnas)), shape=(len(consultas), len(self.terminos)))
+
+    def puntuar(self, consultas: List[Dict[str, float]]):
+        """similitudes de cada consulta (filas) contra los documentos (columnas), como matriz dispersa"""
+        return (self._matriz_consultas(consultas) @ self.matriz).tocsr()
+
+    def top_k_lote(self, consultas: List[Dict[str, float]],
+                   top_k: Union[int, List[int]] = 10) -> List[List[Tuple[int, float]]]:
+        """top k de varias consultas con un solo producto matriz-matriz (top_k comun o uno por consulta)"""
+        similitudes = self.puntuar(consultas)
+        tops = top_k if isinstance(top_k, list) else [top_k] * len(consultas)
+        return [_top_k_fila(similitudes.indices[inicio:fin], similitudes.data[inicio:fin], top)
+                for inicio, fin, top in zip(similitudes.indptr[:-1].tolist(), similitudes.indptr[1:].tolist(), tops)]
+
+    def top_k(self, terminos_consulta: Dict[str, float], top_k: int = 10) -> List[Tuple[int, float]]:
+        return self.top_k_lote([terminos_consulta], top_k)[0]
+
+
+def _top_k_fila(ids: np.ndarray, similitudes: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    if k <= 0 or not len(ids):
+        return []
+    if len(ids) > k:
+        # argpartition deja los k mayores adelante; se amplia a todos los empatados con el k-esimo
+        # para que el desempate por id no dependa del orden en que quedaron
+        corte = similitudes[np.argpartition(-similitudes, k - 1)[k - 1]]
+        candidatos = np.flatnonzero(similitudes >= corte)
+        ids, similitudes = ids[candidatos], similitudes[candidatos]
+    orden = np.lexsort((ids, -similitudes))[:k]
+    return list(zip(ids[orden].tolist(), similitudes[orden].tolist()))
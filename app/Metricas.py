@@ -0,0 +1,164 @@
+import os
+import time
+import bisect
+import threading
+from typing import Dict, Tuple
+
+# LATENCIA POR ETAPA DE LAS CONSULTAS, COMO HISTOGRAMAS DE PROMETHEUS
+# cada consulta pasa por analizar -> postings -> puntuar -> top_k -> documentos -> serializar (camino 'texto')
+# y las de imagen por analizar (imagen -> vector) -> postings (lectura de vectores) -> puntuar (distancias y
+# heap) -> documentos -> serializar (camino 'imagen'). cada etapa suma una observacion a su histograma:
+#   with etapa("postings"):
+#       ...
+# ademas cada peticion entera va a busqueda_peticion_segundos{ruta=...}.
+# /metrics devuelve todo en el formato de texto de prometheus (busqueda_etapa_segundos_bucket{...} ...).
+# con METRICAS=0 etapa() devuelve siempre el mismo contexto vacio: no se toma el tiempo ni se toca el candado.
+# los histogramas son del proceso: con varios workers (Servidor.py) cada uno tiene los suyos
+
+LIMITES_SEGUNDOS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                    5.0, 10.0)
+NOMBRE_ETAPAS = "busqueda_etapa_segundos"
+NOMBRE_PETICIONES = "busqueda_peticion_segundos"
+AYUDAS = {
+    NOMBRE_ETAPAS: "segundos de cada etapa de una consulta",
+    NOMBRE_PETICIONES: "segundos de una peticion completa, por ruta",
+}
+
+
+class Histograma:
+    """conteo por limite superior (como el 'le' de prometheus, sin acumular), suma y total de observaciones"""
+
+    def __init__(self, limites: Tuple[float, ...] = LIMITES_SEGUNDOS):
+        self.limites = limites
+        self.cubetas = [0] * (len(limites) + 1)  # la ultima es +Inf
+        self.suma = 0.0
+        self.cuenta = 0
+
+    def observar(self, valor: float):
+        self.cubetas[bisect.bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+        self.cuenta += 1
+
+    def percentil(self, fraccion: float) -> float:
+        """limite superior de la cubeta donde cae el percentil (inf si cae en la ultima)"""
+        objetivo = fraccion * self.cuenta
+        acumulado = 0
+        for limite, cuenta in zip(self.limites + (float('inf'),), self.cubetas):
+            acumulado += cuenta
+            if acumulado >= objetivo and acumulado:
+                return limite
+        return 0.0
+
+
+class _Cronometro:
+    __slots__ = ("registro", "nombre", "etiquetas", "inicio")
+
+    def __init__(self, registro: 'RegistroMetricas', nombre: str, etiquetas: Tuple):
+        self.registro = registro
+        self.nombre = nombre
+        self.etiquetas = etiquetas
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self.registro.observar(self.nombre, self.etiquetas, time.perf_counter() - self.inicio)
+        return False
+
+
+class _SinMedir:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+
+SIN_MEDIR = _SinMedir()
+
+
+class RegistroMetricas:
+    """histogramas por (nombre, etiquetas) de un proceso; con activas=False no se registra nada"""
+
+    def __init__(self, activas: bool = True):
+        self.activas = activas
+        self.histogramas: Dict[str, Dict[Tuple, Histograma]] = {}
+        self.candado = threading.Lock()  # el servidor de flask atiende peticiones en hilos
+
+    def observar(self, nombre: str, etiquetas: Tuple, segundos: float):
+        """etiquetas como tupla de pares (clave, valor), en el orden en que se exportan"""
+        if not self.activas:
+            return
+        with self.candado:
+            por_etiquetas = self.histogramas.setdefault(nombre, {})
+            histograma = por_etiquetas.get(etiquetas)
+            if histograma is None:
+                histograma = por_etiquetas[etiquetas] = Histograma()
+            histograma.observar(segundos)
+
+    def limpiar(self):
+        with self.candado:
+            self.histogramas.clear()
+
+    def resumen(self) -> Dict[str, Dict]:
+        """{nombre: {"clave=valor,...": {cuenta, media_ms, p50_ms, p99_ms}}}, para ver sin prometheus"""
+        salida = {}
+        with self.candado:
+            for nombre, por_etiquetas in self.histogramas.items():
+                for etiquetas, histograma in por_etiquetas.items():
+                    clave = ",".join(f"{etiqueta}={valor}" for etiqueta, valor in etiquetas)
+                    media = histograma.suma / histograma.cuenta if histograma.cuenta else 0.0
+                    salida.setdefault(nombre, {})[clave] = {
+                        "cuenta": histograma.cuenta,
+                        "media_ms": round(media * 1000, 3),
+                        "p50_ms": histograma.percentil(0.5) * 1000,
+                        "p99_ms": histograma.percentil(0.99) * 1000,
+                    }
+        return salida
+
+    def exportar(self) -> str:
+        """todos los histogramas en el formato de texto de prometheus (version 0.0.4)"""
+        lineas = []
+        with self.candado:
+            for nombre in sorted(self.histogramas):
+                lineas.append(f"# HELP {nombre} {AYUDAS.get(nombre, nombre)}")
+                lineas.append(f"# TYPE {nombre} histogram")
+                for etiquetas, histograma in sorted(self.histogramas[nombre].items()):
+                    base = ",".join(f'{etiqueta}="{_escapar(valor)}"' for etiqueta, valor in etiquetas)
+                    separador = "," if base else ""
+                    acumulado = 0
+                    for limite, cuenta in zip(histograma.limites + (float('inf'),), histograma.cubetas):
+                        acumulado += cuenta
+                        le = "+Inf" if limite == float('inf') else repr(limite)
+                        lineas.append(f'{nombre}_bucket{{{base}{separador}le="{le}"}} {acumulado}')
+                    sufijo = f"{{{base}}}" if base else ""
+                    lineas.append(f"{nombre}_sum{sufijo} {histograma.suma!r}")
+                    lineas.append(f"{nombre}_count{sufijo} {histograma.cuenta}")
+        return "\n".join(lineas) + "\n"
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+# el registro del proceso; METRICAS=0 lo deja desactivado desde el arranque
+metricas = RegistroMetricas(activas=os.environ.get("METRICAS", "1") != "0")
+
+
+def etapa(nombre: str, camino: str = "texto"):
+    """contexto que mide una etapa de la consulta (o nada si las metricas estan desactivadas)"""
+    if not metricas.activas:
+        return SIN_MEDIR
+    return _Cronometro(metricas, NOMBRE_ETAPAS, (("camino", camino), ("etapa", nombre)))
+
+
+def observar_etapa(nombre: str, segundos: float, camino: str = "texto"):
+    """para etapas medidas a mano (p. ej. sumando varias lecturas dentro de un ciclo)"""
+    metricas.observar(NOMBRE_ETAPAS, (("camino", camino), ("etapa", nombre)), segundos)
+
+
+def observar_peticion(ruta: str, segundos: float):
+    metricas.observar(NOMBRE_PETICIONES, (("ruta", ruta),), segundos)
@@ -0,0 +1,44 @@
+import os
+import argparse
+
+from .Normas import NOMBRE_NORMAS, cargar_normas, guardar_normas
+from .IndiceBinario import convertir_directorio
+from .FusionExterna import fusionar_indices_parciales, listar_parciales_binarios, NOMBRE_INDICE_FINAL
+from .Impactos import calcular_impactos, NOMBRE_INDICE_IMPACTOS
+
+# MIGRACION DE INDICES ANTERIORES A IDS ENTEROS
+# los indices viejos guardan normas.json (dict id -> norma) y a veces parciales .json; el motor ya los lee,
+# pero cada arranque vuelve a convertir las normas y las cotas de MaxScore se calcularon con normas float64.
+# esta herramienta deja el indice en el formato actual:
+#   - normas.json -> normas.npy (float32)
+#   - indice_parcial_N.json -> indice_parcial_N.bin
+#   - indice_final.bin e indice_impactos.bin regenerados con las normas float32 (cotas validas)
+# uso: python -m app.Migracion <ruta_indice> [--normas normas.json]
+
+
+def migrar_indice(ruta_indice: str, ruta_normas: str = None) -> str:
+    if ruta_normas is None:
+        ruta_normas = os.path.join(ruta_indice, "normas.json")
+    ruta_npy = os.path.join(os.path.dirname(ruta_normas) or ".", NOMBRE_NORMAS)
+    normas = cargar_normas(ruta_normas, usar_mmap=False)
+    if os.path.abspath(ruta_npy) != os.path.abspath(ruta_normas):
+        guardar_normas(normas, ruta_npy)
+        print(f"{ruta_normas} convertido a {ruta_npy} ({len(normas)} documentos)")
+
+    convertir_directorio(ruta_indice)
+    parciales = listar_parciales_binarios(ruta_indice)
+    if not parciales:
+        print(f"no hay indices parciales en {ruta_indice}; solo se migraron las normas")
+        return ruta_npy
+    ruta_final = os.path.join(ruta_indice, NOMBRE_INDICE_FINAL)
+    fusionar_indices_parciales(parciales, ruta_final, normas=normas)
+    calcular_impactos(ruta_final, os.path.join(ruta_indice, NOMBRE_INDICE_IMPACTOS), normas)
+    return ruta_npy
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="migra un indice con normas.json a ids enteros y normas.npy")
+    parser.add_argument("ruta_indice")
+    parser.add_argument("--normas", help="ruta del normas.json (por defecto <ruta_indice>/normas.json)")
+    argumentos = parser.parse_args()
+    migrar_indice(argumentos.ruta_indice, argumentos.normas)
@@ -1,15 +1,15 @@
 import requests
 from io import BytesIO
-from tensorflow.keras.applications import InceptionV3
-from tensorflow.keras.preprocessing import image
-from tensorflow.keras.applications.inception_v3 import preprocess_input
 import numpy as np
 import pandas as pd
 import struct
 import gc  
+try:
+    from .modelo_inception import vector_desde_imagen
+except ImportError:  # ejecutado como script desde esta carpeta
+    from modelo_inception import vector_desde_imagen
 
-
-modelo = InceptionV3(weights='imagenet', include_top=False, pooling='avg')
+# el modelo InceptionV3 se carga con la primera imagen (ver modelo_inception.py), no al importar
 
 def map_filenames_to_indices(file_path):
     data = pd.read_csv(file_path)
@@ -24,12 +24,7 @@ def extract_features_url(url, index, output_bin):
         response = requests.get(url, timeout=10)  
         if response.status_code == 200:
         
-            img = image.load_img(BytesIO(response.content), target_size=(299, 299))
-            img_array = image.img_to_array(img)
-            img_array = np.expand_dims(img_array, axis=0)
-            img_array = preprocess_input(img_array)
-            
-            features = modelo.predict(img_array).flatten()
+            features = vector_desde_imagen(BytesIO(response.content))
             
             print(f"\nÍndice: {index}")
             print(f"Vector de características (primeros 10 elementos): {features[:10]}")
@@ -39,7 +34,7 @@ def extract_features_url(url, index, output_bin):
                 f.write(struct.pack(f'i2048f', index, *features))
 
     
-            del img_array, features
+            del features
             gc.collect()  
 
             print(f"Características extraídas y guardadas para la imagen en el indice {index}")
@@ -60,9 +55,10 @@ def process_csv(file_path, output_bin):
         except Exception as e:
             print(f"Error procesando la imagen en el índice {idx}: {str(e)}")
 
-csv_file = 'images1.csv' 
-output_bin = 'vectors.bin'  
+if __name__ == "__main__":
+    csv_file = 'images1.csv' 
+    output_bin = 'vectors.bin'  
 
-filename_to_index = map_filenames_to_indices(csv_file)
-process_csv(csv_file, output_bin)
-print("\nExtracción de características completada")
+    filename_to_index = map_filenames_to_indices(csv_file)
+    process_csv(csv_file, output_bin)
+    print("\nExtracción de características completada")
@@ -1,16 +1,16 @@
 import requests
-from tensorflow.keras.applications import InceptionV3
-from tensorflow.keras.utils import load_img, img_to_array
-from tensorflow.keras.applications.inception_v3 import preprocess_input
 import numpy as np
 import gc
 import struct
 import pandas as pd
 import os
 from tempfile import NamedTemporaryFile
+try:
+    from .modelo_inception import vector_desde_imagen
+except ImportError:  # ejecutado como script desde esta carpeta
+    from modelo_inception import vector_desde_imagen
 
-# Inicializa el modelo InceptionV3
-modelo = InceptionV3(weights='imagenet', include_top=False, pooling='avg')
+# el modelo InceptionV3 se carga con la primera imagen (ver modelo_inception.py), no al importar
 
 # Configuración
 EXPECTED_LENGTH_DATA = 2048
@@ -40,15 +40,10 @@ def extract_features_url(image_link):
                 temp_file.write(chunk)
             temp_file_path = temp_file.name
 
-        img = load_img(temp_file_path, target_size=(299, 299))
-        img_array = img_to_array(img)
-        img_array = np.expand_dims(img_array, axis=0)
-        img_array = preprocess_input(img_array)
-        features = modelo.predict(img_array).flatten()
+        features = vector_desde_imagen(temp_file_path)
 
         os.remove(temp_file_path)
 
-        del img_array
         gc.collect()
         return features
     except Exception as e:
@@ -181,21 +176,22 @@ def get_data_images(elements: list[int]):
     return data
 
 
-n = None  # Cambia a un número si deseas limitar la cantidad de imágenes procesadas
+if __name__ == "__main__":
+    n = None  # Cambia a un número si deseas limitar la cantidad de imágenes procesadas
 
-# Carga de imágenes
-ids, id_to_pos = load_images(images_csv, output_file, position_data_file, n)
+    # Carga de imágenes
+    ids, id_to_pos = load_images(images_csv, output_file, position_data_file, n)
 
-# Carga de características
-load_features()
+    # Carga de características
+    load_features()
 
-# Ejemplo: Obtener vector y posición de un ID
-if ids:
-    ejemplo_id = ids[0][0]  # Toma el primer ID procesado
-    pos = get_pos_to_id(ejemplo_id, id_to_pos)
-    vector = get_vector(output_file, position_data_file, pos)
-    print(f"Vector de características para el ID {ejemplo_id}: {vector}")
+    # Ejemplo: Obtener vector y posición de un ID
+    if ids:
+        ejemplo_id = ids[0][0]  # Toma el primer ID procesado
+        pos = get_pos_to_id(ejemplo_id, id_to_pos)
+        vector = get_vector(output_file, position_data_file, pos)
+        print(f"Vector de características para el ID {ejemplo_id}: {vector}")
 
-# Ejemplo: Obtener datos de imágenes
-data_images = get_data_images([ejemplo_id])
-print(f"Datos de la imagen para el ID {ejemplo_id}: {data_images}")
\ No newline at end of file
+    # Ejemplo: Obtener datos de imágenes
+    data_images = get_data_images([ejemplo_id])
+    print(f"Datos de la imagen para el ID {ejemplo_id}: {data_images}")
\ No newline at end of file
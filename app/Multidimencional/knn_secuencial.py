@@ -2,19 +2,27 @@ import struct
 import numpy as np
 import heapq
 import pandas as pd
-from tensorflow.keras.applications import InceptionV3
-from tensorflow.keras.utils import load_img, img_to_array
-from tensorflow.keras.applications.inception_v3 import preprocess_input
 import json
 import os
+import time
+import sys
+import logging
+try:
+    from .modelo_inception import vector_desde_imagen
+    from ..Metricas import metricas, etapa, observar_etapa
+except ImportError:  # ejecutado como script desde esta carpeta; Metricas.py esta en la carpeta de arriba
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from modelo_inception import vector_desde_imagen
+    from Metricas import metricas, etapa, observar_etapa
 
 VECTOR_SIZE = 2048
 BINARY_FILE = 'output.bin'
 POSITION_DATA_FILE = 'position_data.bin'
 URL_CSV_FILE = r'C:\Users\semin\OneDrive\Escritorio\bd2_code\Clonación1\Proyecto_2_BD2\app\Multidimencional\images1.csv'
 
-# Cargar el modelo preentrenado InceptionV3
-modelo_inception = InceptionV3(weights='imagenet', include_top=False, pooling='avg')
+# el modelo InceptionV3 se carga la primera vez que se pide un vector (ver modelo_inception.py)
+
+log = logging.getLogger(__name__)
 
 class knnsecuencial:
     def __init__(self, vector_size=VECTOR_SIZE, binary_file=BINARY_FILE, position_data_file=POSITION_DATA_FILE, url_csv_file=URL_CSV_FILE):
@@ -49,10 +57,24 @@ class knnsecuencial:
         return vector
 
     def process_batches(self, query, process_function):
+        if not metricas.activas:
+            for index in range(len(self.positions)):
+                vector = self.get_vector(index)
+                if vector is not None:
+                    process_function(index, vector, query)
+            return
+        # lectura de los vectores ('postings' del camino de imagen) y distancias con el heap ('puntuar'), por separado
+        lectura = comparacion = 0.0
         for index in range(len(self.positions)):
+            inicio = time.perf_counter()
             vector = self.get_vector(index)
+            medio = time.perf_counter()
             if vector is not None:
                 process_function(index, vector, query)
+            lectura += medio - inicio
+            comparacion += time.perf_counter() - medio
+        observar_etapa("postings", lectura, "imagen")
+        observar_etapa("puntuar", comparacion, "imagen")
 
     def knn_search_linear(self, query, k):
         heap = []
@@ -70,15 +92,16 @@ class knnsecuencial:
         self.process_batches(query, process_function)
 
         neighbors = []
-        for dist, index in sorted(heap, reverse=True):
-            if index < len(self.url_map):
-                row = self.url_map.iloc[index]
-                neighbors.append({
-                    "Index": index,
-                    "Filename": row['filename'],
-                    "Distance": -dist,
-                    "Link": row['link']
-                })
+        with etapa("documentos", "imagen"):
+            for dist, index in sorted(heap, reverse=True):
+                if index < len(self.url_map):
+                    row = self.url_map.iloc[index]
+                    neighbors.append({
+                        "Index": index,
+                        "Filename": row['filename'],
+                        "Distance": -dist,
+                        "Link": row['link']
+                    })
         return neighbors
 
     def save_priority_neighbors_to_json(self, query, k, filename="neighbors_priority.json"):
@@ -96,25 +119,17 @@ class knnsecuencial:
         with open(filename, 'w') as json_file:
             json.dump(results, json_file, indent=4)
 
-        print(f"JSON guardado exitosamente en: {filename}")
+        log.debug("JSON guardado exitosamente en: %s", filename)
         return results
 
 # Función para convertir una imagen a un vector de características
 def obtener_vector_desde_imagen(image_path):
     try:
-        # Cargar la imagen desde la ruta
-        img = load_img(image_path, target_size=(299, 299))
-
-        # Convertir a un array y preprocesar
-        img_array = img_to_array(img)
-        img_array = np.expand_dims(img_array, axis=0)
-        img_array = preprocess_input(img_array)
-
         # Obtener el vector de características
-        vector = modelo_inception.predict(img_array).flatten()
-        return vector
+        with etapa("analizar", "imagen"):
+            return vector_desde_imagen(image_path)
     except Exception as e:
-        print(f"Error al procesar la imagen: {str(e)}")
+        log.error("Error al procesar la imagen: %s", e)
         return None
 
 if __name__ == "__main__":
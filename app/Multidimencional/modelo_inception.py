@@ -0,0 +1,75 @@
+import time
+import logging
+import threading
+import numpy as np
+
+# MODELO INCEPTIONV3 COMPARTIDO, CARGADO A DEMANDA
+# importar tensorflow y cargar los pesos de imagenet tarda y ocupa memoria. antes cada modulo lo hacia al
+# importarse (knn_secuencial, image_caracteristicas, CNN), asi que el servidor no atendia ni /consulta hasta
+# tener el modelo. ahora tensorflow se importa recien en obtener_modelo(), la primera vez que hace falta
+# un vector; un despliegue que solo busca texto nunca lo importa.
+# precargar_en_segundo_plano() lo carga en un hilo al arrancar, para que la primera imagen no espere
+
+_candado = threading.Lock()
+_candado_hilo = threading.Lock()
+_modelo = None
+_estado = {"estado": "sin cargar", "error": None, "segundos_carga": None}
+_hilo = None
+
+log = logging.getLogger(__name__)
+
+
+def obtener_modelo():
+    """el modelo (se carga la primera vez; si otro hilo lo esta cargando se espera a que termine)"""
+    global _modelo
+    if _modelo is not None:
+        return _modelo
+    with _candado:
+        if _modelo is None:
+            _estado.update(estado="cargando", error=None)
+            inicio = time.perf_counter()
+            try:
+                from tensorflow.keras.applications import InceptionV3
+                _modelo = InceptionV3(weights='imagenet', include_top=False, pooling='avg')
+            except Exception as e:
+                _estado.update(estado="error", error=str(e))
+                raise
+            _estado.update(estado="listo", segundos_carga=round(time.perf_counter() - inicio, 2))
+            log.info("modelo InceptionV3 cargado en %s s", _estado['segundos_carga'])
+    return _modelo
+
+
+def _precargar():
+    try:
+        obtener_modelo()
+    except Exception as e:
+        log.error("no se pudo precargar el modelo InceptionV3: %s", e)
+
+
+def precargar_en_segundo_plano() -> threading.Thread:
+    """empieza a cargar el modelo en un hilo (una sola vez); las peticiones no esperan a que termine"""
+    global _hilo
+    with _candado_hilo:
+        if _hilo is None:
+            _hilo = threading.Thread(target=_precargar, name="precarga-inception", daemon=True)
+            _hilo.start()
+    return _hilo
+
+
+def modelo_listo() -> bool:
+    return _modelo is not None
+
+
+def estado_modelo() -> dict:
+    """'sin cargar', 'cargando', 'listo' o 'error', con el error y lo que tardo la carga"""
+    return dict(_estado)
+
+
+def vector_desde_imagen(imagen) -> np.ndarray:
+    """vector de caracteristicas (2048 floats) de una imagen: ruta o archivo abierto"""
+    modelo = obtener_modelo()
+    from tensorflow.keras.utils import load_img, img_to_array
+    from tensorflow.keras.applications.inception_v3 import preprocess_input
+    img = load_img(imagen, target_size=(299, 299))
+    img_array = np.expand_dims(img_to_array(img), axis=0)
+    return modelo.predict(preprocess_input(img_array)).flatten()
@@ -0,0 +1,61 @@
+import os
+import json
+import math
+import numpy as np
+from typing import Dict, Iterable
+
+# NORMAS DE LOS DOCUMENTOS
+# un arreglo float32 indexado por id de documento (los ids son la posicion de la fila en el csv),
+# guardado como .npy para abrirlo con mmap: no se parsea nada al arrancar y los procesos que sirven
+# consultas comparten las paginas. normas.json (dict id -> norma) se sigue pudiendo leer
+
+NOMBRE_NORMAS = "normas.npy"
+_MAGIC_NPY = b'\x93NUMPY'
+
+
+def normas_desde_sumas(sumas: Iterable[float]) -> np.ndarray:
+    """sqrt de la suma de cuadrados de cada documento, redondeada a 3 decimales como en normas.json"""
+    return np.array([round(math.sqrt(suma), 3) for suma in sumas], dtype=np.float32)
+
+
+def normas_desde_dict(normas: Dict) -> np.ndarray:
+    """convierte el formato anterior {id_documento: norma}; los ids que faltan quedan con norma 0"""
+    arreglo = np.zeros(max((int(k) for k in normas), default=-1) + 1, dtype=np.float32)
+    for id_documento, norma in normas.items():
+        arreglo[int(id_documento)] = norma
+    return arreglo
+
+
+def convertir_sumas_a_normas(ruta_sumas: str, ruta_normas: str, tamanio_bloque: int = 1 << 20) -> int:
+    """escribe normas.npy a partir de un archivo de sumas de cuadrados (float64 seguidos) por bloques
+
+    ni las sumas ni las normas se cargan enteras: la memoria no depende del numero de documentos
+    """
+    total = os.path.getsize(ruta_sumas) // 8
+    if total == 0:
+        guardar_normas(np.zeros(0, dtype=np.float32), ruta_normas)
+        return 0
+    normas = np.lib.format.open_memmap(ruta_normas, mode='w+', dtype=np.float32, shape=(total,))
+    with open(ruta_sumas, 'rb') as archivo:
+        for inicio in range(0, total, tamanio_bloque):
+            sumas = np.fromfile(archivo, dtype='<f8', count=min(tamanio_bloque, total - inicio))
+            normas[inicio:inicio + len(sumas)] = normas_desde_sumas(sumas.tolist())
+    normas.flush()
+    del normas  # cierra el mmap (en windows no se puede reabrir el archivo mientras siga abierto)
+    return total
+
+
+def guardar_normas(normas: np.ndarray, ruta: str):
+    # con el archivo abierto np.save no le agrega la extension .npy a la ruta
+    with open(ruta, 'wb') as archivo:
+        np.save(archivo, np.asarray(normas, dtype=np.float32))
+
+
+def cargar_normas(ruta: str, usar_mmap: bool = True) -> np.ndarray:
+    """abre las normas (.npy, mapeado en memoria) o las convierte desde un normas.json anterior"""
+    with open(ruta, 'rb') as archivo:
+        es_npy = archivo.read(len(_MAGIC_NPY)) == _MAGIC_NPY
+    if es_npy:
+        return np.load(ruta, mmap_mode='r' if usar_mmap else None)
+    with open(ruta, 'r', encoding='utf-8') as archivo:
+        return normas_desde_dict(json.load(archivo))
@@ -0,0 +1,263 @@
+import heapq
+import numpy as np
+import pandas as pd
+from bisect import bisect_right
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from .Analizador import Analizador
+from .ConsultaBooleana import intersectar
+from .FusionExterna import MEMORIA_MAXIMA, TAMANIO_BUFFER_MINIMO
+from .IndiceBinario import (EscritorIndiceBinario, LectorIndiceBinario, RecorredorIndiceBinario, FLAG_POSICIONES,
+                            codificar_varint, codificar_varints, decodificar_varint, decodificar_varints)
+
+# INDICE POSICIONAL (OPCIONAL) PARA CONSULTAS POR FRASE
+# por cada termino y documento, las posiciones del termino en el texto analizado del documento
+# (los campos con peso en orden, despues de quitar stopwords, como los ve indexar_chunk). entre un campo
+# y el siguiente se deja un hueco de SEPARACION_CAMPOS posiciones, asi una frase no cruza de un campo a otro.
+#
+# va en el mismo contenedor binario que el indice invertido (cabecera, diccionario ordenado) con
+# FLAG_POSICIONES, y los datos de cada termino son:
+#   [varint: bytes de la zona de documentos]
+#   [documentos: pares (delta id_documento, bytes de sus posiciones) en varint]
+#   [posiciones: por documento, deltas de posicion en varint (reinician en cada documento)]
+# asi la lista de documentos se decodifica sola para intersectar, y de las posiciones solo se leen los
+# trozos de los documentos que sobrevivieron a la interseccion
+
+NOMBRE_INDICE_POSICIONES = "indice_posiciones.bin"
+SEPARACION_CAMPOS = 1000
+
+
+def posiciones_chunk(chunk: pd.DataFrame, pesos_campos: List[float],
+                     analizador: Analizador) -> Dict[str, Dict[int, List[int]]]:
+    """{termino: {id_documento: [posiciones]}} de un chunk del csv, con los mismos campos que indexar_chunk"""
+    ids_documentos = [int(indice) for indice in chunk.index]
+    columnas = [chunk.iloc[:, idx_campo].tolist() for idx_campo in range(min(chunk.shape[1], len(pesos_campos)))
+                if pesos_campos[idx_campo] != 0]
+    analizados = {}  # texto -> terminos; generos, artistas y playlists se repiten mucho
+    indice = defaultdict(dict)
+    for fila, id_documento in enumerate(ids_documentos):
+        inicio = 0
+        for columna in columnas:
+            texto = str(columna[fila])
+            terminos = analizados.get(texto)
+            if terminos is None:
+                terminos = analizados[texto] = analizador.analizar(texto)
+            for desplazamiento, termino in enumerate(terminos):
+                indice[termino].setdefault(id_documento, []).append(inicio + desplazamiento)
+            inicio += len(terminos) + SEPARACION_CAMPOS
+    return indice
+
+
+def codificar_posiciones(postings: Dict[int, List[int]]) -> bytes:
+    documentos = bytearray()
+    posiciones = bytearray()
+    anterior = 0
+    for id_documento in sorted(postings):
+        inicio = len(posiciones)
+        previa = 0
+        for posicion in postings[id_documento]:
+            codificar_varint(posicion - previa, posiciones)
+            previa = posicion
+        codificar_varint(id_documento - anterior, documentos)
+        codificar_varint(len(posiciones) - inicio, documentos)
+        anterior = id_documento
+    salida = bytearray()
+    codificar_varint(len(documentos), salida)
+    return bytes(salida + documentos + posiciones)
+
+
+def _decodificar_documentos(datos) -> Tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+    """(ids, inicio y fin en bytes de las posiciones de cada documento, inicio de la zona de posiciones)"""
+    longitud, inicio = decodificar_varint(datos, 0)
+    valores = decodificar_varints(datos[inicio:inicio + longitud])
+    fines = np.cumsum(valores[1::2])
+    return np.cumsum(valores[0::2]), fines - valores[1::2], fines, inicio + longitud
+
+
+def guardar_posiciones(indice: Dict[str, Dict[int, List[int]]], ruta: str):
+    with EscritorIndiceBinario(ruta, posiciones=True) as escritor:
+        for termino in sorted(indice):
+            escritor.agregar_termino_codificado(termino, codificar_posiciones(indice[termino]), len(indice[termino]))
+
+
+def _combinar_posiciones(contribuciones: List[bytes]) -> bytes:
+    # los parciales cubren rangos de documentos crecientes: se rehace la zona de documentos y las
+    # posiciones se copian tal cual
+    ids, longitudes, zonas = [], [], []
+    for datos in contribuciones:
+        ids_parcial, inicios, fines, base = _decodificar_documentos(datos)
+        ids.append(ids_parcial)
+        longitudes.append(fines - inicios)
+        zonas.append(datos[base:])
+    ids = np.concatenate(ids)
+    valores = np.empty(2 * len(ids), dtype=np.int64)
+    valores[0::2] = np.diff(ids, prepend=0)
+    valores[1::2] = np.concatenate(longitudes)
+    documentos = codificar_varints(valores)
+    salida = bytearray()
+    codificar_varint(len(documentos), salida)
+    return bytes(salida) + documentos + b''.join(zonas)
+
+
+def fusionar_posiciones(rutas_parciales: List[str], ruta_salida: str, memoria_maxima: int = MEMORIA_MAXIMA) -> str:
+    """fusiona en streaming los parciales posicionales (en orden de chunk) en indice_posiciones.bin"""
+    tamanio_buffer = max(TAMANIO_BUFFER_MINIMO, memoria_maxima // (2 * len(rutas_parciales) + 2))
+    recorredores = [iter(RecorredorIndiceBinario(ruta, tamanio_buffer)) for ruta in rutas_parciales]
+    heap = []
+    for orden, recorredor in enumerate(recorredores):
+        siguiente = next(recorredor, None)
+        if siguiente is not None:
+            heapq.heappush(heap, (siguiente[0], orden, siguiente))
+    with EscritorIndiceBinario(ruta_salida, posiciones=True) as escritor:
+        while heap:
+            termino = heap[0][0]
+            contribuciones = []
+            df = 0
+            while heap and heap[0][0] == termino:
+                _, orden, (_, df_parcial, datos) = heapq.heappop(heap)
+                contribuciones.append(datos)
+                df += df_parcial
+                siguiente = next(recorredores[orden], None)
+                if siguiente is not None:
+                    heapq.heappush(heap, (siguiente[0], orden, siguiente))
+            datos = contribuciones[0] if len(contribuciones) == 1 else _combinar_posiciones(contribuciones)
+            escritor.agregar_termino_codificado(termino, datos, df)
+    print(f"indice posicional guardado en {ruta_salida}")
+    return ruta_salida
+
+
+def _decodificar_trozos(datos, longitudes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(numero de trozo, posicion) de trozos seguidos de deltas de posicion con esas longitudes en bytes"""
+    valores = decodificar_varints(datos)
+    # cada documento tiene al menos una posicion; sus valores son los varints que terminan en su trozo
+    fin_varint = (np.frombuffer(datos, dtype=np.uint8) < 0x80).astype(np.int64)
+    cuantos = np.add.reduceat(fin_varint, np.cumsum(longitudes) - longitudes)
+    acumulado = np.cumsum(valores)
+    primeros = np.cumsum(cuantos) - cuantos
+    # los deltas reinician en cada documento
+    posiciones = acumulado - np.repeat(acumulado[primeros] - valores[primeros], cuantos)
+    return np.repeat(np.arange(len(longitudes)), cuantos), posiciones
+
+
+def _coincide_en_orden(posiciones: List[List[int]], limite: int) -> bool:
+    # para cada aparicion del primer termino se toma la siguiente aparicion de cada termino que sigue:
+    # es la que deja el tramo mas corto, asi que basta con mirar si ese tramo cabe en el limite
+    for inicio in posiciones[0]:
+        actual = inicio
+        for lista in posiciones[1:]:
+            siguiente = bisect_right(lista, actual)
+            if siguiente == len(lista):
+                return False
+            actual = lista[siguiente]
+            if actual - inicio > limite:
+                break
+        else:
+            return True
+    return False
+
+
+class LectorPosiciones:
+    """lee indice_posiciones.bin con mmap y resuelve frases: primero documentos, despues posiciones"""
+
+    def __init__(self, ruta: str):
+        self.lector = LectorIndiceBinario(ruta, usar_mmap=True)
+        if not self.lector.flags & FLAG_POSICIONES:
+            self.lector.cerrar()
+            raise ValueError(f"{ruta} no es un indice posicional")
+
+    def __contains__(self, termino: str) -> bool:
+        return termino in self.lector
+
+    def _documentos(self, termino: str):
+        offset, longitud, _ = self.lector.diccionario[termino]
+        datos = self.lector.mapa[offset:offset + min(longitud, 10)]
+        longitud_documentos, inicio = decodificar_varint(datos, 0)
+        # solo la zona de documentos; las posiciones se leen despues, por trozos
+        ids, inicios, fines, base = _decodificar_documentos(self.lector.mapa[offset:offset + inicio + longitud_documentos])
+        return ids, inicios, fines, offset + base
+
+    def documentos(self, termino: str) -> np.ndarray:
+        """ids (ordenados) de los documentos que contienen el termino"""
+        if termino not in self.lector:
+            return np.zeros(0, dtype=np.int64)
+        return self._documentos(termino)[0]
+
+    def _posiciones(self, lista, indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(numero de documento en indices, posicion) de los documentos indices de la lista"""
+        _, inicios, fines, base = lista
+        mapa = self.lector.mapa
+        if len(indices) * 4 < len(inicios):
+            # solo los trozos de esos documentos
+            datos = b''.join(mapa[base + inicio:base + fin] for inicio, fin in zip(inicios[indices].tolist(),
+                                                                                     fines[indices].tolist()))
+            return _decodificar_trozos(datos, fines[indices] - inicios[indices])
+        # si quedan casi todos, es mas barato decodificar la zona entera y quedarse con los que interesan
+        numero, posiciones = _decodificar_trozos(mapa[base:base + int(fines[-1])], fines - inicios)
+        elegidos = np.zeros(len(inicios), dtype=bool)
+        elegidos[indices] = True
+        quedan = elegidos[numero]
+        return (np.cumsum(elegidos) - 1)[numero[quedan]], posiciones[quedan]
+
+    def listas(self, terminos: List[str]) -> Dict[str, Tuple]:
+        """la zona de documentos de cada termino distinto, o None si alguno no esta en el indice"""
+        if not terminos or any(termino not in self.lector for termino in terminos):
+            return None
+        return {termino: self._documentos(termino) for termino in dict.fromkeys(terminos)}
+
+    def documentos_con_todos(self, listas: Dict[str, Tuple]) -> np.ndarray:
+        """interseccion de las listas de documentos, de la mas corta a la mas larga"""
+        candidatos = None
+        for termino in sorted(listas, key=lambda termino: len(listas[termino][0])):
+            ids = listas[termino][0]
+            candidatos = ids if candidatos is None else intersectar(candidatos, ids)
+            if not len(candidatos):
+                break
+        return candidatos
+
+    def verificar(self, terminos: List[str], listas: Dict[str, Tuple], candidatos: np.ndarray,
+                  distancia: int = 0) -> np.ndarray:
+        """de los candidatos (ordenados, con todos los terminos) los que tienen la frase; solo decodifica sus posiciones"""
+        if len(terminos) == 1 or not len(candidatos):
+            return candidatos
+        if distancia <= 0:
+            # frase exacta: (documento, posicion - i) tiene que estar en las listas de todos los terminos.
+            # se va de la lista mas corta a la mas larga y cada termino solo decodifica los documentos que
+            # siguen vivos; las claves salen ordenadas y sin repetidos (documento y posicion crecen juntos)
+            escala = np.int64(1) << 32
+            claves = None
+            for i in sorted(range(len(terminos)), key=lambda i: len(listas[terminos[i]][0])):
+                lista = listas[terminos[i]]
+                numero, posicion = self._posiciones(lista, np.searchsorted(lista[0], candidatos))
+                actuales = candidatos[numero] * escala + (posicion - i + len(terminos))
+                claves = actuales if claves is None else intersectar(claves, actuales)
+                documentos = claves // escala
+                candidatos = documentos[np.flatnonzero(np.diff(documentos, prepend=-1))]
+                if not len(candidatos):
+                    break
+            return candidatos
+
+        limite = len(terminos) - 1 + distancia
+        por_documento = {}
+        for termino, lista in listas.items():
+            numero, posicion = self._posiciones(lista, np.searchsorted(lista[0], candidatos))
+            cortes = np.flatnonzero(np.diff(numero)) + 1
+            por_documento[termino] = [trozo.tolist() for trozo in np.split(posicion, cortes)]
+        coincidencias = [indice for indice in range(len(candidatos))
+                         if _coincide_en_orden([por_documento[termino][indice] for termino in terminos], limite)]
+        return candidatos[np.array(coincidencias, dtype=np.int64)]
+
+    def buscar_frase(self, terminos: List[str], distancia: int = 0) -> np.ndarray:
+        """ids (ordenados) de los documentos con los terminos en ese orden
+
+        con distancia 0 los terminos van seguidos; con distancia d entre el primero y el ultimo puede haber
+        hasta d posiciones de mas (las stopwords no cuentan: no tienen posicion)
+        """
+        listas = self.listas(terminos)
+        if listas is None:
+            return np.zeros(0, dtype=np.int64)
+        return self.verificar(terminos, listas, self.documentos_con_todos(listas), distancia)
+
+    def cerrar(self):
+        self.lector.cerrar()
+
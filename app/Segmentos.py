@@ -0,0 +1,425 @@
+import os
+import json
+import math
+import time
+import shutil
+import bisect
+import threading
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, List, Optional
+
+from .IndiceBinario import LectorIndiceBinario, guardar_indice_binario, decodificar_varints
+from .FusionExterna import NOMBRE_INDICE_FINAL
+from .AlmacenDocumentos import AlmacenDocumentos, EscritorAlmacenDocumentos, NOMBRE_ALMACEN
+from .Normas import NOMBRE_NORMAS, cargar_normas, guardar_normas, normas_desde_sumas
+
+# INDICE POR SEGMENTOS (ESTILO LUCENE)
+# el indice construido con IndiceInvertido queda como segmento "base"; las canciones nuevas o
+# actualizadas se indexan en segmentos pequeños y las bajas se marcan en un bitmap de eliminados.
+# segmentos.json (el manifiesto) dice que segmentos y que bitmap forman el indice en cada version:
+#
+#   {"version": 3, "siguiente_id": 30210, "columnas": [...], "eliminados": "segmentos/eliminados_3.npy",
+#    "segmentos": [{"nombre": "base", "inicio": 0, "documentos": 30000, "indice": "indice_final.bin",
+#                   "normas": "normas.npy", "almacen": "documentos.bin", "claves": "segmentos/base/claves.json"},
+#                  {"nombre": "seg_000001", "inicio": 30000, "documentos": 210, "purgados": 12, ...}]}
+#
+# las rutas son relativas a la carpeta del indice (las normas del segmento base pueden estar en otra ruta).
+# los ids de documento son globales y nunca se reutilizan: cada segmento cubre [inicio, inicio + documentos) y
+# sus postings ya traen ids globales. al reescribir un segmento sus eliminados quedan como huecos vacios (sin
+# postings ni registro) para no mover los ids; "purgados" cuenta esos huecos. los pesos log(1 + tf) y las
+# normas de un documento solo dependen del documento, asi que no cambian al agregar otros; lo unico global es
+# el idf, que el motor calcula con los documentos vivos (N y df sin los eliminados). por eso el puntaje es el
+# mismo que el de reconstruir todo el indice con las filas vivas.
+#
+# un solo proceso escribe (agregar, eliminar, fusionar); los servidores solo leen el manifiesto y se
+# actualizan cuando cambia la version. cada cambio escribe archivos nuevos y al final reemplaza el
+# manifiesto con os.replace, asi que un lector nunca ve un indice a medias
+
+NOMBRE_MANIFIESTO = "segmentos.json"
+DIRECTORIO_SEGMENTOS = "segmentos"
+COLUMNA_CLAVE = "track_id"  # identifica una cancion para las actualizaciones y bajas
+FACTOR_FUSION = 10  # segmentos de tamaño parecido que se juntan en uno
+TAMANIO_MAXIMO_FUSION = 1000000  # documentos; segmentos mas grandes no se vuelven a fusionar
+PROPORCION_ELIMINADOS = 0.5  # un segmento con mas eliminados que esto se reescribe sin ellos
+
+
+def leer_manifiesto(ruta_indice: str) -> Optional[Dict]:
+    ruta = os.path.join(ruta_indice, NOMBRE_MANIFIESTO)
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, 'r', encoding='utf-8') as archivo:
+        return json.load(archivo)
+
+
+def _cargar_eliminados(ruta_indice: str, manifiesto: Dict) -> np.ndarray:
+    # bitmap empaquetado (un bit por id de documento)
+    total = manifiesto["siguiente_id"]
+    if not manifiesto.get("eliminados"):
+        return np.zeros(total, dtype=bool)
+    bits = np.load(os.path.join(ruta_indice, manifiesto["eliminados"]))
+    return np.unpackbits(bits, count=total).astype(bool)
+
+
+class VistaSegmentos:
+    """el indice de una version del manifiesto, solo lectura
+
+    ademas de los postings hace de almacen de documentos (__contains__ / obtener / __len__) por id global
+    """
+
+    def __init__(self, ruta_indice: str, manifiesto: Dict = None):
+        self.ruta_indice = ruta_indice
+        manifiesto = manifiesto or leer_manifiesto(ruta_indice)
+        if manifiesto is None:
+            raise FileNotFoundError(f"no existe {os.path.join(ruta_indice, NOMBRE_MANIFIESTO)}")
+        self.version = manifiesto["version"]
+        self.segmentos = manifiesto["segmentos"]
+        self.inicios = [segmento["inicio"] for segmento in self.segmentos]
+        self.eliminados = _cargar_eliminados(ruta_indice, manifiesto)
+        self.lectores = []
+        self.almacenes = []
+        self.normas = np.zeros(manifiesto["siguiente_id"], dtype=np.float32)
+        for segmento in self.segmentos:
+            self.lectores.append(LectorIndiceBinario(self._ruta(segmento["indice"]), usar_mmap=True))
+            self.almacenes.append(AlmacenDocumentos(self._ruta(segmento["almacen"])))
+            normas = cargar_normas(self._ruta(segmento["normas"]))
+            self.normas[segmento["inicio"]:segmento["inicio"] + len(normas)] = normas
+        # N del idf: documentos vivos en todos los segmentos
+        self.numero_documentos = sum(segmento["documentos"] for segmento in self.segmentos) - int(self.eliminados.sum())
+        self.hay_eliminados = bool(self.eliminados.any())
+
+    def _ruta(self, relativa: str) -> str:
+        return os.path.join(self.ruta_indice, relativa)
+
+    def __contains__(self, id_documento) -> bool:
+        return self._ubicar(id_documento) is not None
+
+    def __len__(self) -> int:
+        return self.numero_documentos
+
+    def _ubicar(self, id_documento):
+        try:
+            id_documento = int(id_documento)
+        except (TypeError, ValueError):
+            return None
+        if not 0 <= id_documento < len(self.eliminados) or self.eliminados[id_documento]:
+            return None
+        posicion = bisect.bisect_right(self.inicios, id_documento) - 1
+        if posicion < 0 or id_documento >= self.inicios[posicion] + self.segmentos[posicion]["documentos"]:
+            return None
+        return posicion, id_documento - self.inicios[posicion]
+
+    def obtener(self, id_documento) -> Optional[Dict]:
+        ubicacion = self._ubicar(id_documento)
+        if ubicacion is None:
+            return None
+        posicion, local = ubicacion
+        return self.almacenes[posicion].obtener(local)
+
+    def postings(self, termino: str) -> Optional[Dict[int, float]]:
+        """postings vivos del termino en todos los segmentos (None si no aparece en ninguno)"""
+        postings = None
+        for lector in self.lectores:
+            if termino not in lector:
+                continue
+            valores = decodificar_varints(lector.leer_bytes(termino))
+            ids = valores[0::2].cumsum()
+            pesos = valores[1::2] / lector.escala
+            if self.hay_eliminados:
+                vivos = ~self.eliminados[ids]
+                ids, pesos = ids[vivos], pesos[vivos]
+            if postings is None:
+                postings = {}
+            postings.update(zip(ids.tolist(), pesos.tolist()))
+        return postings
+
+    def cerrar(self):
+        for lector in self.lectores:
+            lector.cerrar()
+        for almacen in self.almacenes:
+            almacen.cerrar()
+
+
+class IndiceSegmentado:
+    """escritura del indice por segmentos: altas, actualizaciones, bajas y fusion de segmentos"""
+
+    def __init__(self, ruta_indice: str, ruta_stoplist: str = None, ruta_pesos: str = None, ruta_normas: str = None,
+                 factor_fusion: int = FACTOR_FUSION, tamanio_maximo_fusion: int = TAMANIO_MAXIMO_FUSION,
+                 columna_clave: str = COLUMNA_CLAVE):
+        self.ruta_indice = ruta_indice
+        self.ruta_stoplist = ruta_stoplist
+        self.ruta_pesos = ruta_pesos
+        self.ruta_normas = ruta_normas or NOMBRE_NORMAS  # normas del segmento base (relativa a ruta_indice o absoluta)
+        self.factor_fusion = factor_fusion
+        self.tamanio_maximo_fusion = tamanio_maximo_fusion
+        self.columna_clave = columna_clave
+        self.indexador = None
+        self.candado = threading.RLock()  # altas/bajas y la fusion en segundo plano comparten el manifiesto
+        self.manifiesto = leer_manifiesto(ruta_indice)
+        if self.manifiesto is None:
+            self.manifiesto = self._manifiesto_desde_indice()
+            self._confirmar(self.manifiesto, np.zeros(self.manifiesto["siguiente_id"], dtype=bool))
+        self.eliminados = _cargar_eliminados(ruta_indice, self.manifiesto)
+        self.claves = self._cargar_claves()
+
+    def _ruta(self, relativa: str) -> str:
+        return os.path.join(self.ruta_indice, relativa)
+
+    def _manifiesto_desde_indice(self) -> Dict:
+        # el indice completo construido con IndiceInvertido pasa a ser el segmento base
+        with AlmacenDocumentos(self._ruta(NOMBRE_ALMACEN)) as almacen:
+            columnas = almacen.columnas
+            numero_documentos = len(almacen)
+            posicion_clave = columnas.index(self.columna_clave)
+            claves = [almacen.registro(posicion)[posicion_clave] for posicion in range(numero_documentos)]
+        ruta_claves = os.path.join(DIRECTORIO_SEGMENTOS, "base", "claves.json")
+        os.makedirs(os.path.dirname(self._ruta(ruta_claves)), exist_ok=True)
+        with open(self._ruta(ruta_claves), 'w', encoding='utf-8') as archivo:
+            json.dump(claves, archivo)
+        print(f"indice de {self.ruta_indice} registrado como segmento base ({numero_documentos} documentos)")
+        return {"version": 0, "siguiente_id": numero_documentos, "columnas": columnas, "eliminados": None,
+                "segmentos": [{"nombre": "base", "inicio": 0, "documentos": numero_documentos,
+                               "indice": NOMBRE_INDICE_FINAL, "normas": self.ruta_normas, "almacen": NOMBRE_ALMACEN,
+                               "claves": ruta_claves}]}
+
+    def _cargar_claves(self) -> Dict[str, int]:
+        # clave -> id global de su version viva
+        claves = {}
+        for segmento in self.manifiesto["segmentos"]:
+            with open(self._ruta(segmento["claves"]), 'r', encoding='utf-8') as archivo:
+                for id_documento, clave in enumerate(json.load(archivo), start=segmento["inicio"]):
+                    if clave is not None and not self.eliminados[id_documento]:
+                        claves[str(clave)] = id_documento
+        return claves
+
+    def _confirmar(self, manifiesto: Dict, eliminados: np.ndarray):
+        """escribe el bitmap y reemplaza el manifiesto de una vez (la nueva version queda visible)"""
+        manifiesto["version"] += 1
+        anterior = leer_manifiesto(self.ruta_indice)
+        os.makedirs(self._ruta(DIRECTORIO_SEGMENTOS), exist_ok=True)
+        manifiesto["eliminados"] = None
+        if eliminados.any():
+            manifiesto["eliminados"] = os.path.join(DIRECTORIO_SEGMENTOS, f"eliminados_{manifiesto['version']}.npy")
+            with open(self._ruta(manifiesto["eliminados"]), 'wb') as archivo:
+                np.save(archivo, np.packbits(eliminados))
+        ruta_manifiesto = self._ruta(NOMBRE_MANIFIESTO)
+        with open(ruta_manifiesto + ".tmp", 'w', encoding='utf-8') as archivo:
+            json.dump(manifiesto, archivo, ensure_ascii=False, indent=1)
+        os.replace(ruta_manifiesto + ".tmp", ruta_manifiesto)
+        if anterior is not None:
+            self._borrar_obsoletos(anterior, manifiesto)
+
+    def _borrar_obsoletos(self, anterior: Dict, actual: Dict):
+        # los archivos del segmento base los genera IndiceInvertido y no se tocan
+        en_uso = {segmento["nombre"] for segmento in actual["segmentos"]}
+        for segmento in anterior["segmentos"]:
+            if segmento["nombre"] not in en_uso and segmento["nombre"] != "base":
+                shutil.rmtree(self._ruta(os.path.join(DIRECTORIO_SEGMENTOS, segmento["nombre"])), ignore_errors=True)
+        if anterior.get("eliminados") and anterior["eliminados"] != actual.get("eliminados"):
+            try:
+                os.remove(self._ruta(anterior["eliminados"]))
+            except OSError:
+                pass  # en windows un lector puede tenerlo abierto; se borra en la siguiente version
+
+    def _nombre_segmento(self) -> str:
+        numeros = [int(segmento["nombre"].split("_")[1]) for segmento in self.manifiesto["segmentos"]
+                   if segmento["nombre"].startswith("seg_")]
+        return f"seg_{max(numeros, default=0) + 1:06d}"
+
+    def _escribir_segmento(self, nombre: str, inicio: int, indice: Dict[str, Dict[int, float]], normas: np.ndarray,
+                           registros: Iterable[list], claves: List) -> Dict:
+        directorio = os.path.join(DIRECTORIO_SEGMENTOS, nombre)
+        os.makedirs(self._ruta(directorio), exist_ok=True)
+        segmento = {"nombre": nombre, "inicio": inicio, "documentos": len(claves),
+                    "indice": os.path.join(directorio, "indice.bin"), "normas": os.path.join(directorio, NOMBRE_NORMAS),
+                    "almacen": os.path.join(directorio, NOMBRE_ALMACEN),
+                    "claves": os.path.join(directorio, "claves.json")}
+        guardar_indice_binario(indice, self._ruta(segmento["indice"]))
+        guardar_normas(normas, self._ruta(segmento["normas"]))
+        with EscritorAlmacenDocumentos(self._ruta(segmento["almacen"]), self.manifiesto["columnas"]) as escritor:
+            escritor.agregar_registros(registros)
+        with open(self._ruta(segmento["claves"]), 'w', encoding='utf-8') as archivo:
+            json.dump(claves, archivo)
+        return segmento
+
+    def _crecer_eliminados(self, total: int):
+        if len(self.eliminados) < total:
+            self.eliminados = np.concatenate([self.eliminados, np.zeros(total - len(self.eliminados), dtype=bool)])
+
+    def agregar(self, filas: pd.DataFrame) -> List[int]:
+        """indexa las filas en un segmento nuevo; si la clave ya existe, la version anterior se da de baja
+
+        devuelve los ids globales asignados, en el orden de las filas
+        """
+        if list(filas.columns) != self.manifiesto["columnas"]:
+            raise ValueError(f"las columnas no coinciden con las del indice: {list(filas.columns)}")
+        if not len(filas):
+            return []
+        if self.indexador is None:
+            # Final2 importa este modulo para servir los segmentos, asi que el indexador se importa aqui
+            from .Final2 import IndiceInvertido
+            self.indexador = IndiceInvertido(None, self.ruta_stoplist, self.ruta_indice, None, self.ruta_pesos)
+        from .Final2 import indexar_chunk
+        with self.candado:
+            inicio = self.manifiesto["siguiente_id"]
+            chunk = filas.reset_index(drop=True)
+            chunk.index = pd.RangeIndex(inicio, inicio + len(chunk))
+            indice, sumas = indexar_chunk(chunk, self.indexador.pesos_campos, self.indexador.analizador)
+            claves = [str(clave) for clave in chunk[self.columna_clave].tolist()]
+            self._crecer_eliminados(inicio + len(chunk))
+            for id_documento, clave in zip(chunk.index.tolist(), claves):
+                anterior = self.claves.get(clave)
+                if anterior is not None:
+                    self.eliminados[anterior] = True  # actualizacion: la version vieja se da de baja
+                self.claves[clave] = id_documento
+            registros = (list(registro.values()) for registro in chunk.to_dict('records'))
+            segmento = self._escribir_segmento(self._nombre_segmento(), inicio, indice, normas_desde_sumas(sumas),
+                                               registros, claves)
+            manifiesto = dict(self.manifiesto, siguiente_id=inicio + len(chunk),
+                              segmentos=self.manifiesto["segmentos"] + [segmento])
+            self._confirmar(manifiesto, self.eliminados)
+            self.manifiesto = manifiesto
+            print(f"segmento {segmento['nombre']} con {len(chunk)} documentos (version {manifiesto['version']})")
+            return chunk.index.tolist()
+
+    def eliminar(self, claves: Iterable[str]) -> int:
+        """marca como eliminadas las canciones con esas claves; devuelve cuantas habia"""
+        with self.candado:
+            eliminadas = 0
+            for clave in claves:
+                id_documento = self.claves.pop(str(clave), None)
+                if id_documento is not None:
+                    self.eliminados[id_documento] = True
+                    eliminadas += 1
+            if eliminadas:
+                manifiesto = dict(self.manifiesto)
+                self._confirmar(manifiesto, self.eliminados)
+                self.manifiesto = manifiesto
+            return eliminadas
+
+    def _pendientes(self, segmento: Dict) -> int:
+        # eliminados del segmento que todavia ocupan postings y registros (los purgados ya son huecos vacios)
+        inicio = segmento["inicio"]
+        return int(self.eliminados[inicio:inicio + segmento["documentos"]].sum()) - segmento.get("purgados", 0)
+
+    def _nivel(self, segmento: Dict) -> int:
+        return int(math.log(max(segmento["documentos"], 1), self.factor_fusion))
+
+    def _elegir_fusion(self) -> Optional[List[int]]:
+        """posiciones de segmentos contiguos a fusionar, o None
+
+        politica por niveles: el nivel de un segmento es log_factor(documentos); cuando hay factor_fusion
+        segmentos seguidos del mismo nivel se juntan en uno del nivel siguiente. un segmento con muchos
+        eliminados sin purgar se reescribe solo para recuperar espacio
+        """
+        segmentos = self.manifiesto["segmentos"]
+        for posicion, segmento in enumerate(segmentos):
+            vivos_al_escribir = segmento["documentos"] - segmento.get("purgados", 0)
+            if segmento["nombre"] != "base" and self._pendientes(segmento) > PROPORCION_ELIMINADOS * vivos_al_escribir:
+                return [posicion]
+        corrida = []
+        for posicion, segmento in enumerate(segmentos):
+            if segmento["documentos"] > self.tamanio_maximo_fusion:
+                corrida = []
+                continue
+            if corrida and self._nivel(segmentos[corrida[-1]]) != self._nivel(segmento):
+                corrida = []
+            corrida.append(posicion)
+            if len(corrida) >= self.factor_fusion:
+                return corrida
+        return None
+
+    def fusionar_si_hace_falta(self) -> bool:
+        with self.candado:
+            posiciones = self._elegir_fusion()
+            if posiciones is None:
+                return False
+            self.fusionar([self.manifiesto["segmentos"][posicion]["nombre"] for posicion in posiciones])
+            return True
+
+    def fusionar(self, nombres: List[str]):
+        """junta segmentos contiguos en uno nuevo sin los documentos eliminados"""
+        with self.candado:
+            segmentos = self.manifiesto["segmentos"]
+            posiciones = [posicion for posicion, segmento in enumerate(segmentos) if segmento["nombre"] in nombres]
+            if len(posiciones) != len(nombres) or posiciones != list(range(posiciones[0], posiciones[-1] + 1)):
+                raise ValueError(f"solo se pueden fusionar segmentos contiguos: {nombres}")
+            inicio_fusion = time.perf_counter()
+            elegidos = [segmentos[posicion] for posicion in posiciones]
+            indice, normas, registros, claves = {}, [], [], []
+            for segmento in elegidos:
+                inicio, documentos = segmento["inicio"], segmento["documentos"]
+                eliminados = self.eliminados[inicio:inicio + documentos]
+                with LectorIndiceBinario(self._ruta(segmento["indice"])) as lector:
+                    for termino, postings in lector.cargar_todo().items():
+                        vivos = {id_documento: peso for id_documento, peso in postings.items()
+                                 if not eliminados[id_documento - inicio]}
+                        if vivos:
+                            indice.setdefault(termino, {}).update(vivos)
+                normas.append(np.asarray(cargar_normas(self._ruta(segmento["normas"]), usar_mmap=False)))
+                with open(self._ruta(segmento["claves"]), 'r', encoding='utf-8') as archivo:
+                    claves_segmento = json.load(archivo)
+                vacio = [None] * len(self.manifiesto["columnas"])
+                with AlmacenDocumentos(self._ruta(segmento["almacen"])) as almacen:
+                    for local in range(documentos):
+                        borrado = eliminados[local]
+                        registros.append(vacio if borrado else list(almacen.registro(local)))
+                        claves.append(None if borrado else claves_segmento[local])
+            nuevo = self._escribir_segmento(self._nombre_segmento(), elegidos[0]["inicio"], indice,
+                                            np.concatenate(normas), registros, claves)
+            nuevo["purgados"] = claves.count(None)
+            manifiesto = dict(self.manifiesto, segmentos=segmentos[:posiciones[0]] + [nuevo] +
+                              segmentos[posiciones[-1] + 1:])
+            self._confirmar(manifiesto, self.eliminados)
+            self.manifiesto = manifiesto
+            print(f"{len(elegidos)} segmentos fusionados en {nuevo['nombre']} ({nuevo['documentos']} documentos) "
+                  f"en {time.perf_counter() - inicio_fusion:.1f} s")
+
+    def segmentos(self) -> List[Dict]:
+        return list(self.manifiesto["segmentos"])
+
+
+class FusionSegundoPlano(threading.Thread):
+    """hilo que cada cierto tiempo aplica la politica de fusion del indice"""
+
+    def __init__(self, indice: IndiceSegmentado, intervalo_segundos: float = 60.0):
+        super().__init__(daemon=True)
+        self.indice = indice
+        self.intervalo_segundos = intervalo_segundos
+        self.detenido = threading.Event()
+
+    def run(self):
+        while not self.detenido.wait(self.intervalo_segundos):
+            try:
+                while self.indice.fusionar_si_hace_falta():
+                    pass
+            except Exception as e:
+                print(f"error en la fusion de segmentos: {e}")
+
+    def detener(self):
+        self.detenido.set()
+        self.join()
+
+
+if __name__ == "__main__":
+    import argparse
+    # uso: python -m app.Segmentos <ruta_indice> agregar <archivo.csv> --stoplist stoplist.csv --pesos pesos.json [--normas]
+    #      python -m app.Segmentos <ruta_indice> eliminar <track_id> ...
+    #      python -m app.Segmentos <ruta_indice> fusionar
+    # la primera vez el indice completo de la ruta se registra como segmento base
+    parser = argparse.ArgumentParser(description="altas, bajas y fusion del indice por segmentos")
+    parser.add_argument("ruta_indice")
+    parser.add_argument("accion", choices=["agregar", "eliminar", "fusionar"])
+    parser.add_argument("argumentos", nargs="*")
+    parser.add_argument("--stoplist")
+    parser.add_argument("--pesos")
+    parser.add_argument("--normas", help="normas.npy del indice completo si no esta en ruta_indice")
+    argumentos = parser.parse_args()
+    indice = IndiceSegmentado(argumentos.ruta_indice, argumentos.stoplist, argumentos.pesos, argumentos.normas)
+    if argumentos.accion == "agregar":
+        for ruta_csv in argumentos.argumentos:
+            indice.agregar(pd.read_csv(ruta_csv, encoding='utf-8'))
+    elif argumentos.accion == "eliminar":
+        print(f"{indice.eliminar(argumentos.argumentos)} canciones eliminadas")
+    while indice.fusionar_si_hace_falta():
+        pass
@@ -0,0 +1,112 @@
+import gc
+import os
+import time
+import signal
+import logging
+import socket
+import argparse
+
+# SERVIDOR PRE-FORK CON N WORKERS
+# uso: RUTA_SNAPSHOTS=<snapshots> python -m app.Servidor --workers 4 [--host 0.0.0.0] [--puerto 5000]
+#
+# el proceso principal crea la app (routes.py arma el MotorConsulta desde el snapshot: todo con mmap, ver
+# Snapshot.py), abre el socket y recien entonces hace fork de los workers, que aceptan conexiones del mismo
+# socket con el servidor de werkzeug. el indice, las normas, los documentos y el diccionario (.dicm) son
+# archivos mapeados de solo lectura, asi que sus paginas estan una sola vez en memoria para todos los
+# workers; lo que queda en el heap de python (sugerencias, stopwords...) se congela con gc.freeze antes del
+# fork para que el recolector no lo recorra y lo copie en cada worker. cada worker solo suma sus caches.
+# si un worker muere se levanta otro; SIGTERM o ctrl+c terminan todos.
+# con gunicorn vale lo mismo: gunicorn --preload -w 4 "app:create_app()". en windows no hay fork y se sirve
+# con un solo proceso
+
+PUERTO_POR_DEFECTO = 5000
+COLA_CONEXIONES = 128
+
+log = logging.getLogger(__name__)
+
+
+def crear_socket(host: str, puerto: int) -> socket.socket:
+    familia = socket.AF_INET6 if ":" in host else socket.AF_INET
+    servidor = socket.socket(familia, socket.SOCK_STREAM)
+    servidor.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    servidor.bind((host, puerto))
+    servidor.listen(COLA_CONEXIONES)
+    servidor.set_inheritable(True)
+    return servidor
+
+
+def _servir(app, host: str, puerto: int, descriptor: int, hilos: bool):
+    from werkzeug.serving import make_server
+    # con fd werkzeug usa el socket ya abierto (y heredado) en vez de abrir otro
+    make_server(host, puerto, app, threaded=hilos, fd=descriptor).serve_forever()
+
+
+def _lanzar_worker(app, host: str, puerto: int, descriptor: int, hilos: bool) -> int:
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        codigo = 0
+        try:
+            _servir(app, host, puerto, descriptor, hilos)
+        except Exception:
+            log.exception("worker %d termino con error", os.getpid())
+            codigo = 1
+        finally:
+            os._exit(codigo)
+    return pid
+
+
+def lanzar(workers: int, host: str = "127.0.0.1", puerto: int = PUERTO_POR_DEFECTO, hilos: bool = False):
+    """crea la app una vez y la sirve con `workers` procesos hijos hasta recibir SIGTERM o ctrl+c"""
+    from . import create_app
+    inicio = time.perf_counter()
+    app = create_app()
+    if not hasattr(os, "fork"):
+        log.warning("este sistema no tiene fork, se sirve con un solo proceso")
+        app.run(host=host, port=puerto, threaded=hilos)
+        return
+    servidor = crear_socket(host, puerto)
+    gc.collect()
+    gc.freeze()  # lo que ya existe queda fuera del recolector: sus paginas no se tocan en los workers
+    hijos = {_lanzar_worker(app, host, puerto, servidor.fileno(), hilos) for _ in range(workers)}
+    log.info("servidor en http://%s:%d con %d workers (pids %s), listo en %.2f s", host, puerto, workers,
+             sorted(hijos), time.perf_counter() - inicio)
+
+    terminando = []
+
+    def terminar(numero, _):
+        terminando.append(numero)
+        for pid in list(hijos):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, terminar)
+    signal.signal(signal.SIGINT, terminar)
+    while hijos:
+        try:
+            pid, estado = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        hijos.discard(pid)
+        if not terminando:
+            log.warning("worker %d termino (estado %d), se lanza otro", pid, estado)
+            hijos.add(_lanzar_worker(app, host, puerto, servidor.fileno(), hilos))
+    servidor.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="sirve la app con varios procesos que comparten el indice")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=PUERTO_POR_DEFECTO)
+    parser.add_argument("--hilos", action='store_true', help="cada worker atiende varias peticiones con hilos")
+    parser.add_argument("--snapshots", help="directorio de snapshots (en vez de la variable RUTA_SNAPSHOTS)")
+    argumentos = parser.parse_args()
+    if argumentos.snapshots:
+        os.environ["RUTA_SNAPSHOTS"] = argumentos.snapshots
+    lanzar(argumentos.workers, argumentos.host, argumentos.puerto, argumentos.hilos)
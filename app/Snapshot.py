@@ -0,0 +1,210 @@
+import os
+import json
+import stat
+import time
+import zlib
+import shutil
+from typing import Dict, Tuple
+
+from .IndiceBinario import (LectorIndiceBinario, guardar_diccionario_arreglos, guardar_diccionario_mapeado,
+                           SUFIJO_DICCIONARIO, SUFIJO_DICCIONARIO_MAPEADO)
+from .FusionExterna import NOMBRE_INDICE_FINAL
+from .Impactos import NOMBRE_INDICE_IMPACTOS
+from .Posiciones import NOMBRE_INDICE_POSICIONES
+from .Campos import DIRECTORIO_CAMPOS
+from .AlmacenDocumentos import NOMBRE_ALMACEN
+from .Normas import NOMBRE_NORMAS, cargar_normas
+from .Segmentos import NOMBRE_MANIFIESTO
+from .Sugerencias import NOMBRE_SUGERENCIAS
+
+# SNAPSHOTS DEL INDICE PARA SERVIR
+# despues de construir, publicar_snapshot copia a un directorio propio los archivos que usa el servidor:
+#
+#   <snapshots>/snapshot_000003/   indice_final.bin, indice_impactos.bin, normas.npy, documentos.bin,
+#                                  indice_posiciones.bin, campos/ y sugerencias.npz (si se construyeron),
+#                                  stoplist.csv, un .dicc.npz y un .dicm por indice (ver IndiceBinario.py)
+#                                  y snapshot.json
+#   <snapshots>/ACTUAL             el nombre del snapshot que se sirve
+#
+# snapshot.json (el manifiesto) tiene la version, la fecha, el numero de documentos y terminos, y el tamaño
+# y crc32 de cada archivo. un snapshot no se modifica nunca (los archivos quedan de solo lectura): el
+# siguiente se escribe en un directorio temporal, se renombra y recien entonces se cambia ACTUAL con
+# os.replace, asi que nadie abre uno a medias. se copia en vez de enlazar porque la construccion reescribe
+# los archivos del indice en el mismo lugar.
+#
+# el servidor arranca con MotorConsulta.desde_snapshot: lee el manifiesto, comprueba los tamaños y abre todo
+# con mmap (modo perezoso), sin leer el csv ni parsear postings; los diccionarios se consultan sobre los
+# .dicm mapeados (o se arman de los .dicc.npz), asi que los workers del servidor (ver Servidor.py) comparten
+# todo el indice
+
+NOMBRE_MANIFIESTO_SNAPSHOT = "snapshot.json"
+NOMBRE_ACTUAL = "ACTUAL"
+NOMBRE_STOPLIST = "stoplist.csv"
+PREFIJO_SNAPSHOT = "snapshot_"
+SNAPSHOTS_CONSERVADOS = 2  # el actual y el anterior (un servidor que todavia no se reinicio puede estar en el)
+TAMANIO_BLOQUE = 1024 * 1024
+
+
+def _crc32(ruta: str) -> int:
+    crc = 0
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(TAMANIO_BLOQUE), b''):
+            crc = zlib.crc32(bloque, crc)
+    return crc
+
+
+def _archivos_indice(ruta_indice: str, ruta_normas: str, ruta_stoplist: str) -> Dict[str, str]:
+    # nombre dentro del snapshot -> ruta de origen
+    archivos = {}
+    for nombre in (NOMBRE_INDICE_FINAL, NOMBRE_INDICE_IMPACTOS, NOMBRE_INDICE_POSICIONES, NOMBRE_ALMACEN,
+                   NOMBRE_SUGERENCIAS):
+        if os.path.exists(os.path.join(ruta_indice, nombre)):
+            archivos[nombre] = os.path.join(ruta_indice, nombre)
+    directorio_campos = os.path.join(ruta_indice, DIRECTORIO_CAMPOS)
+    if os.path.isdir(directorio_campos):
+        for nombre in sorted(os.listdir(directorio_campos)):
+            if "_parcial_" not in nombre and not nombre.endswith(".tmp"):
+                archivos[f"{DIRECTORIO_CAMPOS}/{nombre}"] = os.path.join(directorio_campos, nombre)
+    archivos[NOMBRE_NORMAS] = ruta_normas
+    archivos[NOMBRE_STOPLIST] = ruta_stoplist
+    return archivos
+
+
+def _ultima_version(ruta_snapshots: str) -> int:
+    versiones = [int(nombre[len(PREFIJO_SNAPSHOT):]) for nombre in os.listdir(ruta_snapshots)
+                 if nombre.startswith(PREFIJO_SNAPSHOT) and nombre[len(PREFIJO_SNAPSHOT):].isdigit()]
+    return max(versiones, default=0)
+
+
+def _borrar(ruta: str):
+    # los archivos son de solo lectura: en windows rmtree no los puede borrar sin devolverles el permiso
+    def quitar_solo_lectura(funcion, ruta_archivo, _):
+        os.chmod(ruta_archivo, stat.S_IWRITE)
+        funcion(ruta_archivo)
+    shutil.rmtree(ruta, onerror=quitar_solo_lectura)
+
+
+def _borrar_antiguos(ruta_snapshots: str, actual: str, conservar: int):
+    snapshots = sorted(nombre for nombre in os.listdir(ruta_snapshots)
+                       if nombre.startswith(PREFIJO_SNAPSHOT) and nombre != actual)
+    for nombre in snapshots[:max(0, len(snapshots) - (conservar - 1))]:
+        try:
+            _borrar(os.path.join(ruta_snapshots, nombre))
+            print(f"snapshot antiguo borrado: {nombre}")
+        except OSError as e:  # en windows no se puede borrar mientras un servidor lo tenga mapeado
+            print(f"no se pudo borrar el snapshot {nombre}: {e}")
+
+
+def publicar_snapshot(ruta_indice: str, ruta_snapshots: str, ruta_stoplist: str = None, ruta_normas: str = None,
+                      conservar: int = SNAPSHOTS_CONSERVADOS) -> str:
+    """copia el indice construido en ruta_indice a un snapshot nuevo y lo deja como ACTUAL; devuelve su ruta"""
+    if os.path.exists(os.path.join(ruta_indice, NOMBRE_MANIFIESTO)):
+        raise ValueError(f"{ruta_indice} tiene segmentos ({NOMBRE_MANIFIESTO}): los snapshots se publican desde "
+                         f"un indice construido con IndiceInvertido")
+    ruta_stoplist = ruta_stoplist or os.path.join(ruta_indice, NOMBRE_STOPLIST)
+    ruta_normas = ruta_normas or os.path.join(ruta_indice, NOMBRE_NORMAS)
+    origen = _archivos_indice(ruta_indice, ruta_normas, ruta_stoplist)
+    faltan = [nombre for nombre in (NOMBRE_ALMACEN, NOMBRE_NORMAS, NOMBRE_STOPLIST)
+              if not os.path.exists(origen.get(nombre, ''))]
+    if NOMBRE_INDICE_FINAL not in origen and NOMBRE_INDICE_IMPACTOS not in origen:
+        faltan.append(NOMBRE_INDICE_FINAL)
+    if faltan:
+        raise FileNotFoundError(f"faltan archivos del indice para el snapshot: {', '.join(faltan)}")
+
+    inicio = time.perf_counter()
+    os.makedirs(ruta_snapshots, exist_ok=True)
+    version = _ultima_version(ruta_snapshots) + 1
+    nombre = f"{PREFIJO_SNAPSHOT}{version:06d}"
+    temporal = os.path.join(ruta_snapshots, f".{nombre}.tmp")
+    if os.path.exists(temporal):
+        _borrar(temporal)  # de una publicacion que no termino
+    for destino, ruta in origen.items():
+        os.makedirs(os.path.dirname(os.path.join(temporal, destino)), exist_ok=True)
+        shutil.copyfile(ruta, os.path.join(temporal, destino))
+    for destino in list(origen):
+        if destino.endswith(".bin") and destino != NOMBRE_ALMACEN:
+            guardar_diccionario_arreglos(os.path.join(temporal, destino))
+            origen[destino + SUFIJO_DICCIONARIO] = None
+            guardar_diccionario_mapeado(os.path.join(temporal, destino))
+            origen[destino + SUFIJO_DICCIONARIO_MAPEADO] = None
+
+    principal = NOMBRE_INDICE_IMPACTOS if NOMBRE_INDICE_IMPACTOS in origen else NOMBRE_INDICE_FINAL
+    with LectorIndiceBinario(os.path.join(temporal, principal)) as lector:
+        numero_terminos = len(lector)
+    manifiesto = {
+        "version": version,
+        "creado": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "origen": os.path.abspath(ruta_indice),
+        "numero_documentos": int(len(cargar_normas(os.path.join(temporal, NOMBRE_NORMAS)))),
+        "numero_terminos": numero_terminos,
+        "archivos": {destino: {"bytes": os.path.getsize(os.path.join(temporal, destino)),
+                               "crc32": _crc32(os.path.join(temporal, destino))} for destino in sorted(origen)},
+    }
+    with open(os.path.join(temporal, NOMBRE_MANIFIESTO_SNAPSHOT), 'w', encoding='utf-8') as archivo:
+        json.dump(manifiesto, archivo, indent=1)
+    for carpeta, _, archivos in os.walk(temporal):
+        for archivo in archivos:
+            os.chmod(os.path.join(carpeta, archivo), stat.S_IREAD)
+
+    os.rename(temporal, os.path.join(ruta_snapshots, nombre))
+    ruta_actual = os.path.join(ruta_snapshots, NOMBRE_ACTUAL)
+    with open(ruta_actual + ".tmp", 'w', encoding='utf-8') as archivo:
+        archivo.write(nombre)
+    os.replace(ruta_actual + ".tmp", ruta_actual)
+    print(f"snapshot {nombre} publicado en {time.perf_counter() - inicio:.1f} s "
+          f"({manifiesto['numero_documentos']} documentos, {numero_terminos} terminos)")
+    _borrar_antiguos(ruta_snapshots, nombre, conservar)
+    return os.path.join(ruta_snapshots, nombre)
+
+
+def resolver_snapshot(ruta: str) -> str:
+    """directorio del snapshot: ruta misma si es un snapshot, o el que indica ruta/ACTUAL"""
+    if os.path.exists(os.path.join(ruta, NOMBRE_MANIFIESTO_SNAPSHOT)):
+        return ruta
+    ruta_actual = os.path.join(ruta, NOMBRE_ACTUAL)
+    if not os.path.exists(ruta_actual):
+        raise FileNotFoundError(f"{ruta} no es un snapshot ni tiene {NOMBRE_ACTUAL}")
+    with open(ruta_actual, 'r', encoding='utf-8') as archivo:
+        return os.path.join(ruta, archivo.read().strip())
+
+
+def abrir_snapshot(ruta: str, verificar: bool = False) -> Tuple[str, Dict]:
+    """(directorio, manifiesto) del snapshot; comprueba que esten todos los archivos con su tamaño
+
+    con verificar=True ademas recalcula el crc32 de cada archivo (lee todo el indice, no es para cada arranque).
+    ValueError si algun archivo no coincide con el manifiesto
+    """
+    directorio = resolver_snapshot(ruta)
+    with open(os.path.join(directorio, NOMBRE_MANIFIESTO_SNAPSHOT), 'r', encoding='utf-8') as archivo:
+        manifiesto = json.load(archivo)
+    errores = []
+    for nombre, datos in manifiesto["archivos"].items():
+        ruta_archivo = os.path.join(directorio, nombre)
+        if not os.path.exists(ruta_archivo):
+            errores.append(f"falta {nombre}")
+        elif os.path.getsize(ruta_archivo) != datos["bytes"]:
+            errores.append(f"{nombre} mide {os.path.getsize(ruta_archivo)} bytes y no {datos['bytes']}")
+        elif verificar and _crc32(ruta_archivo) != datos["crc32"]:
+            errores.append(f"el crc32 de {nombre} no coincide")
+    if errores:
+        raise ValueError(f"snapshot {directorio} dañado: {'; '.join(errores)}")
+    return directorio, manifiesto
+
+
+if __name__ == "__main__":
+    import argparse
+    # uso: python -m app.Snapshot <directorio del indice> <directorio de snapshots> [--stoplist ruta] [--normas ruta]
+    #      python -m app.Snapshot --verificar <directorio de snapshots>
+    parser = argparse.ArgumentParser(description="publica el indice construido como snapshot para el servidor")
+    parser.add_argument("rutas", nargs='+', help="indice y snapshots, o solo snapshots con --verificar")
+    parser.add_argument("--stoplist", help="stoplist.csv (por defecto la del directorio del indice)")
+    parser.add_argument("--normas", help="normas.npy (por defecto la del directorio del indice)")
+    parser.add_argument("--conservar", type=int, default=SNAPSHOTS_CONSERVADOS, help="snapshots que se guardan")
+    parser.add_argument("--verificar", action='store_true', help="comprueba el crc32 de todos los archivos")
+    argumentos = parser.parse_args()
+    if argumentos.verificar:
+        directorio, manifiesto = abrir_snapshot(argumentos.rutas[-1], verificar=True)
+        print(f"{directorio}: version {manifiesto['version']}, {len(manifiesto['archivos'])} archivos correctos")
+    else:
+        publicar_snapshot(argumentos.rutas[0], argumentos.rutas[1], argumentos.stoplist, argumentos.normas,
+                          argumentos.conservar)
@@ -0,0 +1,196 @@
+import os
+import unicodedata
+import numpy as np
+import pandas as pd
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from .IndiceBinario import LectorIndiceBinario
+
+# INDICE DE PREFIJOS PARA AUTOCOMPLETAR (/suggest)
+# sugerencias.npz, junto al indice, con tres listas ordenadas por clave (el texto normalizado: minusculas,
+# sin tildes y con un solo espacio entre palabras):
+#   terminos  los terminos (stems) de indice_final.bin, con su df como peso
+#   titulos   los track_name tal cual, con el numero de filas en que aparecen como peso
+#   artistas  lo mismo con track_artist
+# las claves que empiezan por un prefijo forman un rango contiguo que se encuentra con dos busquedas binarias.
+# si el rango es chico se ordena en la consulta; para los prefijos con mas de UMBRAL_RANGO entradas
+# (las primeras letras) el top ya viene calculado en el archivo, asi que ninguna consulta ordena mas de
+# UMBRAL_RANGO pesos y no se lee ningun posting
+
+NOMBRE_SUGERENCIAS = "sugerencias.npz"
+CAMPOS_SUGERENCIAS = {"titulos": "track_name", "artistas": "track_artist"}
+UMBRAL_RANGO = 1024
+MAX_SUGERENCIAS = 10  # tamaño del top precalculado; pedir mas recorre el rango entero
+_MAXIMO = chr(0x10FFFF)  # mayor que cualquier caracter: clave + _MAXIMO cierra el rango del prefijo
+
+
+def normalizar(texto: str) -> str:
+    """minusculas, sin tildes ni diacriticos y con los espacios colapsados"""
+    texto = unicodedata.normalize('NFKD', str(texto).lower())
+    return " ".join("".join(c for c in texto if not unicodedata.combining(c)).split())
+
+
+def contar_textos(chunk: pd.DataFrame, conteos: Dict[str, Counter]):
+    """suma al conteo de cada lista (titulos, artistas) las apariciones de cada texto del chunk"""
+    for lista, columna in CAMPOS_SUGERENCIAS.items():
+        if columna in chunk.columns:
+            textos = chunk[columna].dropna().astype(str).map(lambda texto: " ".join(texto.split()))
+            conteos[lista].update(textos[textos != ""].value_counts().to_dict())
+
+
+def _lista_desde_conteo(conteo: Dict[str, int]) -> Tuple[List[str], List[str], np.ndarray]:
+    # textos con la misma clave ("Love" y "love ") se juntan: se muestra el mas frecuente y se suman los pesos
+    por_clave = {}
+    for texto, peso in conteo.items():
+        clave = normalizar(texto)
+        if not clave:
+            continue
+        actual = por_clave.get(clave)
+        if actual is None:
+            por_clave[clave] = [texto, peso, peso]
+        else:
+            if (peso, texto) > (actual[2], actual[0]):
+                actual[0], actual[2] = texto, peso
+            actual[1] += peso
+    claves = sorted(por_clave)
+    return claves, [por_clave[clave][0] for clave in claves], np.array([por_clave[clave][1] for clave in claves],
+                                                                        dtype=np.int64)
+
+
+def _ordenar_por_peso(pesos: np.ndarray, cantidad: int) -> np.ndarray:
+    # posiciones de los `cantidad` pesos mayores; a igual peso primero la clave menor
+    if cantidad <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if cantidad < len(pesos):
+        candidatos = np.argpartition(-pesos, cantidad - 1)[:cantidad]
+        corte = pesos[candidatos].min()
+        candidatos = np.flatnonzero(pesos >= corte)  # los empates con el ultimo tambien compiten
+    else:
+        candidatos = np.arange(len(pesos))
+    return candidatos[np.lexsort((candidatos, -pesos[candidatos]))][:cantidad]
+
+
+def _tops_prefijos(claves: List[str], pesos: np.ndarray, umbral: int = UMBRAL_RANGO,
+                   cantidad: int = MAX_SUGERENCIAS) -> Dict[str, np.ndarray]:
+    """{prefijo: top de posiciones} de cada prefijo cuyo rango tiene mas de `umbral` claves
+
+    se baja un caracter por nivel y solo dentro de los rangos grandes, asi que el costo es proporcional
+    a las claves que caen en ellos
+    """
+    tops = {}
+    rangos = [(0, len(claves), "")]
+    while rangos:
+        siguientes = []
+        for inicio, fin, prefijo in rangos:
+            if fin - inicio <= umbral:
+                continue
+            tops[prefijo] = inicio + _ordenar_por_peso(pesos[inicio:fin], cantidad)
+            largo = len(prefijo) + 1
+            posicion = inicio
+            while posicion < fin and len(claves[posicion]) < largo:  # la clave igual al prefijo va primero
+                posicion += 1
+            while posicion < fin:
+                hijo = claves[posicion][:largo]
+                final = bisect_left(claves, hijo + _MAXIMO, posicion, fin)
+                siguientes.append((posicion, final, hijo))
+                posicion = final
+        rangos = siguientes
+    return tops
+
+
+def _unir(textos: List[str]) -> np.ndarray:
+    if any('\n' in texto for texto in textos):
+        raise ValueError("las sugerencias no pueden tener saltos de linea")
+    return np.frombuffer('\n'.join(textos).encode('utf-8'), dtype=np.uint8)
+
+
+def _separar(arreglo: np.ndarray) -> List[str]:
+    texto = arreglo.tobytes().decode('utf-8')
+    return texto.split('\n') if texto else []
+
+
+def guardar_sugerencias(ruta: str, conteos: Dict[str, Dict[str, int]], ruta_indice_final: str = None) -> str:
+    """escribe sugerencias.npz con los conteos de titulos y artistas y los terminos de indice_final.bin"""
+    listas = dict(conteos)
+    if ruta_indice_final is not None and os.path.exists(ruta_indice_final):
+        with LectorIndiceBinario(ruta_indice_final) as lector:
+            listas["terminos"] = {termino: datos[2] for termino, datos in lector.diccionario.items()}
+    arreglos = {}
+    for nombre, conteo in listas.items():
+        claves, textos, pesos = _lista_desde_conteo(conteo)
+        tops = _tops_prefijos(claves, pesos)
+        prefijos = sorted(tops)
+        arreglos[f"{nombre}_claves"] = _unir(claves)
+        arreglos[f"{nombre}_textos"] = _unir(textos)
+        arreglos[f"{nombre}_pesos"] = pesos
+        arreglos[f"{nombre}_prefijos"] = _unir(prefijos)
+        arreglos[f"{nombre}_inicios"] = np.cumsum([0] + [len(tops[p]) for p in prefijos], dtype=np.int64)
+        arreglos[f"{nombre}_tops"] = np.concatenate([tops[p] for p in prefijos] or [np.zeros(0)]).astype(np.int64)
+    with open(ruta, 'wb') as archivo:  # con el archivo abierto np.savez no cambia la extension
+        np.savez(archivo, listas=_unir(sorted(listas)), **arreglos)
+    return ruta
+
+
+class ListaSugerencias:
+    """una lista ordenada por clave con sus pesos y los tops precalculados de los prefijos grandes"""
+
+    def __init__(self, claves: List[str], textos: List[str], pesos: np.ndarray, tops: Dict[str, np.ndarray]):
+        self.claves = claves
+        self.textos = textos
+        self.pesos = pesos
+        self.tops = tops
+
+    def rango(self, clave: str) -> Tuple[int, int]:
+        inicio = bisect_left(self.claves, clave)
+        return inicio, bisect_left(self.claves, clave + _MAXIMO, inicio)
+
+    def sugerir(self, clave: str, cantidad: int = MAX_SUGERENCIAS) -> List[Tuple[str, int]]:
+        """(texto, peso) de las `cantidad` entradas de mas peso cuya clave empieza por `clave`"""
+        inicio, fin = self.rango(clave)
+        if fin - inicio > UMBRAL_RANGO and cantidad <= MAX_SUGERENCIAS and clave in self.tops:
+            posiciones = self.tops[clave][:cantidad]
+        else:
+            posiciones = inicio + _ordenar_por_peso(self.pesos[inicio:fin], cantidad)
+        return [(self.textos[posicion], int(self.pesos[posicion])) for posicion in posiciones.tolist()]
+
+    def __len__(self) -> int:
+        return len(self.claves)
+
+
+class IndiceSugerencias:
+    """las listas de sugerencias.npz (terminos, titulos, artistas) en memoria"""
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self.listas = {}
+        with np.load(ruta) as arreglos:
+            for nombre in _separar(arreglos["listas"]):
+                prefijos = _separar(arreglos[f"{nombre}_prefijos"])
+                inicios = arreglos[f"{nombre}_inicios"]
+                tops = arreglos[f"{nombre}_tops"]
+                self.listas[nombre] = ListaSugerencias(
+                    _separar(arreglos[f"{nombre}_claves"]), _separar(arreglos[f"{nombre}_textos"]),
+                    arreglos[f"{nombre}_pesos"],
+                    {prefijo: tops[inicios[i]:inicios[i + 1]] for i, prefijo in enumerate(prefijos)})
+
+    def sugerir(self, prefijo: str, cantidad: int = MAX_SUGERENCIAS) -> Dict[str, List[Dict]]:
+        """{lista: [{"texto", "peso"}]}: titulos y artistas que empiezan por el prefijo, y terminos que
+        completan su ultima palabra"""
+        clave = normalizar(prefijo)
+        # con un espacio al final la ultima palabra ya esta completa: "tu " no sigue en "tuwayng"
+        completa = prefijo[-1:].isspace()
+        sugerencias = {}
+        for nombre, lista in self.listas.items():
+            if nombre == "terminos":
+                palabras = clave.split()
+                buscada = palabras[-1] if palabras and not completa else None
+                encontradas = lista.sugerir(buscada, cantidad) if buscada else []
+            else:
+                encontradas = lista.sugerir(clave + " " if completa else clave, cantidad) if clave else []
+            sugerencias[nombre] = [{"texto": texto, "peso": peso} for texto, peso in encontradas]
+        return sugerencias
+
+    def estadisticas(self) -> Dict[str, int]:
+        return {nombre: len(lista) for nombre, lista in self.listas.items()}
@@ -0,0 +1,141 @@
+import heapq
+import numpy as np
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from .Metricas import etapa
+
+# SELECCION DE LOS TOP K DOCUMENTOS POR SIMILITUD COSENO
+#
+# cada lista de la consulta es (frecuencia_q, idf, postings, impacto_maximo), en el orden de la consulta,
+# donde impacto_maximo es una cota de peso / norma en esa lista. la contribucion de un termino a la
+# similitud de un documento nunca supera frecuencia_q * idf * impacto_maximo / norma_consulta.
+# los postings son {id_documento (int): peso} y las normas un arreglo indexado por id de documento;
+# con impactos precalculados (tf·idf/norma en el posting) se pasa idf = 1 y normas = None
+# en las metricas (Metricas.py) 'puntuar' es la acumulacion sobre las listas y 'top_k' la eleccion final
+
+HOLGURA = 1e-9  # margen para errores de redondeo al comparar cotas con el umbral
+
+
+def _similitudes(ids: np.ndarray, puntuaciones: np.ndarray, normas: Optional[np.ndarray],
+                 norma_consulta: float) -> np.ndarray:
+    """similitud coseno de varios documentos a la vez (los documentos con norma 0 puntuan 0)"""
+    if norma_consulta <= 0:
+        return np.zeros(len(ids))
+    if normas is None:
+        return puntuaciones / norma_consulta
+    normas_documentos = np.zeros(len(ids))
+    dentro = ids < len(normas)
+    normas_documentos[dentro] = normas[ids[dentro]]
+    similitudes = np.zeros(len(ids))
+    validas = normas_documentos > 0
+    similitudes[validas] = puntuaciones[validas] / (normas_documentos[validas] * norma_consulta)
+    return similitudes
+
+
+def _similitud(puntuacion: float, id_documento: int, normas: Optional[np.ndarray], norma_consulta: float) -> float:
+    # la misma cuenta que _similitudes para un solo documento
+    if normas is None:
+        return puntuacion / norma_consulta
+    norma = float(normas[id_documento]) if id_documento < len(normas) else 0.0
+    return puntuacion / (norma * norma_consulta) if norma > 0 else 0.0
+
+
+def _arreglos(acumulados: Dict[int, float]) -> Tuple[np.ndarray, np.ndarray]:
+    return (np.fromiter(acumulados.keys(), dtype=np.int64, count=len(acumulados)),
+            np.fromiter(acumulados.values(), dtype=np.float64, count=len(acumulados)))
+
+
+def _k_esimo_mayor(valores: np.ndarray, k: int) -> float:
+    posicion = max(len(valores) - k, 0)
+    return float(np.partition(valores, posicion)[posicion])
+
+
+def top_k_exhaustivo(listas: List[Tuple[float, float, Dict[int, float], float]], normas: Optional[np.ndarray],
+                     norma_consulta: float, k: int) -> List[Tuple[int, float]]:
+    """puntua todos los documentos candidatos y ordena (el algoritmo original de buscar)"""
+    puntuaciones = defaultdict(float)
+    with etapa("puntuar"):
+        for frecuencia_q, idf, postings, _ in listas:
+            for id_documento, frecuencia_d in postings.items():
+                puntuaciones[id_documento] += frecuencia_q * frecuencia_d * idf
+    if not puntuaciones:
+        return []
+    with etapa("top_k"):
+        ids, valores = _arreglos(puntuaciones)
+        similitud_coseno = zip(ids.tolist(), _similitudes(ids, valores, normas, norma_consulta).tolist())
+        return sorted(similitud_coseno, key=lambda item: item[1], reverse=True)[:k]
+
+
+def top_k_maxscore(listas: List[Tuple[float, float, Dict[int, float], float]], normas: Optional[np.ndarray],
+                   norma_consulta: float, k: int) -> List[Tuple[int, float]]:
+    """top k con poda MaxScore (termino a termino) y un min-heap de tamaño k
+
+    las listas se recorren de mayor a menor cota. cuando la suma de las cotas de las listas que faltan
+    ya no alcanza la k-esima mejor puntuacion parcial, ningun documento nuevo puede entrar al top k:
+    se descartan los acumuladores sin opcion y las listas restantes (las de palabras comunes, con idf
+    bajo) ya no se recorren, solo se consultan por diccionario para los documentos que quedan.
+
+    al final solo los documentos cerca del umbral se puntuan de nuevo sumando en el orden de la consulta,
+    asi que el resultado es exactamente el de top_k_exhaustivo, incluido el orden de los empates
+    (primero el documento que aparece antes: por termino de la consulta y luego por id)
+    """
+    if k <= 0 or not listas or norma_consulta <= 0:
+        return top_k_exhaustivo(listas, normas, norma_consulta, k)
+
+    with etapa("puntuar"):
+        cotas = [frecuencia_q * idf * impacto / norma_consulta for frecuencia_q, idf, _, impacto in listas]
+        restante = sum(cotas)
+        procesado = 0.0
+        acumulados = {}
+        continuar = False  # True cuando ya no pueden entrar documentos nuevos
+        for i in sorted(range(len(listas)), key=lambda i: -cotas[i]):
+            frecuencia_q, idf, postings, _ = listas[i]
+            factor = frecuencia_q * idf
+            restante -= cotas[i]
+            procesado += cotas[i]
+            if not continuar:
+                obtener = acumulados.get
+                for id_documento, peso in postings.items():
+                    acumulados[id_documento] = obtener(id_documento, 0.0) + factor * peso
+                # el umbral nunca supera lo procesado, asi que solo vale la pena calcularlo si restante < procesado
+                if restante > 0 and len(acumulados) >= k and restante * (1 + HOLGURA) + HOLGURA < procesado:
+                    ids, puntuaciones = _arreglos(acumulados)
+                    parciales = _similitudes(ids, puntuaciones, normas, norma_consulta)
+                    umbral = _k_esimo_mayor(parciales, k)
+                    if restante * (1 + HOLGURA) + HOLGURA < umbral:
+                        continuar = True
+                        vivos = (parciales + restante) * (1 + HOLGURA) + HOLGURA >= umbral
+                        acumulados = dict(zip(ids[vivos].tolist(), puntuaciones[vivos].tolist()))
+            else:
+                obtener = postings.get
+                for id_documento in acumulados:
+                    peso = obtener(id_documento)
+                    if peso is not None:
+                        acumulados[id_documento] += factor * peso
+
+    if not acumulados:
+        return []
+    with etapa("top_k"):
+        ids, puntuaciones = _arreglos(acumulados)
+        aproximadas = _similitudes(ids, puntuaciones, normas, norma_consulta)
+        corte = _k_esimo_mayor(aproximadas, k)
+        corte = corte - abs(corte) * HOLGURA - HOLGURA  # las sumas en otro orden difieren en el ultimo bit
+
+        heap = []
+        for id_documento in ids[aproximadas >= corte].tolist():
+            # puntuacion exacta sumando en el orden de la consulta, igual que el algoritmo original
+            puntuacion = 0.0
+            primer_termino = None
+            for posicion, (frecuencia_q, idf, postings, _) in enumerate(listas):
+                peso = postings.get(id_documento)
+                if peso is not None:
+                    puntuacion += frecuencia_q * peso * idf
+                    if primer_termino is None:
+                        primer_termino = posicion
+            entrada = (_similitud(puntuacion, id_documento, normas, norma_consulta), -primer_termino, -id_documento,
+                       id_documento)
+            if len(heap) < k:
+                heapq.heappush(heap, entrada)
+            elif entrada > heap[0]:
+                heapq.heapreplace(heap, entrada)
+        return [(id_documento, similitud) for similitud, _, _, id_documento in sorted(heap, reverse=True)]
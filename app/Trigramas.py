@@ -0,0 +1,118 @@
+import numpy as np
+from collections import defaultdict
+from typing import Iterable, List, Set, Tuple
+
+# INDICE DE TRIGRAMAS DEL VOCABULARIO PARA CONSULTAS CON ERRORES
+# un termino mal escrito ("corazn", "shakria") no esta en el diccionario y buscar lo ignora.
+# este indice encuentra los terminos del vocabulario a distancia de edicion (levenshtein) acotada:
+#   - cada termino se parte en trigramas con dos '$' de relleno a cada lado ("$$sol$$" -> $$s, $so, sol, ol$, l$$)
+#   - los terminos van numerados por (largo, termino), asi que el filtro de largo (|largo - largo_q| <= d)
+#     es un rango de ids y de cada lista de trigramas solo se mira ese rango con searchsorted
+#   - filtro de conteo: una edicion cambia a lo mas 3 trigramas, asi que un termino a distancia <= d comparte
+#     al menos max(|G_q|, |G_t|) - 3·d trigramas distintos con la consulta; solo esos se comparan letra a letra
+# la distancia exacta se calcula con la diagonal acotada y se corta apenas pasa el maximo
+
+Q = 3
+RELLENO = "$" * (Q - 1)
+MIN_LARGO_DIFUSO = 4  # con menos letras casi cualquier termino esta a una edicion
+LARGO_DOS_ERRORES = 8  # desde este largo se permiten 2 ediciones
+MAX_EXPANSIONES = 3  # terminos del vocabulario que reemplazan a uno mal escrito
+PESO_POR_EDICION = 0.5  # el peso en la consulta se multiplica por esto por cada edicion
+
+
+def trigramas(termino: str) -> Set[str]:
+    relleno = RELLENO + termino + RELLENO
+    return {relleno[i:i + Q] for i in range(len(relleno) - Q + 1)}
+
+
+def distancia_maxima(termino: str) -> int:
+    """ediciones que se toleran segun el largo del termino"""
+    if len(termino) < MIN_LARGO_DIFUSO:
+        return 0
+    return 2 if len(termino) >= LARGO_DOS_ERRORES else 1
+
+
+def distancia_edicion(a: str, b: str, maximo: int) -> int:
+    """levenshtein entre a y b, o maximo + 1 si pasa de maximo (solo se recorre la diagonal de ancho maximo)"""
+    if abs(len(a) - len(b)) > maximo:
+        return maximo + 1
+    if len(a) > len(b):
+        a, b = b, a
+    fuera = maximo + 1
+    anterior = [j if j <= maximo else fuera for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        actual = [fuera] * (len(b) + 1)
+        if i <= maximo:
+            actual[0] = i
+        desde, hasta = max(1, i - maximo), min(len(b), i + maximo)
+        letra = a[i - 1]
+        for j in range(desde, hasta + 1):
+            costo = anterior[j - 1] + (letra != b[j - 1])
+            if anterior[j] + 1 < costo:
+                costo = anterior[j] + 1
+            if actual[j - 1] + 1 < costo:
+                costo = actual[j - 1] + 1
+            actual[j] = costo if costo < fuera else fuera
+        if min(actual[desde - 1:hasta + 1]) > maximo:
+            return fuera
+        anterior = actual
+    return anterior[len(b)]
+
+
+class IndiceTrigramas:
+    """trigrama -> ids de los terminos que lo tienen (ordenados), sobre un vocabulario fijo"""
+
+    def __init__(self, vocabulario: Iterable[str]):
+        self.terminos = sorted(vocabulario, key=lambda termino: (len(termino), termino))
+        self.largos = np.array([len(termino) for termino in self.terminos], dtype=np.int32)
+        ids_por_trigrama = defaultdict(list)
+        numero_trigramas = np.zeros(len(self.terminos), dtype=np.int32)
+        for id_termino, termino in enumerate(self.terminos):
+            grupos = trigramas(termino)
+            numero_trigramas[id_termino] = len(grupos)
+            for trigrama in grupos:
+                ids_por_trigrama[trigrama].append(id_termino)
+        self.numero_trigramas = numero_trigramas
+        self.listas = {trigrama: np.array(ids, dtype=np.int32) for trigrama, ids in ids_por_trigrama.items()}
+
+    def __len__(self) -> int:
+        return len(self.terminos)
+
+    def candidatos(self, termino: str, maximo: int) -> np.ndarray:
+        """ids de los terminos que pasan los filtros de largo y de conteo (sin calcular distancias)"""
+        grupos = trigramas(termino)
+        desde = int(np.searchsorted(self.largos, len(termino) - maximo, side='left'))
+        hasta = int(np.searchsorted(self.largos, len(termino) + maximo, side='right'))
+        minimo = len(grupos) - Q * maximo
+        if desde >= hasta or minimo <= 0:
+            return np.arange(desde, hasta, dtype=np.int32)  # sin filtro de conteo posible
+        tramos = []
+        for trigrama in grupos:
+            lista = self.listas.get(trigrama)
+            if lista is not None:
+                tramo = lista[np.searchsorted(lista, desde):np.searchsorted(lista, hasta)]
+                if len(tramo):
+                    tramos.append(tramo)
+        if len(tramos) < minimo:
+            return np.zeros(0, dtype=np.int32)
+        # las cuentas se hacen sobre el rango de largos, no sobre todo el vocabulario
+        cuentas = np.bincount(np.concatenate(tramos) - desde, minlength=hasta - desde)
+        necesarias = np.maximum(minimo, self.numero_trigramas[desde:hasta] - Q * maximo)
+        return desde + np.flatnonzero(cuentas >= necesarias).astype(np.int32)
+
+    def buscar(self, termino: str, maximo: int = None) -> List[Tuple[str, int]]:
+        """(termino, distancia) de los terminos distintos de `termino` a distancia <= maximo, de menor a mayor"""
+        if maximo is None:
+            maximo = distancia_maxima(termino)
+        if maximo <= 0:
+            return []
+        encontrados = []
+        for id_termino in self.candidatos(termino, maximo).tolist():
+            candidato = self.terminos[id_termino]
+            if candidato == termino:
+                continue
+            distancia = distancia_edicion(termino, candidato, maximo)
+            if distancia <= maximo:
+                encontrados.append((candidato, distancia))
+        encontrados.sort(key=lambda par: (par[1], par[0]))
+        return encontrados
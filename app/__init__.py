@@ -1,7 +1,22 @@
+import os
+import logging
 from flask import Flask
-from .routes import main
+
+# NIVEL_LOG=DEBUG muestra ademas una linea por consulta (modo, terminos, resultados); por defecto INFO
+FORMATO_LOG = "%(asctime)s %(levelname)s pid=%(process)d %(name)s: %(message)s"
+
+
+def configurar_logs():
+    # no hace nada si quien lanza la app (gunicorn, un test...) ya configuro logging
+    logging.basicConfig(level=os.environ.get("NIVEL_LOG", "INFO").upper(), format=FORMATO_LOG)
+
 
 def create_app():
+    configurar_logs()
+    # el blueprint se importa aqui para que importar modulos de app (p.ej. app.IndiceBinario)
+    # no construya el motor de busqueda como efecto secundario
+    from .routes import main
+
     app = Flask(__name__)
 
     # Configuración de la aplicación (opcional)
@@ -1,16 +1,20 @@
 import psycopg2 as pg
-from flask import Blueprint, render_template, request, jsonify, current_app
+from flask import Blueprint, render_template, request, jsonify, current_app, g, Response
 import os
 from .Final2 import IndiceInvertido, MotorConsulta
+from .Sugerencias import MAX_SUGERENCIAS
 from .Multidimencional.knn_secuencial import knnsecuencial, obtener_vector_desde_imagen
-import json
+from .Multidimencional.modelo_inception import precargar_en_segundo_plano, estado_modelo, modelo_listo
+from .Metricas import metricas, etapa, observar_peticion
+import logging
 
 import psycopg2 as pg
 import pandas as pd
 from psycopg2.extras import RealDictCursor
 import time
+import threading
 
-
+log = logging.getLogger(__name__)
 
 
 class PostgresConnector:
@@ -82,7 +86,7 @@ class PostgresConnector:
     def load_data(self, csv_path):
         self.cur.execute("SELECT COUNT(*) FROM songs.spotify_songs")
         if self.cur.fetchone()['count'] > 0:
-            print("Los datos ya están cargados")
+            log.info("Los datos ya están cargados")
             return
             
         # Cargar datos desde CSV
@@ -150,22 +154,83 @@ class PostgresConnector:
 
 main = Blueprint('main', __name__)
 
+@main.before_request
+def _inicio_peticion():
+    if metricas.activas:
+        g.inicio_peticion = time.perf_counter()
+
+@main.after_request
+def _fin_peticion(respuesta):
+    # latencia de cada peticion por ruta (/consulta, /suggest...), ver Metricas.py
+    inicio = g.pop('inicio_peticion', None)
+    if inicio is not None and request.url_rule is not None:
+        observar_peticion(request.url_rule.rule, time.perf_counter() - inicio)
+    return respuesta
+
+def _responder(resultados, camino: str = "texto"):
+    # jsonify arma el cuerpo de la respuesta: es la etapa 'serializar'
+    with etapa("serializar", camino):
+        return jsonify(resultados)
+
 # Configuracion de rutas de archivos
 RUTA_INDICE_LOCAL = r"C:\Users\semin\BD2"
 RUTA_ARCHIVO_CSV = r"C:\Users\semin\OneDrive\Escritorio\bd2_code\Clonación2\Proyecto_2_BD2\spotify_songs_filtrado.csv"
 #RUTA_STOPLIST = r"C:\Users\semin\BD2\stoplist.csv"
 RUTA_STOPLIST = r"C:\Users\semin\BD2\stoplist.csv"
-RUTA_NORMAS = r"C:\Users\semin\OneDrive\Escritorio\bd2_code\Clonación2\Proyecto_2_BD2\app\TESING\normas.json"
+RUTA_NORMAS = r"C:\Users\semin\OneDrive\Escritorio\bd2_code\Clonación2\Proyecto_2_BD2\app\TESING\normas.npy"
 RUTA_PESOS_CAMPO = r"C:\Users\semin\OneDrive\Escritorio\bd2_code\Clonación2\Proyecto_2_BD2\app\TESING\pesos_campos.json"
 
-knn = knnsecuencial()
+MAX_CONSULTAS_LOTE = 10000  # consultas por peticion en /consulta/batch
+# postings decodificados en la cache de cada proceso: con varios workers (Servidor.py) es lo que cada uno
+# suma a la memoria compartida del indice
+MAX_POSTINGS_CACHE = int(os.environ.get("MAX_POSTINGS_CACHE", 200000))
+MAX_SUGERENCIAS_PETICION = 50  # k maximo de /suggest
+
+# la busqueda por imagen (knn y el modelo InceptionV3 con tensorflow) se carga con la primera peticion a
+# /knn/priority; con PRECARGAR_MODELO_IMAGENES=1 el modelo se empieza a cargar en un hilo al arrancar.
+# /consulta no espera a nada de esto, y sin peticiones de imagenes tensorflow nunca se importa
+PRECARGAR_MODELO_IMAGENES = os.environ.get("PRECARGAR_MODELO_IMAGENES") == "1"
+
+_knn = None
+_candado_knn = threading.Lock()
+
+
+def obtener_knn() -> knnsecuencial:
+    global _knn
+    with _candado_knn:
+        if _knn is None:
+            _knn = knnsecuencial()
+    return _knn
+
+# con RUTA_SNAPSHOTS el servidor arranca desde el snapshot actual (python -m app.Snapshot <indice> <snapshots>):
+# solo abre los archivos con mmap, sin leer el csv. para varios procesos: python -m app.Servidor --workers N
+RUTA_SNAPSHOTS = os.environ.get("RUTA_SNAPSHOTS")
+
+if RUTA_SNAPSHOTS:
+    motor_busqueda = MotorConsulta.desde_snapshot(
+        RUTA_SNAPSHOTS,
+        max_postings_cache=MAX_POSTINGS_CACHE,
+        max_resultados_cache=2048,
+        ttl_resultados_cache=300.0,
+        # el diccionario se consulta sobre el .dicm mapeado, compartido entre los workers (ver Servidor.py);
+        # DICCIONARIO_MAPEADO=0 lo arma como dict en cada proceso
+        diccionario_mapeado=os.environ.get("DICCIONARIO_MAPEADO", "1") != "0"
+    )
+else:
+    motor_busqueda = MotorConsulta(
+        ruta_csv=RUTA_ARCHIVO_CSV,
+        ruta_indice=RUTA_INDICE_LOCAL,
+        ruta_normas=RUTA_NORMAS,
+        ruta_stoplist=RUTA_STOPLIST,
+        modo_carga='perezoso',  # solo el diccionario en memoria, postings desde el indice binario
+        usar_impactos=True,  # tf·idf/norma precalculados en indice_impactos.bin
+        max_postings_cache=MAX_POSTINGS_CACHE,
+        max_resultados_cache=2048,  # resultados de las consultas populares
+        ttl_resultados_cache=300.0
+    )
 
-motor_busqueda = MotorConsulta(
-    ruta_csv=RUTA_ARCHIVO_CSV,
-    ruta_indice=RUTA_INDICE_LOCAL,
-    ruta_normas=RUTA_NORMAS,
-    ruta_stoplist=RUTA_STOPLIST
-)
+if PRECARGAR_MODELO_IMAGENES:
+    precargar_en_segundo_plano()
 
 @main.route('/')
 def home():
@@ -180,22 +245,125 @@ def consulta():
     data = request.get_json()
     consulta_usuario = data.get('consulta', '')
     top_k = data.get('top_k', 10)
-    print("Estoy en la consulta")
+    # 'ranking' (con 'pesos_campos' y 'modelo' opcionales), 'frase' (con 'distancia' opcional) o 'booleana'
+    modo = data.get('modo', 'ranking')
+    if modo not in ('ranking', 'frase', 'booleana'):
+        return jsonify({"error": f"modo de consulta desconocido: {modo}"}), 400
     
     try:
-        # Procesar la consulta
-        terminos_procesados = motor_busqueda.procesar_consulta(consulta_usuario)
-        print("Términos procesados:", terminos_procesados)
-
-        # Buscar y recuperar resultados
-        resultados_busqueda = motor_busqueda.buscar(consulta_usuario, top_k=top_k)
-        print(resultados_busqueda)
-        print(f"Top {top_k} Resultados:", json.dumps(resultados_busqueda, indent=2, ensure_ascii=False))
-        return jsonify(resultados_busqueda)
-    except Exception as e:
-        print(f"Error en la consulta: {str(e)}")
+        if modo == 'frase':
+            resultados_busqueda = motor_busqueda.buscar_frase(consulta_usuario, top_k=top_k,
+                                                              distancia=int(data.get('distancia', 0)))
+            return _responder(resultados_busqueda)
+        if modo == 'booleana':
+            # AND / OR / NOT en mayusculas, parentesis y "frases"; entre terminos sin operador va AND
+            try:
+                resultados_busqueda = motor_busqueda.buscar_booleana(consulta_usuario, top_k=top_k)
+            except ValueError as e:
+                return jsonify({"error": f"consulta booleana invalida: {e}"}), 400
+            return _responder(resultados_busqueda)
+
+        if 'pesos_campos' in data or 'modelo' in data:
+            # pesos de campo por consulta, p. ej. {"pesos_campos": {"track_name": 1}, "modelo": "bm25f"}
+            try:
+                resultados_busqueda = motor_busqueda.buscar_campos(consulta_usuario, top_k=top_k,
+                                                                   pesos_campos=data.get('pesos_campos'),
+                                                                   modelo=data.get('modelo', 'coseno'))
+            except ValueError as e:
+                return jsonify({"error": f"consulta por campos invalida: {e}"}), 400
+            return _responder(resultados_busqueda)
+
+        # Procesar la consulta; los terminos que no estan en el indice se buscan con hasta 1 o 2 errores
+        # (por defecto; "difusa": false busca solo los terminos exactos)
+        terminos_procesados = motor_busqueda.procesar_consulta(consulta_usuario, difusa=bool(data.get('difusa', True)))
+
+        # Buscar y recuperar resultados (con los terminos ya procesados, sin analizar de nuevo)
+        resultados_busqueda = motor_busqueda.buscar(consulta_usuario, top_k=top_k,
+                                                    terminos_consulta=terminos_procesados)
+        log.debug("consulta modo=%s top_k=%s terminos=%s resultados=%d", modo, top_k, terminos_procesados,
+                  len(resultados_busqueda))
+        return _responder(resultados_busqueda)
+    except Exception:
+        log.exception("error en la consulta modo=%s", modo)
         return jsonify({"error": "Error interno en el servidor"}), 500
 
+@main.route('/consulta/batch', methods=['POST'])
+def consulta_batch():
+    # {"consultas": ["texto", {"consulta": "texto", "top_k": 5}, ...], "top_k": 10}
+    # responde {"resultados": [...]} en el mismo orden que las consultas
+    data = request.get_json(silent=True) or {}
+    consultas = data.get('consultas')
+    top_k_comun = data.get('top_k', 10)
+    if not isinstance(consultas, list) or not consultas:
+        return jsonify({"error": "se espera una lista no vacia en 'consultas'"}), 400
+    if len(consultas) > MAX_CONSULTAS_LOTE:
+        return jsonify({"error": f"maximo {MAX_CONSULTAS_LOTE} consultas por lote"}), 400
+
+    textos, tops = [], []
+    for consulta in consultas:
+        if isinstance(consulta, dict):
+            textos.append(str(consulta.get('consulta', '')))
+            tops.append(consulta.get('top_k', top_k_comun))
+        else:
+            textos.append(str(consulta))
+            tops.append(top_k_comun)
+    if not all(isinstance(top, int) and top > 0 for top in tops):
+        return jsonify({"error": "top_k debe ser un entero positivo"}), 400
+
+    try:
+        inicio = time.perf_counter()
+        resultados = motor_busqueda.buscar_lote(textos, top_k=tops)
+        log.debug("lote consultas=%d segundos=%.3f", len(textos), time.perf_counter() - inicio)
+        return _responder({"resultados": resultados})
+    except Exception:
+        log.exception("error en la consulta por lote consultas=%d", len(textos))
+        return jsonify({"error": "Error interno en el servidor"}), 500
+
+@main.route('/consulta/cache', methods=['GET'])
+def consulta_cache():
+    # aciertos/fallos de la cache de postings del motor
+    return jsonify(motor_busqueda.estadisticas_cache())
+
+@main.route('/consulta/cache/resultados', methods=['GET'])
+def consulta_cache_resultados():
+    # aciertos, desalojos y vencimientos de la cache de resultados
+    return jsonify(motor_busqueda.estadisticas_cache_resultados())
+
+@main.route('/suggest', methods=['GET'])
+def sugerir():
+    # autocompletar mientras se escribe: /suggest?q=bad%20gu&k=5 -> terminos, titulos y artistas con su peso;
+    # sale de sugerencias.npz en memoria, sin leer postings
+    prefijo = request.args.get('q', '')
+    try:
+        cantidad = min(max(int(request.args.get('k', MAX_SUGERENCIAS)), 0), MAX_SUGERENCIAS_PETICION)
+    except ValueError:
+        return jsonify({"error": "k tiene que ser un entero"}), 400
+    return jsonify({"consulta": prefijo, **motor_busqueda.sugerir(prefijo, cantidad)})
+
+@main.route('/metrics', methods=['GET'])
+def metrics():
+    # histogramas de latencia por etapa y por ruta en formato prometheus (del proceso que atiende, ver Metricas.py)
+    if not metricas.activas:
+        return jsonify({"error": "metricas desactivadas (METRICAS=0)"}), 404
+    return Response(metricas.exportar(), mimetype='text/plain; version=0.0.4')
+
+@main.route('/metrics/resumen', methods=['GET'])
+def metrics_resumen():
+    # lo mismo en json con media, p50 y p99 en ms, para mirarlo sin prometheus
+    return jsonify(metricas.resumen())
+
+@main.route('/listo', methods=['GET'])
+def listo():
+    # el motor de texto se construye al importar este modulo, asi que si responde ya puede buscar texto;
+    # el modelo de imagenes puede estar 'sin cargar', 'cargando', 'listo' o con 'error'
+    return jsonify({"consulta": "listo", "version_snapshot": motor_busqueda.version_snapshot,
+                    "modelo_imagenes": estado_modelo()})
+
+@main.route('/listo/imagenes', methods=['GET'])
+def listo_imagenes():
+    # 503 mientras el modelo no este cargado: para no mandar busquedas por imagen a un worker que todavia carga
+    return jsonify(estado_modelo()), (200 if modelo_listo() else 503)
+
 @main.route('/knn/priority', methods=['POST'])
 def knn_priority():
     try:
@@ -219,18 +387,21 @@ def knn_priority():
         query_vector = obtener_vector_desde_imagen(image_path)
         if query_vector is None:
             os.remove(image_path)
+            if estado_modelo()["estado"] == "error":
+                # no es la imagen: el modelo no se pudo cargar (p.ej. sin tensorflow en este despliegue)
+                return jsonify({"error": "El modelo de imágenes no está disponible."}), 503
             return jsonify({"error": "No se pudo procesar la imagen. Verifica que sea válida."}), 400
 
         # Realizar la búsqueda KNN
         k = int(request.form.get('k', 8))  # Número de vecinos por defecto: 8
-        results = knn.save_priority_neighbors_to_json(query_vector, k)
+        results = obtener_knn().save_priority_neighbors_to_json(query_vector, k)
 
         # Eliminar la imagen después de procesarla
         os.remove(image_path)
 
-        return jsonify(results)
-    except Exception as e:
-        print(f"Error procesando la solicitud: {str(e)}")
+        return _responder(results, "imagen")
+    except Exception:
+        log.exception("error procesando la busqueda por imagen")
         return jsonify({"error": "Error interno en el servidor. Revisa los logs para más detalles."}), 500
 
 
@@ -259,11 +430,9 @@ def consulta_postgres():
     try:
         db = PostgresConnector()  # Crear una instancia de PostgresConnector
         resultados = db.search2(consulta_usuario, top_k)  # Usar el método de búsqueda
-        print(resultados)
-        print("..................")
         return jsonify(resultados['results'])  # Devolver resultados
-    except Exception as e:
-        print(f"Error en la consulta a PostgreSQL: {str(e)}")
+    except Exception:
+        log.exception("error en la consulta a PostgreSQL")
         return jsonify({"error": "Error interno en la consulta a la base de datos."}), 500
 
 
@@ -27,6 +27,37 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
+    // Autocompletar: mientras se escribe se piden sugerencias a /suggest (titulos y artistas)
+    const searchQuery = document.getElementById('searchQuery');
+    const listaSugerencias = document.getElementById('sugerencias');
+    let temporizadorSugerencias = null;
+
+    searchQuery.addEventListener('input', function() {
+        clearTimeout(temporizadorSugerencias);
+        const prefijo = searchQuery.value;
+        if (prefijo.trim() === '') {
+            listaSugerencias.innerHTML = '';
+            return;
+        }
+        temporizadorSugerencias = setTimeout(function() {
+            fetch('/suggest?k=8&q=' + encodeURIComponent(prefijo))
+                .then(response => response.json())
+                .then(data => {
+                    if (searchQuery.value !== prefijo) {
+                        return; // llego tarde, ya se escribio otra cosa
+                    }
+                    listaSugerencias.innerHTML = '';
+                    const textos = new Set([...(data.titulos || []), ...(data.artistas || [])].map(s => s.texto));
+                    textos.forEach(texto => {
+                        const opcion = document.createElement('option');
+                        opcion.value = texto;
+                        listaSugerencias.appendChild(opcion);
+                    });
+                })
+                .catch(error => console.error('Error al pedir sugerencias:', error));
+        }, 80);
+    });
+
     searchForm.addEventListener('submit', function(event) {
         event.preventDefault(); // Evitar el envío tradicional del formulario
 
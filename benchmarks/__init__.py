@@ -0,0 +1,3 @@
+# benchmarks del indice y del motor de consulta; cada modulo se corre con python -m benchmarks.<modulo>.
+# bench_*.py miden una cosa puntual. suite.py es la corrida completa y reproducible (corpus.py genera el csv,
+# carga.py las consultas) que escribe un json; comparar.py compara dos de esos json
@@ -0,0 +1,67 @@
+import sys
+import time
+import random
+
+import nltk
+import pandas as pd
+from nltk.stem import SnowballStemmer
+
+from app.Analizador import Analizador
+
+# tokens por segundo del analisis de texto: el camino anterior (nltk.word_tokenize + SnowballStemmer sin cache)
+# contra el Analizador en modo 'nltk' (solo cache de stems) y en modo 'regex' (camino rapido + cache)
+# uso: python -m benchmarks.bench_analizador [archivo.csv] [columna]
+# sin argumentos genera letras sinteticas
+
+PALABRAS = ["amor", "corazón", "noche", "baby", "love", "quiero", "bailar", "contigo", "vida", "fuego", "luna",
+            "don't", "i'm", "you're", "gonna", "wanna", "can't", "'cause", "oh", "yeah", "siempre", "nunca",
+            "tu", "mi", "sueño", "dance", "night", "feel", "alive", "mañana", "cielo", "mar", "llorar"]
+
+
+def generar_letras(numero_textos: int = 3000, semilla: int = 7):
+    aleatorio = random.Random(semilla)
+    textos = []
+    for _ in range(numero_textos):
+        versos = []
+        for _ in range(aleatorio.randint(4, 20)):
+            verso = " ".join(aleatorio.choice(PALABRAS) for _ in range(aleatorio.randint(3, 9)))
+            versos.append(verso + aleatorio.choice(["", ",", "?", "!", "", ""]))
+        textos.append(" ".join(versos) + aleatorio.choice(["", "", "."]))
+    return textos
+
+
+def analizar_como_antes(textos, stopwords):
+    stemmer = SnowballStemmer('spanish')
+    terminos = []
+    for texto in textos:
+        tokens = nltk.word_tokenize(texto.lower())
+        tokens = [token.strip() for token in tokens]
+        terminos.extend(stemmer.stem(token) for token in tokens if token not in stopwords)
+    return terminos
+
+
+def medir(textos):
+    stopwords = set("'«[]¿?$+-*'.,»:;!,º«»()@¡“/#|*%'&`")
+    numero_tokens = sum(len(nltk.word_tokenize(texto.lower())) for texto in textos)
+    print(f"textos: {len(textos)}, tokens: {numero_tokens}")
+
+    inicio = time.perf_counter()
+    esperado = analizar_como_antes(textos, stopwords)
+    duracion = time.perf_counter() - inicio
+    print(f"antes (word_tokenize + stem):  {numero_tokens / duracion:12.0f} tokens/s")
+
+    for modo in ('nltk', 'regex'):
+        analizador = Analizador(stopwords, modo_tokenizador=modo)
+        inicio = time.perf_counter()
+        obtenido = [termino for texto in textos for termino in analizador.analizar(texto)]
+        duracion = time.perf_counter() - inicio
+        assert obtenido == esperado, f"el modo {modo} no coincide con nltk"
+        print(f"analizador modo {modo:5}:        {numero_tokens / duracion:12.0f} tokens/s  {analizador.estadisticas()}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        columna = sys.argv[2] if len(sys.argv) > 2 else "lyrics"
+        medir([str(texto) for texto in pd.read_csv(sys.argv[1], encoding='utf-8')[columna]])
+    else:
+        medir(generar_letras())
@@ -0,0 +1,83 @@
+import os
+import io
+import sys
+import json
+import argparse
+import tempfile
+import contextlib
+import subprocess
+
+from app.Final2 import IndiceInvertido
+from app.Snapshot import publicar_snapshot
+from benchmarks.bench_construccion import generar_csv, PESOS_CAMPOS
+
+# tiempo hasta que el motor de consulta puede responder, cada medicion en un proceso nuevo (como un
+# deploy o un reinicio): importar app.Final2, construir MotorConsulta y la primera consulta.
+# compara el indice cargado en memoria, el modo perezoso sobre el directorio del indice y el snapshot
+# uso: python -m benchmarks.bench_arranque [--filas 100000] [--repeticiones 3]
+
+_PROCESO = """
+import io, sys, json, time, contextlib
+inicio = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    from app.Final2 import MotorConsulta
+    importado = time.perf_counter()
+    modo, ruta_csv, ruta_indice = sys.argv[1:4]
+    if modo == 'snapshot':
+        motor = MotorConsulta.desde_snapshot(ruta_indice)
+    else:
+        motor = MotorConsulta(ruta_csv, ruta_indice, ruta_indice + '/normas.npy', ruta_indice + '/stoplist.csv',
+                              modo_carga=modo, usar_impactos=modo == 'perezoso')
+    listo = time.perf_counter()
+    motor.buscar("love night amor", 10)
+    consulta = time.perf_counter()
+print(json.dumps({"importar": importado - inicio, "motor": listo - importado, "primera consulta": consulta - listo,
+                  "total": consulta - inicio}))
+"""
+
+
+def construir_indice(filas: int):
+    directorio = tempfile.mkdtemp(prefix="indice_arranque_")
+    ruta_csv = os.path.join(directorio, "spotify_songs_filtrado.csv")
+    print(f"generando {filas} filas sinteticas e indexando en {directorio}")
+    generar_csv(ruta_csv, filas)
+    with open(os.path.join(directorio, "pesos_campos.json"), 'w', encoding='utf-8') as archivo:
+        json.dump(PESOS_CAMPOS, archivo)
+    with open(os.path.join(directorio, "stoplist.csv"), 'w', encoding='utf-8') as archivo:
+        archivo.write("\n".join(["the", "i", "you", "a", "de", "la", "el", "y"]))
+    with contextlib.redirect_stdout(io.StringIO()):
+        IndiceInvertido(ruta_csv, os.path.join(directorio, "stoplist.csv"), directorio,
+                        os.path.join(directorio, "normas.npy"), os.path.join(directorio, "pesos_campos.json"),
+                        workers=os.cpu_count() or 1).construir_indice()
+    return ruta_csv, directorio
+
+
+def medir_proceso(modo: str, ruta_csv: str, ruta: str):
+    salida = subprocess.run([sys.executable, "-c", _PROCESO, modo, ruta_csv, ruta], capture_output=True,
+                            text=True, check=True)
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def medir(ruta_csv: str, ruta_indice: str, ruta_snapshots: str, repeticiones: int = 3):
+    print(f"segundos, mejor de {repeticiones} procesos")
+    print(f"{'':10} {'importar':>10} {'motor':>10} {'1a consulta':>12} {'total':>10}")
+    for modo, ruta in (("memoria", ruta_indice), ("perezoso", ruta_indice), ("snapshot", ruta_snapshots)):
+        tiempos = min((medir_proceso(modo, ruta_csv, ruta) for _ in range(repeticiones)), key=lambda t: t["total"])
+        print(f"{modo:10} {tiempos['importar']:10.3f} {tiempos['motor']:10.3f} {tiempos['primera consulta']:12.3f} "
+              f"{tiempos['total']:10.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark del arranque del motor de consulta")
+    parser.add_argument("--filas", type=int, default=100000)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--indice", help="directorio de un indice ya construido (con stoplist.csv)")
+    parser.add_argument("--csv", help="csv del indice indicado con --indice")
+    argumentos = parser.parse_args()
+    if argumentos.indice:
+        ruta_csv, ruta_indice = argumentos.csv, argumentos.indice
+    else:
+        ruta_csv, ruta_indice = construir_indice(argumentos.filas)
+    ruta_snapshots = tempfile.mkdtemp(prefix="snapshots_")
+    publicar_snapshot(ruta_indice, ruta_snapshots)
+    medir(ruta_csv, ruta_indice, ruta_snapshots, argumentos.repeticiones)
@@ -0,0 +1,66 @@
+import os
+import io
+import csv
+import time
+import random
+import argparse
+import contextlib
+
+from app.Final2 import MotorConsulta
+from benchmarks.bench_matriz import construir_indice
+
+# consultas conjuntivas tipo artista + titulo: el modo booleano (AND sobre listas de ids ordenadas,
+# solo se puntuan los documentos que quedan) contra lo que habia que hacer antes, puntuar todos los
+# documentos con algun termino y despues quedarse con los que tienen todos
+# uso: python -m benchmarks.bench_booleana [--filas 20000] [--consultas 500]
+
+
+def generar_consultas(ruta_csv: str, numero: int, semilla: int = 9):
+    aleatorio = random.Random(semilla)
+    with open(ruta_csv, 'r', encoding='utf-8') as archivo:
+        filas = [(fila["track_name"], fila["track_artist"]) for fila in csv.DictReader(archivo)]
+    consultas = []
+    for _ in range(numero):
+        titulo, artista = aleatorio.choice(filas)
+        palabras = titulo.split()[:2] + artista.split()[:1]
+        consultas.append(" AND ".join(palabras))
+    return consultas
+
+
+def puntuar_y_filtrar(motor: MotorConsulta, consulta: str, top_k: int):
+    texto = consulta.replace(" AND ", " ")
+    terminos = motor.procesar_consulta(texto)
+    listas = [motor._obtener_postings(termino) or {} for termino in terminos]
+    ranking = motor.rankear(texto, motor.numero_documentos or 10 ** 9, terminos)
+    return [item for item in ranking if all(item[0] in postings for postings in listas)][:top_k]
+
+
+def medir(ruta_csv: str, ruta_indice: str, consultas, top_k: int = 10):
+    with contextlib.redirect_stdout(io.StringIO()):
+        motor = MotorConsulta(ruta_csv, ruta_indice, os.path.join(ruta_indice, "normas.npy"),
+                              os.path.join(ruta_indice, "stoplist.csv"), modo_carga='perezoso')
+        resultados, tiempos = {}, {}
+        for nombre, funcion in (("puntuar y filtrar", lambda: [puntuar_y_filtrar(motor, c, top_k) for c in consultas]),
+                                ("booleana", lambda: [motor.rankear_booleana(c, top_k) for c in consultas])):
+            inicio = time.perf_counter()
+            resultados[nombre] = funcion()
+            tiempos[nombre] = time.perf_counter() - inicio
+    distintos = sum(a != b for a, b in zip(resultados["puntuar y filtrar"], resultados["booleana"]))
+    print(f"consultas: {len(consultas)}, top_k: {top_k}, rankings distintos: {distintos}")
+    for nombre, duracion in tiempos.items():
+        print(f"{nombre:18}: {duracion * 1000 / len(consultas):8.3f} ms/consulta")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark de las consultas booleanas")
+    parser.add_argument("--filas", type=int, default=20000)
+    parser.add_argument("--consultas", type=int, default=500)
+    parser.add_argument("--top_k", type=int, default=10)
+    parser.add_argument("--indice", help="directorio de un indice ya construido (con stoplist.csv)")
+    parser.add_argument("--csv", help="csv del indice indicado con --indice")
+    argumentos = parser.parse_args()
+    if argumentos.indice:
+        ruta_csv, ruta_indice = argumentos.csv, argumentos.indice
+    else:
+        ruta_csv, ruta_indice = construir_indice(argumentos.filas)
+    medir(ruta_csv, ruta_indice, generar_consultas(ruta_csv, argumentos.consultas), argumentos.top_k)
@@ -0,0 +1,87 @@
+import os
+import io
+import json
+import time
+import argparse
+import tempfile
+import contextlib
+
+from app.Final2 import IndiceInvertido, MotorConsulta
+from benchmarks.bench_construccion import generar_csv, PESOS_CAMPOS
+from benchmarks.bench_frases import generar_frases
+
+# cuanto cuesta probar otros pesos de campo: antes habia que reconstruir el indice con otro pesos_campos.json;
+# con el indice por campos los pesos se pasan en la consulta con bm25f, sin costo extra (coseno solo acepta los
+# de la construccion y paga una pasada para las normas en la primera consulta)
+# uso: python -m benchmarks.bench_campos [--filas 20000] [--consultas 500]
+
+PESOS_SOLO_TITULO = {"track_name": 1.0}
+PESOS_NUEVOS = {"track_name": 0.5, "track_artist": 0.3, "lyrics": 0.1, "playlist_name": 0.1}
+
+
+def construir_indice(filas: int):
+    directorio = tempfile.mkdtemp(prefix="indice_campos_")
+    ruta_csv = os.path.join(directorio, "spotify_songs_filtrado.csv")
+    print(f"generando {filas} filas sinteticas e indexando en {directorio} (con indice por campos)")
+    generar_csv(ruta_csv, filas)
+    with open(os.path.join(directorio, "stoplist.csv"), 'w', encoding='utf-8') as archivo:
+        archivo.write("\n".join(["the", "i", "you", "a", "de", "la", "el", "y"]))
+    duracion = construir(ruta_csv, directorio, PESOS_CAMPOS, por_campos=True)
+    print(f"construccion con indice por campos: {duracion:.1f} s")
+    return ruta_csv, directorio
+
+
+def construir(ruta_csv: str, directorio: str, pesos_campos, por_campos: bool = False) -> float:
+    with open(os.path.join(directorio, "pesos_campos.json"), 'w', encoding='utf-8') as archivo:
+        json.dump(pesos_campos, archivo)
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        IndiceInvertido(ruta_csv, os.path.join(directorio, "stoplist.csv"), directorio,
+                        os.path.join(directorio, "normas.npy"), os.path.join(directorio, "pesos_campos.json"),
+                        workers=os.cpu_count() or 1, por_campos=por_campos).construir_indice()
+    return time.perf_counter() - inicio
+
+
+def medir(ruta_csv: str, ruta_indice: str, consultas, top_k: int = 10):
+    with contextlib.redirect_stdout(io.StringIO()):
+        motor = MotorConsulta(ruta_csv, ruta_indice, os.path.join(ruta_indice, "normas.npy"),
+                              os.path.join(ruta_indice, "stoplist.csv"), modo_carga='perezoso')
+        if motor.campos is None:
+            raise SystemExit(f"{ruta_indice} no tiene indice por campos")
+        pruebas = (("rankear (pesos de la construccion)", lambda c: motor.rankear(c, top_k)),
+                   ("coseno, pesos de la construccion", lambda c: motor.rankear_campos(c, top_k)),
+                   ("bm25f, pesos nuevos", lambda c: motor.rankear_campos(c, top_k, PESOS_NUEVOS, 'bm25f')),
+                   ("bm25f, solo titulo", lambda c: motor.rankear_campos(c, top_k, PESOS_SOLO_TITULO, 'bm25f')))
+        tiempos = {}
+        for nombre, funcion in pruebas:
+            inicio = time.perf_counter()
+            funcion(consultas[0])  # la primera consulta paga la apertura del campo y, en coseno, las normas
+            primera = time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            for consulta in consultas[1:]:
+                funcion(consulta)
+            tiempos[nombre] = (primera, (time.perf_counter() - inicio) / max(len(consultas) - 1, 1))
+    print(f"consultas: {len(consultas)}, top_k: {top_k}")
+    for nombre, (primera, duracion) in tiempos.items():
+        print(f"{nombre:36}: primera {primera * 1000:9.3f} ms, resto {duracion * 1000:8.3f} ms/consulta")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark de los pesos de campo en consulta")
+    parser.add_argument("--filas", type=int, default=20000)
+    parser.add_argument("--consultas", type=int, default=500)
+    parser.add_argument("--top_k", type=int, default=10)
+    parser.add_argument("--indice", help="directorio de un indice ya construido con campos (con stoplist.csv)")
+    parser.add_argument("--csv", help="csv del indice indicado con --indice")
+    argumentos = parser.parse_args()
+    if argumentos.indice:
+        ruta_csv, ruta_indice = argumentos.csv, argumentos.indice
+    else:
+        ruta_csv, ruta_indice = construir_indice(argumentos.filas)
+        # lo que costaba antes cada cambio de pesos: reconstruir el indice entero
+        otro = tempfile.mkdtemp(prefix="indice_pesos_")
+        with open(os.path.join(otro, "stoplist.csv"), 'w', encoding='utf-8') as archivo:
+            archivo.write("\n".join(["the", "i", "you", "a", "de", "la", "el", "y"]))
+        print(f"reconstruccion con otros pesos (sin indice por campos): "
+              f"{construir(ruta_csv, otro, [0.0, 0.5, 0.3, 0.1, 0.1]):.1f} s")
+    medir(ruta_csv, ruta_indice, generar_frases(ruta_csv, argumentos.consultas), argumentos.top_k)
@@ -0,0 +1,109 @@
+import os
+import csv
+import json
+import math
+import time
+import random
+import argparse
+import tempfile
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from app.Analizador import Analizador
+from app.Final2 import IndiceInvertido, indexar_chunk, TAMANIO_CHUNK
+
+# tiempo de construccion del indice sobre un spotify_songs_filtrado.csv sintetico
+# compara el recorrido anterior fila por fila (iterrows) con indexar_chunk por columnas y luego mide
+# la construccion completa (parciales + fusion + impactos)
+# uso: python -m benchmarks.bench_construccion [--filas 100000] [--workers N]
+
+COLUMNAS = ["track_id", "track_name", "track_artist", "lyrics", "playlist_name"]
+PESOS_CAMPOS = [0.0, 0.25, 0.2, 0.35, 0.2]
+PALABRAS = ["amor", "corazón", "noche", "baby", "love", "quiero", "bailar", "contigo", "vida", "fuego", "luna",
+            "don't", "i'm", "you're", "gonna", "can't", "oh", "yeah", "siempre", "nunca", "sueño", "dance",
+            "night", "feel", "alive", "mañana", "cielo", "mar", "llorar", "tiempo", "beso", "alma", "camino"]
+
+
+def generar_csv(ruta: str, filas: int, semilla: int = 11):
+    aleatorio = random.Random(semilla)
+    vocabulario = PALABRAS + [f"palabra{i}" for i in range(20000)]
+
+    def palabra():
+        return vocabulario[min(int(aleatorio.paretovariate(0.9)) - 1, len(vocabulario) - 1)]
+
+    artistas = [" ".join(palabra() for _ in range(aleatorio.randint(1, 3))).title() for _ in range(5000)]
+    playlists = [" ".join(palabra() for _ in range(aleatorio.randint(1, 4))) for _ in range(500)]
+    with open(ruta, 'w', newline='', encoding='utf-8') as archivo:
+        escritor = csv.writer(archivo)
+        escritor.writerow(COLUMNAS)
+        for numero in range(filas):
+            versos = [" ".join(palabra() for _ in range(aleatorio.randint(3, 9))) + aleatorio.choice(["", ",", "?", "!"])
+                      for _ in range(aleatorio.randint(4, 14))]
+            escritor.writerow([f"{numero:022x}", " ".join(palabra() for _ in range(aleatorio.randint(1, 5))).title(),
+                               aleatorio.choice(artistas), " ".join(versos), aleatorio.choice(playlists)])
+
+
+def indexar_chunk_por_filas(chunk, pesos_campos, analizador):
+    """el recorrido anterior con iterrows, como referencia"""
+    indice_invertido = defaultdict(dict)
+    normas_documentos = []
+    for indice, fila in chunk.iterrows():
+        id_documento = int(indice)
+        normas_documentos.append(0)
+        frecuencia_terminos = defaultdict(float)
+        for idx_campo, campo in enumerate(fila):
+            if idx_campo >= len(pesos_campos) or pesos_campos[idx_campo] == 0:
+                continue
+            for lematizado in analizador.analizar(str(campo)):
+                frecuencia_terminos[lematizado] += pesos_campos[idx_campo]
+        for termino, frecuencia in frecuencia_terminos.items():
+            indice_invertido[termino][id_documento] = math.log10(1 + frecuencia)
+            normas_documentos[-1] += indice_invertido[termino][id_documento] ** 2
+    return indice_invertido, np.array(normas_documentos, dtype=np.float64)
+
+
+def medir(ruta_csv: str, workers: int):
+    filas = 0
+    tiempos = {"por filas": 0.0, "por columnas": 0.0}
+    for chunk in pd.read_csv(ruta_csv, chunksize=TAMANIO_CHUNK, encoding='utf-8'):
+        filas += len(chunk)
+        resultados = {}
+        for nombre, funcion in (("por filas", indexar_chunk_por_filas), ("por columnas", indexar_chunk)):
+            analizador = Analizador()  # cache de stems vacia en cada medicion
+            inicio = time.perf_counter()
+            resultados[nombre] = funcion(chunk, PESOS_CAMPOS, analizador)
+            tiempos[nombre] += time.perf_counter() - inicio
+        assert resultados["por filas"][0] == resultados["por columnas"][0]
+        assert np.array_equal(resultados["por filas"][1], resultados["por columnas"][1])
+    for nombre, duracion in tiempos.items():
+        print(f"indexar chunks {nombre:12}: {duracion:7.1f} s ({filas / duracion:8.0f} filas/s)")
+
+    directorio = tempfile.mkdtemp(prefix="indice_bench_")
+    ruta_pesos = os.path.join(directorio, "pesos_campos.json")
+    ruta_stoplist = os.path.join(directorio, "stoplist.csv")
+    with open(ruta_pesos, 'w', encoding='utf-8') as archivo:
+        json.dump(PESOS_CAMPOS, archivo)
+    with open(ruta_stoplist, 'w', encoding='utf-8') as archivo:
+        archivo.write("\n".join(["the", "i", "you", "a", "de", "la", "el", "y"]))
+    indice = IndiceInvertido(ruta_csv, ruta_stoplist, directorio, os.path.join(directorio, "normas.npy"),
+                             ruta_pesos, workers=workers)
+    inicio = time.perf_counter()
+    indice.construir_indice()
+    duracion = time.perf_counter() - inicio
+    print(f"construccion completa:        {duracion:7.1f} s ({filas / duracion:8.0f} filas/s, {workers} workers)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark de construccion del indice invertido")
+    parser.add_argument("--filas", type=int, default=100000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--csv", help="usar un csv existente en lugar de generar uno")
+    argumentos = parser.parse_args()
+    ruta_csv = argumentos.csv
+    if ruta_csv is None:
+        ruta_csv = os.path.join(tempfile.mkdtemp(prefix="spotify_sintetico_"), "spotify_songs_filtrado.csv")
+        print(f"generando {argumentos.filas} filas sinteticas en {ruta_csv}")
+        generar_csv(ruta_csv, argumentos.filas)
+    medir(ruta_csv, argumentos.workers)
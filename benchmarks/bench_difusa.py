@@ -0,0 +1,63 @@
+import time
+import random
+import argparse
+
+from app.Trigramas import IndiceTrigramas, distancia_maxima, distancia_edicion
+
+# costo de la expansion difusa: terminos del vocabulario con 1 o 2 errores de tipeo (cambio, insercion o
+# borrado de una letra) buscados en el indice de trigramas, contra comparar con todo el vocabulario
+# uso: python -m benchmarks.bench_difusa [--terminos 200000] [--consultas 1000]
+
+LETRAS = "abcdefghijklmnopqrstuvwxyzñ"
+
+
+def generar_vocabulario(numero: int, semilla: int = 7):
+    azar = random.Random(semilla)
+    vocabulario = set()
+    while len(vocabulario) < numero:
+        vocabulario.add("".join(azar.choices(LETRAS, k=azar.randint(3, 14))))
+    return sorted(vocabulario)
+
+
+def con_errores(termino: str, azar: random.Random) -> str:
+    letras = list(termino)
+    for _ in range(azar.randint(1, 2)):
+        posicion = azar.randrange(len(letras) + 1)
+        operacion = azar.random()
+        if operacion < 1 / 3 and posicion < len(letras):
+            letras[posicion] = azar.choice(LETRAS)
+        elif operacion < 2 / 3 or not letras:
+            letras.insert(posicion, azar.choice(LETRAS))
+        elif posicion < len(letras):
+            del letras[posicion]
+    return "".join(letras)
+
+
+def medir(numero_terminos: int, numero_consultas: int, comparar_todo: int = 20):
+    vocabulario = generar_vocabulario(numero_terminos)
+    inicio = time.perf_counter()
+    indice = IndiceTrigramas(vocabulario)
+    print(f"{len(indice)} terminos, {len(indice.listas)} trigramas, armado en {time.perf_counter() - inicio:.2f} s")
+    azar = random.Random(1)
+    consultas = [con_errores(azar.choice(vocabulario), azar) for _ in range(numero_consultas)]
+    inicio = time.perf_counter()
+    encontrados = sum(len(indice.buscar(consulta)) for consulta in consultas)
+    duracion = time.perf_counter() - inicio
+    candidatos = sum(len(indice.candidatos(consulta, distancia_maxima(consulta)))
+                     for consulta in consultas if distancia_maxima(consulta))
+    print(f"trigramas: {duracion / numero_consultas * 1000:.3f} ms/termino, "
+          f"{candidatos / numero_consultas:.1f} candidatos y {encontrados / numero_consultas:.1f} parecidos por termino")
+    # lo mismo comparando con todo el vocabulario (solo unas pocas consultas, tarda)
+    inicio = time.perf_counter()
+    for consulta in consultas[:comparar_todo]:
+        maximo = distancia_maxima(consulta)
+        [termino for termino in vocabulario if maximo and distancia_edicion(consulta, termino, maximo) <= maximo]
+    print(f"todo el vocabulario: {(time.perf_counter() - inicio) / comparar_todo * 1000:.1f} ms/termino")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark de la expansion difusa por trigramas")
+    parser.add_argument("--terminos", type=int, default=200000)
+    parser.add_argument("--consultas", type=int, default=1000)
+    argumentos = parser.parse_args()
+    medir(argumentos.terminos, argumentos.consultas)
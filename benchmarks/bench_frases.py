@@ -0,0 +1,97 @@
+import os
+import io
+import csv
+import json
+import time
+import random
+import argparse
+import tempfile
+import contextlib
+
+from app.Final2 import IndiceInvertido, MotorConsulta
+from benchmarks.bench_construccion import generar_csv, PESOS_CAMPOS
+
+# latencia de las consultas por frase con el indice posicional contra la consulta por bolsa de palabras
+# y contra filtrar despues el ranking completo volviendo a analizar cada documento (sin posiciones)
+# las frases se sacan de las letras del csv, asi que todas tienen al menos un documento
+# uso: python -m benchmarks.bench_frases [--filas 20000] [--consultas 500]
+
+
+def construir_indice(filas: int):
+    directorio = tempfile.mkdtemp(prefix="indice_frases_")
+    ruta_csv = os.path.join(directorio, "spotify_songs_filtrado.csv")
+    print(f"generando {filas} filas sinteticas e indexando en {directorio} (con posiciones)")
+    generar_csv(ruta_csv, filas)
+    with open(os.path.join(directorio, "pesos_campos.json"), 'w', encoding='utf-8') as archivo:
+        json.dump(PESOS_CAMPOS, archivo)
+    with open(os.path.join(directorio, "stoplist.csv"), 'w', encoding='utf-8') as archivo:
+        archivo.write("\n".join(["the", "i", "you", "a", "de", "la", "el", "y"]))
+    with contextlib.redirect_stdout(io.StringIO()):
+        IndiceInvertido(ruta_csv, os.path.join(directorio, "stoplist.csv"), directorio,
+                        os.path.join(directorio, "normas.npy"), os.path.join(directorio, "pesos_campos.json"),
+                        workers=os.cpu_count() or 1, posicional=True).construir_indice()
+    return ruta_csv, directorio
+
+
+def generar_frases(ruta_csv: str, numero: int, semilla: int = 5):
+    aleatorio = random.Random(semilla)
+    with open(ruta_csv, 'r', encoding='utf-8') as archivo:
+        letras = [fila["lyrics"].split() for fila in csv.DictReader(archivo)]
+    frases = []
+    while len(frases) < numero:
+        palabras = aleatorio.choice(letras)
+        longitud = aleatorio.randint(2, 4)
+        if len(palabras) > longitud:
+            inicio = aleatorio.randrange(len(palabras) - longitud)
+            frases.append(" ".join(palabras[inicio:inicio + longitud]))
+    return frases
+
+
+def filtrar_despues(motor: MotorConsulta, frase: str, top_k: int):
+    """ranking de todo el corpus y luego se analiza cada documento hasta juntar top_k con la frase"""
+    terminos = motor.analizador.analizar(frase)
+    encontrados = []
+    for id_documento, similitud in motor.rankear(frase, motor.numero_documentos or 10 ** 9):
+        documento = motor._cargar_documentos([id_documento]).get(id_documento, {})
+        for texto in documento.values():
+            analizado = motor.analizador.analizar(str(texto))
+            if any(analizado[i:i + len(terminos)] == terminos for i in range(len(analizado) - len(terminos) + 1)):
+                encontrados.append((id_documento, similitud))
+                break
+        if len(encontrados) >= top_k:
+            break
+    return encontrados
+
+
+def medir(ruta_csv: str, ruta_indice: str, frases, top_k: int = 10):
+    with contextlib.redirect_stdout(io.StringIO()):
+        motor = MotorConsulta(ruta_csv, ruta_indice, os.path.join(ruta_indice, "normas.npy"),
+                              os.path.join(ruta_indice, "stoplist.csv"), modo_carga='perezoso')
+        if motor.posiciones is None:
+            raise SystemExit(f"{ruta_indice} no tiene indice posicional")
+        tiempos = {}
+        for nombre, funcion in (("bolsa de palabras", lambda: [motor.rankear(f, top_k) for f in frases]),
+                                ("frase", lambda: [motor.rankear_frase(f, top_k) for f in frases]),
+                                ("filtrar despues", lambda: [filtrar_despues(motor, f, top_k) for f in frases[:50]])):
+            inicio = time.perf_counter()
+            numero = len(funcion())
+            tiempos[nombre] = (time.perf_counter() - inicio) / numero
+        vacias = sum(not motor.rankear_frase(f, top_k) for f in frases)
+    print(f"frases: {len(frases)}, top_k: {top_k}, frases sin resultados: {vacias}")
+    for nombre, duracion in tiempos.items():
+        print(f"{nombre:18}: {duracion * 1000:8.3f} ms/consulta")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark de las consultas por frase")
+    parser.add_argument("--filas", type=int, default=20000)
+    parser.add_argument("--consultas", type=int, default=500)
+    parser.add_argument("--top_k", type=int, default=10)
+    parser.add_argument("--indice", help="directorio de un indice ya construido con posiciones (con stoplist.csv)")
+    parser.add_argument("--csv", help="csv del indice indicado con --indice")
+    argumentos = parser.parse_args()
+    if argumentos.indice:
+        ruta_csv, ruta_indice = argumentos.csv, argumentos.indice
+    else:
+        ruta_csv, ruta_indice = construir_indice(argumentos.filas)
+    medir(ruta_csv, ruta_indice, generar_frases(ruta_csv, argumentos.consultas), argumentos.top_k)
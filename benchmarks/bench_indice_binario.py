@@ -0,0 +1,79 @@
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+
+from app.IndiceBinario import convertir_json_a_binario, LectorIndiceBinario
+
+# compara tamaño en disco y tiempo de carga de los indice_parcial_N.json contra su version binaria
+# uso: python -m benchmarks.bench_indice_binario [directorio con indice_parcial_N.json]
+# sin argumentos genera parciales sinteticos en un directorio temporal
+
+
+def generar_parciales_sinteticos(directorio: str, numero_parciales: int = 4, documentos_por_parcial: int = 20000,
+                                 vocabulario: int = 30000, terminos_por_documento: int = 60):
+    aleatorio = random.Random(42)
+    terminos = [f"term{i}" for i in range(vocabulario)]
+    for numero in range(1, numero_parciales + 1):
+        indice = {}
+        inicio = (numero - 1) * documentos_por_parcial
+        for id_documento in range(inicio, inicio + documentos_por_parcial):
+            # distribucion sesgada tipo zipf para parecerse a las letras
+            for _ in range(terminos_por_documento):
+                termino = terminos[int(aleatorio.paretovariate(1.1)) % vocabulario]
+                indice.setdefault(termino, {})[str(id_documento)] = aleatorio.choice([0.301, 0.477, 0.602, 0.698])
+        with open(os.path.join(directorio, f"indice_parcial_{numero}.json"), 'w', encoding='utf-8') as archivo:
+            json.dump(indice, archivo)
+
+
+def medir(directorio: str):
+    parciales = sorted(a for a in os.listdir(directorio) if a.startswith("indice_parcial_") and a.endswith(".json"))
+    if not parciales:
+        print(f"no hay indice_parcial_N.json en {directorio}")
+        return
+    destino = tempfile.mkdtemp(prefix="indice_binario_")
+    tamanio_json = tamanio_bin = 0
+    tiempo_json = tiempo_bin = 0.0
+    for archivo in parciales:
+        ruta_json = os.path.join(directorio, archivo)
+        ruta_bin = convertir_json_a_binario(ruta_json, os.path.join(destino, archivo.replace(".json", ".bin")))
+        tamanio_json += os.path.getsize(ruta_json)
+        tamanio_bin += os.path.getsize(ruta_bin)
+
+        inicio = time.perf_counter()
+        with open(ruta_json, 'r', encoding='utf-8') as f:
+            indice_json = json.load(f)
+        tiempo_json += time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        with LectorIndiceBinario(ruta_bin) as lector:
+            indice_bin = lector.cargar_todo()
+        tiempo_bin += time.perf_counter() - inicio
+
+        # los pesos se cuantizan, asi que solo se comparan terminos y documentos
+        assert indice_json.keys() == indice_bin.keys()
+        # en json los ids son texto, en el binario enteros
+        assert all({int(k) for k in indice_json[t]} == indice_bin[t].keys() for t in indice_json)
+
+    print(f"parciales:           {len(parciales)}")
+    print(f"tamaño json:         {tamanio_json / 1e6:.2f} MB")
+    print(f"tamaño binario:      {tamanio_bin / 1e6:.2f} MB ({tamanio_bin / tamanio_json:.1%})")
+    print(f"carga json.load:     {tiempo_json:.3f} s")
+    print(f"carga binaria:       {tiempo_bin:.3f} s")
+    # en modo perezoso solo se lee el diccionario de terminos
+    inicio = time.perf_counter()
+    for archivo in os.listdir(destino):
+        LectorIndiceBinario(os.path.join(destino, archivo)).cerrar()
+    print(f"solo diccionarios:   {time.perf_counter() - inicio:.3f} s")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        medir(sys.argv[1])
+    else:
+        directorio = tempfile.mkdtemp(prefix="indice_json_")
+        print(f"generando parciales sinteticos en {directorio}")
+        generar_parciales_sinteticos(directorio)
+        medir(directorio)
@@ -0,0 +1,80 @@
+import os
+import io
+import json
+import time
+import random
+import argparse
+import tempfile
+import contextlib
+
+from app.Final2 import IndiceInvertido, MotorConsulta
+from benchmarks.bench_construccion import generar_csv, PALABRAS, PESOS_CAMPOS
+
+# CPU por consulta del puntuador por diccionarios (TopK con MaxScore) contra el puntuador 'matriz'
+# (CSR de scipy), consulta por consulta y en lote; tambien verifica que los rankings coincidan
+# uso: python -m benchmarks.bench_matriz [--filas 20000] [--consultas 2000] [--indice ruta --csv archivo.csv]
+
+
+def construir_indice(filas: int):
+    directorio = tempfile.mkdtemp(prefix="indice_matriz_")
+    ruta_csv = os.path.join(directorio, "spotify_songs_filtrado.csv")
+    print(f"generando {filas} filas sinteticas e indexando en {directorio}")
+    generar_csv(ruta_csv, filas)
+    with open(os.path.join(directorio, "pesos_campos.json"), 'w', encoding='utf-8') as archivo:
+        json.dump(PESOS_CAMPOS, archivo)
+    with open(os.path.join(directorio, "stoplist.csv"), 'w', encoding='utf-8') as archivo:
+        archivo.write("\n".join(["the", "i", "you", "a", "de", "la", "el", "y"]))
+    with contextlib.redirect_stdout(io.StringIO()):
+        IndiceInvertido(ruta_csv, os.path.join(directorio, "stoplist.csv"), directorio,
+                        os.path.join(directorio, "normas.npy"), os.path.join(directorio, "pesos_campos.json"),
+                        workers=os.cpu_count() or 1).construir_indice()
+    return ruta_csv, directorio
+
+
+def generar_consultas(numero: int, semilla: int = 3):
+    aleatorio = random.Random(semilla)
+    vocabulario = PALABRAS + [f"palabra{i}" for i in range(2000)]
+    return [" ".join(aleatorio.choice(vocabulario) for _ in range(aleatorio.randint(1, 6))) for _ in range(numero)]
+
+
+def medir(ruta_csv: str, ruta_indice: str, consultas, top_k: int = 10):
+    ruta_stoplist = os.path.join(ruta_indice, "stoplist.csv")
+    motores = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for puntuador in ('diccionarios', 'matriz'):
+            motores[puntuador] = MotorConsulta(ruta_csv, ruta_indice, os.path.join(ruta_indice, "normas.npy"),
+                                               ruta_stoplist, modo_carga='perezoso', usar_impactos=True,
+                                               puntuador=puntuador)
+        resultados, tiempos = {}, {}
+        for nombre, funcion in (("diccionarios", lambda: [motores['diccionarios'].rankear(c, top_k) for c in consultas]),
+                                ("matriz", lambda: [motores['matriz'].rankear(c, top_k) for c in consultas]),
+                                ("matriz en lote", lambda: motores['matriz'].rankear_lote(consultas, top_k))):
+            inicio = time.perf_counter()
+            resultados[nombre] = funcion()
+            tiempos[nombre] = time.perf_counter() - inicio
+
+    # misma lista salvo el orden de los empates, el ultimo bit de las similitudes y los documentos con
+    # similitud 0, que la matriz no devuelve
+    distintos = 0
+    for esperado, obtenido in zip(resultados["diccionarios"], resultados["matriz en lote"]):
+        esperado = sorted((item for item in esperado if item[1] > 0), key=lambda item: (-item[1], item[0]))
+        if len(esperado) != len(obtenido) or any(abs(a[1] - b[1]) > 1e-9 for a, b in zip(esperado, obtenido)):
+            distintos += 1
+    print(f"consultas: {len(consultas)}, top_k: {top_k}, rankings distintos: {distintos}")
+    for nombre, duracion in tiempos.items():
+        print(f"{nombre:15}: {duracion * 1000 / len(consultas):8.3f} ms/consulta")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark del puntuador con matriz dispersa")
+    parser.add_argument("--filas", type=int, default=20000)
+    parser.add_argument("--consultas", type=int, default=2000)
+    parser.add_argument("--top_k", type=int, default=10)
+    parser.add_argument("--indice", help="directorio de un indice ya construido (con stoplist.csv)")
+    parser.add_argument("--csv", help="csv del indice indicado con --indice")
+    argumentos = parser.parse_args()
+    if argumentos.indice:
+        ruta_csv, ruta_indice = argumentos.csv, argumentos.indice
+    else:
+        ruta_csv, ruta_indice = construir_indice(argumentos.filas)
+    medir(ruta_csv, ruta_indice, generar_consultas(argumentos.consultas), argumentos.top_k)
@@ -0,0 +1,75 @@
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+import tracemalloc
+
+from app.Normas import cargar_normas, guardar_normas, normas_desde_dict
+
+# memoria de las normas y de los postings con ids de documento como texto (antes) y como enteros (ahora)
+#   normas: dict {"id": norma} cargado de normas.json contra normas.npy abierto con mmap
+#   postings: {termino: {"id": peso}} contra {termino: {id: peso}}
+# la memoria se mide con tracemalloc (solo lo que reserva python; las paginas del mmap no cuentan
+# porque son del archivo y las comparte el sistema operativo)
+# uso: python -m benchmarks.bench_memoria_ids [numero_documentos]
+
+
+def medir_memoria(funcion):
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    resultado = funcion()
+    duracion = time.perf_counter() - inicio
+    memoria, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, memoria, duracion
+
+
+def postings_sinteticos(numero_documentos: int, vocabulario: int = 20000, terminos_por_documento: int = 40):
+    aleatorio = random.Random(5)
+    pares = []
+    for id_documento in range(numero_documentos):
+        for _ in range(terminos_por_documento):
+            termino = int(aleatorio.paretovariate(1.1)) % vocabulario
+            pares.append((f"term{termino}", id_documento, aleatorio.choice([0.301, 0.477, 0.602])))
+    return pares
+
+
+def medir(numero_documentos: int):
+    directorio = tempfile.mkdtemp(prefix="memoria_ids_")
+    aleatorio = random.Random(3)
+    normas_dict = {str(i): round(aleatorio.uniform(0.5, 12.0), 3) for i in range(numero_documentos)}
+    ruta_json = os.path.join(directorio, "normas.json")
+    ruta_npy = os.path.join(directorio, "normas.npy")
+    with open(ruta_json, 'w', encoding='utf-8') as archivo:
+        json.dump(normas_dict, archivo)
+    guardar_normas(normas_desde_dict(normas_dict), ruta_npy)
+    del normas_dict
+
+    def cargar_json():
+        with open(ruta_json, 'r', encoding='utf-8') as archivo:
+            return json.load(archivo)
+
+    _, memoria_json, tiempo_json = medir_memoria(cargar_json)
+    normas, memoria_npy, tiempo_npy = medir_memoria(lambda: cargar_normas(ruta_npy))
+    print(f"documentos: {numero_documentos}")
+    print(f"normas.json -> dict:   {memoria_json / 1e6:8.2f} MB  {tiempo_json * 1000:8.1f} ms  "
+          f"({os.path.getsize(ruta_json) / 1e6:.2f} MB en disco)")
+    print(f"normas.npy  -> mmap:   {memoria_npy / 1e6:8.2f} MB  {tiempo_npy * 1000:8.1f} ms  "
+          f"({os.path.getsize(ruta_npy) / 1e6:.2f} MB en disco)")
+    del normas
+
+    pares = postings_sinteticos(numero_documentos)
+    for nombre, clave in (("ids texto", str), ("ids enteros", int)):
+        def construir():
+            indice = {}
+            for termino, id_documento, peso in pares:
+                indice.setdefault(termino, {})[clave(id_documento)] = peso
+            return indice
+        _, memoria, duracion = medir_memoria(construir)
+        print(f"postings {nombre:11}:  {memoria / 1e6:8.2f} MB  {duracion * 1000:8.1f} ms  ({len(pares)} postings)")
+
+
+if __name__ == "__main__":
+    medir(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
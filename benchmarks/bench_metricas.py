@@ -0,0 +1,56 @@
+import os
+import io
+import time
+import argparse
+import contextlib
+
+from app.Final2 import MotorConsulta
+from app.Metricas import metricas, NOMBRE_ETAPAS
+from benchmarks.bench_arranque import construir_indice
+from benchmarks.bench_frases import generar_frases
+
+# costo de medir las etapas (Metricas.py) en MotorConsulta.buscar: las mismas consultas con las metricas
+# activas y con METRICAS=0, sin cache de resultados, y el reparto del tiempo por etapa que queda en /metrics
+# uso: python -m benchmarks.bench_metricas [--filas 100000] [--consultas 2000] [--rondas 5]
+
+
+def recorrer(motor: MotorConsulta, consultas, top_k: int) -> float:
+    inicio = time.perf_counter()
+    for consulta in consultas:
+        motor.buscar(consulta, top_k)
+    return (time.perf_counter() - inicio) / len(consultas)
+
+
+def medir(ruta_csv: str, ruta_indice: str, consultas, rondas: int, top_k: int = 10):
+    with contextlib.redirect_stdout(io.StringIO()):
+        motor = MotorConsulta(ruta_csv, ruta_indice, os.path.join(ruta_indice, "normas.npy"),
+                              os.path.join(ruta_indice, "stoplist.csv"), modo_carga='perezoso', usar_impactos=True)
+    recorrer(motor, consultas, top_k)  # calienta la cache de postings para que las dos mediciones la vean igual
+    tiempos = {True: [], False: []}
+    for _ in range(rondas):  # intercaladas, para que el ruido de la maquina caiga en las dos
+        for activas in (True, False):
+            metricas.activas = activas
+            tiempos[activas].append(recorrer(motor, consultas, top_k))
+    metricas.activas = True
+    con, sin = min(tiempos[True]), min(tiempos[False])
+    print(f"{len(consultas)} consultas, mejor de {rondas} rondas")
+    print(f"sin metricas: {sin * 1e6:8.1f} us/consulta")
+    print(f"con metricas: {con * 1e6:8.1f} us/consulta ({(con - sin) * 1e6:+.1f} us, {(con / sin - 1) * 100:+.1f} %)")
+    print("por etapa (todas las rondas con metricas):")
+    for clave, valores in sorted(metricas.resumen().get(NOMBRE_ETAPAS, {}).items()):
+        print(f"  {clave:32} media {valores['media_ms']:8.3f} ms  p99 <= {valores['p99_ms']:g} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark del costo de las metricas por etapa")
+    parser.add_argument("--filas", type=int, default=100000)
+    parser.add_argument("--consultas", type=int, default=2000)
+    parser.add_argument("--rondas", type=int, default=5)
+    parser.add_argument("--indice", help="directorio de un indice ya construido (con stoplist.csv)")
+    parser.add_argument("--csv", help="csv del indice indicado con --indice")
+    argumentos = parser.parse_args()
+    if argumentos.indice:
+        ruta_csv, ruta_indice = argumentos.csv, argumentos.indice
+    else:
+        ruta_csv, ruta_indice = construir_indice(argumentos.filas)
+    medir(ruta_csv, ruta_indice, generar_frases(ruta_csv, argumentos.consultas), argumentos.rondas)
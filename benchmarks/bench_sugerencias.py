@@ -0,0 +1,54 @@
+import os
+import io
+import time
+import random
+import argparse
+import contextlib
+
+from app.Sugerencias import IndiceSugerencias, NOMBRE_SUGERENCIAS
+from benchmarks.bench_arranque import construir_indice
+
+# latencia de /suggest: prefijos de 1 a 8 caracteres sacados de los titulos, artistas y terminos del indice,
+# como los que manda la interfaz mientras se escribe (sin flask, solo IndiceSugerencias.sugerir)
+# uso: python -m benchmarks.bench_sugerencias [--filas 100000] [--prefijos 20000]
+
+
+def generar_prefijos(indice: IndiceSugerencias, numero: int, semilla: int = 3):
+    azar = random.Random(semilla)
+    textos = [texto for lista in indice.listas.values() for texto in lista.textos]
+    prefijos = []
+    for _ in range(numero):
+        texto = azar.choice(textos)
+        prefijos.append(texto[:azar.randint(1, min(8, len(texto)))])
+    return prefijos
+
+
+def medir(ruta_indice: str, numero: int, cantidad: int = 10):
+    ruta = os.path.join(ruta_indice, NOMBRE_SUGERENCIAS)
+    inicio = time.perf_counter()
+    indice = IndiceSugerencias(ruta)
+    print(f"{ruta}: {os.path.getsize(ruta) / 1e6:.1f} MB, cargado en {time.perf_counter() - inicio:.3f} s, "
+          f"entradas {indice.estadisticas()}")
+    prefijos = generar_prefijos(indice, numero)
+    tiempos = []
+    for prefijo in prefijos:
+        inicio = time.perf_counter()
+        indice.sugerir(prefijo, cantidad)
+        tiempos.append(time.perf_counter() - inicio)
+    tiempos.sort()
+    print(f"{numero} prefijos, {cantidad} sugerencias por lista: media {sum(tiempos) / numero * 1e6:.1f} us, "
+          f"p50 {tiempos[numero // 2] * 1e6:.1f} us, p99 {tiempos[int(numero * 0.99)] * 1e6:.1f} us, "
+          f"max {tiempos[-1] * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark de las sugerencias por prefijo")
+    parser.add_argument("--filas", type=int, default=100000)
+    parser.add_argument("--prefijos", type=int, default=20000)
+    parser.add_argument("--indice", help="directorio de un indice ya construido (con sugerencias.npz)")
+    argumentos = parser.parse_args()
+    ruta_indice = argumentos.indice
+    if not ruta_indice:
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, ruta_indice = construir_indice(argumentos.filas)
+    medir(ruta_indice, argumentos.prefijos)
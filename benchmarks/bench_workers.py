@@ -0,0 +1,138 @@
+import os
+import io
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import tempfile
+import contextlib
+import subprocess
+import http.client
+import multiprocessing
+
+import psutil
+
+from app.Snapshot import publicar_snapshot
+from benchmarks.bench_arranque import construir_indice
+from benchmarks.bench_frases import generar_frases
+
+# prueba de carga del servidor pre-fork (app/Servidor.py) sobre un snapshot: para 1, 2, 4... workers lanza
+# el servidor, lo carga con clientes en paralelo contra /consulta durante unos segundos y mide las consultas
+# por segundo y la memoria. la memoria de cada worker es su USS (las paginas que solo tiene el); el indice
+# mapeado esta en las paginas compartidas, asi que un worker mas deberia sumar poco. PSS total reparte las
+# compartidas entre los procesos. se compara el diccionario mapeado (.dicm) con el dict en cada proceso.
+# lo que si crece por worker es su cache de postings decodificados (--cache_postings)
+# uso: python -m benchmarks.bench_workers [--filas 100000] [--workers 1 2 4] [--segundos 10] [--clientes 8]
+
+
+def puerto_libre() -> int:
+    with socket.socket() as prueba:
+        prueba.bind(("127.0.0.1", 0))
+        return prueba.getsockname()[1]
+
+
+def esperar_listo(puerto: int, proceso: subprocess.Popen, limite: float = 120.0):
+    inicio = time.monotonic()
+    while time.monotonic() - inicio < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError("el servidor termino antes de quedar listo")
+        try:
+            conexion = http.client.HTTPConnection("127.0.0.1", puerto, timeout=2)
+            conexion.request("GET", "/listo")
+            if conexion.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"el servidor no quedo listo en {limite} s")
+
+
+def _cliente(puerto: int, consultas, segundos: float, semilla: int, cola):
+    azar = random.Random(semilla)
+    hechas = 0
+    errores = 0
+    fin = time.monotonic() + segundos
+    while time.monotonic() < fin:
+        cuerpo = json.dumps({"consulta": azar.choice(consultas), "top_k": 10})
+        try:
+            conexion = http.client.HTTPConnection("127.0.0.1", puerto, timeout=30)
+            conexion.request("POST", "/consulta", cuerpo, {"Content-Type": "application/json"})
+            respuesta = conexion.getresponse()
+            respuesta.read()
+            conexion.close()
+            hechas += respuesta.status == 200
+            errores += respuesta.status != 200
+        except OSError:
+            errores += 1
+    cola.put((hechas, errores))
+
+
+def memoria(pid: int):
+    """(uss del principal, uss de cada worker, pss total) en bytes"""
+    principal = psutil.Process(pid)
+    workers = principal.children()
+    uss_workers = [worker.memory_full_info().uss for worker in workers]
+    pss = sum(getattr(proceso.memory_full_info(), "pss", 0) for proceso in [principal] + workers)
+    return principal.memory_full_info().uss, uss_workers, pss
+
+
+def medir(ruta_snapshots: str, workers: int, consultas, segundos: float, clientes: int, mapeado: bool,
+          cache_postings: int):
+    puerto = puerto_libre()
+    entorno = dict(os.environ, RUTA_SNAPSHOTS=ruta_snapshots, DICCIONARIO_MAPEADO="1" if mapeado else "0",
+                   MAX_POSTINGS_CACHE=str(cache_postings))
+    proceso = subprocess.Popen([sys.executable, "-m", "app.Servidor", "--workers", str(workers),
+                                "--puerto", str(puerto)], env=entorno,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        esperar_listo(puerto, proceso)
+        cola = multiprocessing.Queue()
+        procesos = [multiprocessing.Process(target=_cliente, args=(puerto, consultas, segundos, semilla, cola))
+                    for semilla in range(clientes)]
+        for cliente in procesos:
+            cliente.start()
+        resultados = [cola.get() for _ in procesos]
+        for cliente in procesos:
+            cliente.join()
+        uss_principal, uss_workers, pss = memoria(proceso.pid)
+    finally:
+        proceso.terminate()
+        proceso.wait(timeout=30)
+    hechas = sum(hechas for hechas, _ in resultados)
+    errores = sum(errores for _, errores in resultados)
+    return hechas / segundos, errores, uss_principal, uss_workers, pss
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="prueba de carga del servidor pre-fork con el indice compartido")
+    parser.add_argument("--filas", type=int, default=100000)
+    parser.add_argument("--workers", type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument("--segundos", type=float, default=10.0)
+    parser.add_argument("--clientes", type=int, default=8)
+    parser.add_argument("--consultas", type=int, default=2000)
+    parser.add_argument("--cache_postings", type=int, default=200000, help="MAX_POSTINGS_CACHE de cada worker")
+    parser.add_argument("--indice", help="directorio de un indice ya construido (con stoplist.csv)")
+    parser.add_argument("--csv", help="csv del indice indicado con --indice")
+    argumentos = parser.parse_args()
+    if argumentos.indice:
+        ruta_csv, ruta_indice = argumentos.csv, argumentos.indice
+    else:
+        ruta_csv, ruta_indice = construir_indice(argumentos.filas)
+    ruta_snapshots = tempfile.mkdtemp(prefix="snapshots_workers_")
+    with contextlib.redirect_stdout(io.StringIO()):
+        publicar_snapshot(ruta_indice, ruta_snapshots)
+    consultas = generar_frases(ruta_csv, argumentos.consultas)
+    print(f"{os.cpu_count()} cpus, {argumentos.clientes} clientes, {argumentos.segundos:.0f} s por medicion; "
+          f"memoria en MB (USS: solo del proceso, PSS: con las paginas compartidas repartidas)")
+    print(f"{'diccionario':12} {'workers':>7} {'consultas/s':>12} {'errores':>8} {'principal':>10} "
+          f"{'por worker':>11} {'PSS total':>10}")
+    for mapeado in (True, False):
+        for workers in argumentos.workers:
+            por_segundo, errores, uss_principal, uss_workers, pss = medir(
+                ruta_snapshots, workers, consultas, argumentos.segundos, argumentos.clientes, mapeado,
+                argumentos.cache_postings)
+            print(f"{'mapeado' if mapeado else 'dict':12} {workers:7} {por_segundo:12.1f} {errores:8} "
+                  f"{uss_principal / 1e6:10.1f} {sum(uss_workers) / max(len(uss_workers), 1) / 1e6:11.1f} "
+                  f"{pss / 1e6:10.1f}")
@@ -0,0 +1,89 @@
+import csv
+import json
+import random
+import argparse
+import itertools
+from typing import Dict, List
+
+from benchmarks.bench_difusa import con_errores
+
+# CONSULTAS DE PRUEBA SACADAS DE UN CSV CON EL ESQUEMA DE spotify_songs_filtrado.csv
+# las canciones se eligen con popularidad de zipf (unas pocas se buscan muchas veces, como en un buscador
+# de verdad, asi que las caches ven repeticiones) y de cada una sale una consulta de un tipo:
+#   terminos: 1 a 3 palabras sueltas de la letra
+#   verso: 3 a 6 palabras seguidas de la letra
+#   titulo, artista: el track_name o el track_artist tal cual
+#   errores: 1 o 2 palabras de la letra con errores de tipeo (para la busqueda difusa)
+# la carga se guarda como json lines ({"consulta", "tipo"}) para repetir exactamente la misma en otra corrida
+# uso: python -m benchmarks.carga <csv> <salida.jsonl> [--consultas 2000] [--semilla 5]
+
+MEZCLA = {"terminos": 0.35, "verso": 0.2, "titulo": 0.2, "artista": 0.15, "errores": 0.1}
+SIGNOS = ",?!.\"'()"
+
+
+def _palabras(texto: str) -> List[str]:
+    return [palabra.strip(SIGNOS) for palabra in texto.split() if palabra.strip(SIGNOS)]
+
+
+def _consulta(fila: Dict[str, str], tipo: str, azar: random.Random) -> str:
+    letra = _palabras(fila.get("lyrics") or "")
+    if tipo == "titulo" or (tipo != "artista" and not letra):
+        return fila.get("track_name") or ""
+    if tipo == "artista":
+        return fila.get("track_artist") or ""
+    if tipo == "verso":
+        largo = min(azar.randint(3, 6), len(letra))
+        inicio = azar.randrange(len(letra) - largo + 1)
+        return " ".join(letra[inicio:inicio + largo])
+    palabras = azar.sample(letra, min(azar.randint(1, 3) if tipo == "terminos" else azar.randint(1, 2), len(letra)))
+    if tipo == "errores":
+        palabras = [con_errores(palabra, azar) if len(palabra) >= 4 else palabra for palabra in palabras]
+    return " ".join(palabras)
+
+
+def generar_carga(ruta_csv: str, numero: int, semilla: int = 5, mezcla: Dict[str, float] = None) -> List[Dict]:
+    """`numero` consultas {"consulta", "tipo"}; el csv se lee dos veces (contar y sacar las filas elegidas)"""
+    mezcla = mezcla or MEZCLA
+    azar = random.Random(semilla)
+    with open(ruta_csv, 'r', encoding='utf-8', newline='') as archivo:
+        filas = sum(1 for _ in csv.DictReader(archivo))
+    if not filas:
+        return []
+    # la fila mas popular no es siempre la primera del csv: el rango de popularidad se baraja
+    orden = list(range(filas))
+    azar.shuffle(orden)
+    acumulados = list(itertools.accumulate(1.0 / rango for rango in range(1, filas + 1)))
+    elegidas = [orden[rango] for rango in azar.choices(range(filas), cum_weights=acumulados, k=numero)]
+    tipos = azar.choices(list(mezcla), weights=list(mezcla.values()), k=numero)
+    necesarias = set(elegidas)
+    contenido = {}
+    with open(ruta_csv, 'r', encoding='utf-8', newline='') as archivo:
+        for posicion, fila in enumerate(csv.DictReader(archivo)):
+            if posicion in necesarias:
+                contenido[posicion] = fila
+    return [{"consulta": _consulta(contenido[posicion], tipo, azar), "tipo": tipo}
+            for posicion, tipo in zip(elegidas, tipos)]
+
+
+def guardar_carga(ruta: str, consultas: List[Dict]):
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        for consulta in consultas:
+            archivo.write(json.dumps(consulta, ensure_ascii=False) + "\n")
+
+
+def leer_carga(ruta: str) -> List[Dict]:
+    with open(ruta, 'r', encoding='utf-8') as archivo:
+        return [json.loads(linea) for linea in archivo if linea.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="genera consultas de prueba a partir del csv")
+    parser.add_argument("csv")
+    parser.add_argument("salida")
+    parser.add_argument("--consultas", type=int, default=2000)
+    parser.add_argument("--semilla", type=int, default=5)
+    argumentos = parser.parse_args()
+    consultas = generar_carga(argumentos.csv, argumentos.consultas, argumentos.semilla)
+    guardar_carga(argumentos.salida, consultas)
+    distintas = len({consulta["consulta"] for consulta in consultas})
+    print(f"{len(consultas)} consultas ({distintas} distintas) guardadas en {argumentos.salida}")
@@ -0,0 +1,86 @@
+import sys
+import json
+import argparse
+from typing import Dict, Iterator, Tuple
+
+# COMPARA DOS RESULTADOS DE benchmarks.suite
+# empareja las corridas por numero de filas y muestra cada medida de la base y la nueva con el cambio en %.
+# las que empeoran mas que --umbral se marcan (filas/s y consultas/s empeoran si bajan; tiempos, memoria y
+# bytes si suben) y con --fallar el proceso termina con codigo 1, para usarlo en un script antes de mergear.
+# avisa si los corpus o las cargas no son los mismos (otra semilla u otro generador): ahi no se comparan igual
+# uso: python -m benchmarks.comparar <base.json> <nuevo.json> [--umbral 10] [--fallar]
+
+MEDIDAS = [
+    ("construccion.segundos", False),
+    ("construccion.filas_por_segundo", True),
+    ("construccion.rss_pico_mb.proceso", False),
+    ("indice.bytes", False),
+    ("arranque.total_s", False),
+    ("arranque.trigramas_s", False),
+    ("rss_pico_mb", False),
+    ("consultas.todas.p50_ms", False),
+    ("consultas.todas.p95_ms", False),
+    ("consultas.todas.p99_ms", False),
+    ("consultas.todas.por_segundo", True),
+]
+
+
+def _valor(corrida: Dict, ruta: str):
+    for clave in ruta.split("."):
+        if not isinstance(corrida, dict) or clave not in corrida:
+            return None
+        corrida = corrida[clave]
+    return corrida
+
+
+def _medidas(corrida: Dict) -> Iterator[Tuple[str, bool]]:
+    yield from MEDIDAS
+    for tipo in sorted(_valor(corrida, "consultas.por_tipo") or {}):
+        yield f"consultas.por_tipo.{tipo}.p50_ms", False
+        yield f"consultas.por_tipo.{tipo}.p99_ms", False
+
+
+def comparar(base: Dict, nuevo: Dict, umbral: float) -> int:
+    """imprime la tabla y devuelve cuantas medidas empeoraron mas que el umbral"""
+    print(f"base:  {base['git'].get('commit')} ({base['fecha']})")
+    print(f"nuevo: {nuevo['git'].get('commit')} ({nuevo['fecha']})"
+          f"{' con cambios sin commit' if nuevo['git'].get('cambios_sin_commit') else ''}")
+    if base["maquina"] != nuevo["maquina"]:
+        print("aviso: las corridas son de maquinas o versiones distintas")
+    corridas_base = {corrida["filas"]: corrida for corrida in base["corridas"]}
+    peores = 0
+    for corrida in nuevo["corridas"]:
+        anterior = corridas_base.get(corrida["filas"])
+        if anterior is None:
+            print(f"\n{corrida['filas']} filas: no esta en la base")
+            continue
+        print(f"\n{corrida['filas']} filas")
+        for que in ("corpus", "carga"):
+            if anterior[que].get("crc32") != corrida[que].get("crc32"):
+                print(f"aviso: {que} distinto (crc32 {anterior[que].get('crc32')} -> {corrida[que].get('crc32')})")
+        print(f"{'medida':36} {'base':>12} {'nuevo':>12} {'cambio':>9}")
+        for ruta, mas_es_mejor in _medidas(corrida):
+            antes, despues = _valor(anterior, ruta), _valor(corrida, ruta)
+            if not isinstance(antes, (int, float)) or not isinstance(despues, (int, float)):
+                continue
+            cambio = (despues - antes) / antes * 100 if antes else 0.0
+            peor = (-cambio if mas_es_mejor else cambio) > umbral
+            peores += peor
+            print(f"{ruta:36} {antes:12.4g} {despues:12.4g} {cambio:+8.1f}%{'  <- peor' if peor else ''}")
+    return peores
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="compara dos resultados de la suite de benchmarks")
+    parser.add_argument("base")
+    parser.add_argument("nuevo")
+    parser.add_argument("--umbral", type=float, default=10.0, help="% de cambio a partir del cual se marca")
+    parser.add_argument("--fallar", action='store_true', help="codigo de salida 1 si alguna medida empeoro")
+    argumentos = parser.parse_args()
+    with open(argumentos.base, 'r', encoding='utf-8') as archivo:
+        base = json.load(archivo)
+    with open(argumentos.nuevo, 'r', encoding='utf-8') as archivo:
+        nuevo = json.load(archivo)
+    peores = comparar(base, nuevo, argumentos.umbral)
+    print(f"\n{peores} medidas empeoraron mas de {argumentos.umbral:g} %")
+    sys.exit(1 if argumentos.fallar and peores else 0)
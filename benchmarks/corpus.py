@@ -0,0 +1,177 @@
+import os
+import csv
+import json
+import zlib
+import random
+import string
+import argparse
+import itertools
+from typing import Dict, List
+
+# CORPUS SINTETICO CON EL ESQUEMA DE spotify_songs_filtrado.csv
+# track_id, track_name, track_artist, lyrics, playlist_name, como el csv que indexa IndiceInvertido.
+# cada cancion tiene un idioma (sobre todo ingles y español, algo de portugues, frances, italiano y aleman) y
+# algunas mezclan versos en ingles. las palabras salen de un vocabulario por idioma con frecuencias de zipf:
+# unas decenas de palabras reales muy comunes y una cola larga de palabras inventadas con las letras del idioma
+# (asi el stemmer y las stopwords trabajan como con letras de verdad). las letras repiten el coro, los
+# titulos suelen ser un pedazo del coro y pocos artistas tienen muchas canciones.
+# todo sale de la semilla: la misma semilla y el mismo numero de filas dan el mismo archivo
+# uso: python -m benchmarks.corpus <salida.csv> [--filas 100000] [--semilla 11] [--vocabulario 20000]
+
+COLUMNAS = ["track_id", "track_name", "track_artist", "lyrics", "playlist_name"]
+PESOS_CAMPOS = [0.0, 0.25, 0.2, 0.35, 0.2]  # los mismos que bench_construccion
+STOPLIST = ["the", "i", "you", "a", "de", "la", "el", "y", "que", "en", "to", "me", "my", "it"]
+
+# idioma -> (proporcion de canciones, palabras comunes, consonantes, vocales, finales de palabra)
+IDIOMAS = {
+    "en": (0.42, ["the", "i", "you", "love", "me", "my", "baby", "oh", "yeah", "don't", "i'm", "you're", "gonna",
+                  "can't", "night", "feel", "alive", "heart", "dance", "tonight", "never", "forever", "girl",
+                  "crazy", "dream", "fire", "let", "go", "down", "hold", "want", "need", "know", "time", "light"],
+           ["b", "c", "d", "f", "g", "h", "l", "m", "n", "p", "r", "s", "t", "w", "th", "sh", "st", "br", "tr"],
+           ["a", "e", "i", "o", "u", "ee", "ou", "ay", "y"], ["", "s", "ng", "t", "r", "ght", "ck"]),
+    "es": (0.38, ["de", "la", "que", "el", "y", "amor", "corazón", "noche", "quiero", "bailar", "contigo", "vida",
+                  "fuego", "luna", "sueño", "mañana", "cielo", "mar", "llorar", "tiempo", "beso", "alma", "camino",
+                  "nunca", "siempre", "tú", "mí", "canción", "pasión", "dolor", "volver", "esperar", "sentir"],
+           ["b", "c", "d", "f", "g", "l", "m", "n", "p", "r", "s", "t", "v", "ll", "ch", "ñ", "br", "tr", "qu"],
+           ["a", "a", "e", "e", "i", "o", "o", "u", "á", "ó", "ía", "ue", "io"],
+           ["", "", "n", "s", "r", "l", "ción"]),
+    "pt": (0.08, ["de", "que", "você", "amor", "coração", "saudade", "não", "meu", "minha", "vida", "noite",
+                  "beijo", "sonho", "mar", "sol", "cantar", "dançar", "também", "nós", "então"],
+           ["b", "c", "d", "f", "g", "j", "l", "m", "n", "p", "r", "s", "t", "v", "nh", "lh", "ç"],
+           ["a", "a", "e", "e", "i", "o", "o", "u", "ã", "ei", "ou"], ["", "", "m", "s", "r", "ção", "ões"]),
+    "fr": (0.05, ["je", "tu", "le", "la", "amour", "cœur", "nuit", "toujours", "jamais", "rêve", "danser", "âme",
+                  "moi", "toi", "où", "ciel", "vie", "chanson", "être", "très"],
+           ["b", "c", "d", "f", "g", "j", "l", "m", "n", "p", "r", "s", "t", "v", "ch", "qu"],
+           ["a", "e", "i", "o", "ou", "oi", "é", "è", "au", "eu"], ["", "", "s", "t", "x", "r", "ment", "tte"]),
+    "it": (0.04, ["il", "di", "che", "amore", "cuore", "notte", "sempre", "mai", "vita", "sole", "ballare", "anima",
+                  "sogno", "perché", "così", "cielo", "mare", "tempo"],
+           ["b", "c", "d", "f", "g", "l", "m", "n", "p", "r", "s", "t", "v", "gl", "sc", "zz", "tt", "ll"],
+           ["a", "e", "i", "o", "u", "ia", "io"], [""]),
+    "de": (0.03, ["ich", "du", "die", "der", "und", "liebe", "herz", "nacht", "immer", "nie", "leben", "traum",
+                  "tanzen", "für", "schön", "über", "himmel", "zeit"],
+           ["b", "d", "f", "g", "h", "k", "l", "m", "n", "r", "s", "t", "w", "z", "sch", "st", "pf"],
+           ["a", "a", "e", "e", "i", "o", "u", "ä", "ü", "ei", "au", "ie"], ["", "n", "t", "ch", "r", "ng", "keit"]),
+}
+PROPORCION_MEZCLA = 0.15  # canciones en otro idioma con algun verso en ingles
+ESTILOS = ["Pop", "Rock", "Reggaeton", "Latin", "Indie", "R&B", "Hip Hop", "Dance", "Salsa", "Bachata", "Trap",
+           "Electro", "Acoustic", "Clásicos", "Baladas", "Chill", "Workout", "Party", "Summer", "Throwback"]
+ADJETIVOS = ["Hits", "Favoritos", "Mix", "Essentials", "2019", "Top 50", "en Español", "Forever", "Love",
+             "Vibes", "Radio", "Classics", "Nuevo", "Viral", "Lo Mejor"]
+CARACTERES_ID = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+class Vocabulario:
+    """palabras de un idioma con pesos de zipf (exponente 1): las comunes primero y despues la cola"""
+
+    def __init__(self, comunes: List[str], consonantes: List[str], vocales: List[str], finales: List[str],
+                 tamanio: int, azar: random.Random):
+        palabras = list(comunes)
+        vistas = set(palabras)
+        intentos = 0
+        while len(palabras) < tamanio and intentos < tamanio * 20:
+            intentos += 1
+            silabas = [azar.choice(consonantes) + azar.choice(vocales) for _ in range(azar.randint(1, 4))]
+            palabra = "".join(silabas) + azar.choice(finales)
+            if palabra not in vistas:
+                vistas.add(palabra)
+                palabras.append(palabra)
+        self.palabras = palabras
+        self.acumulados = list(itertools.accumulate(1.0 / rango for rango in range(1, len(palabras) + 1)))
+
+    def elegir(self, azar: random.Random, cantidad: int) -> List[str]:
+        return azar.choices(self.palabras, cum_weights=self.acumulados, k=cantidad)
+
+
+class GeneradorCanciones:
+    def __init__(self, filas: int, semilla: int = 11, vocabulario: int = 20000):
+        self.azar = random.Random(semilla)
+        self.idiomas = list(IDIOMAS)
+        self.proporciones = list(itertools.accumulate(IDIOMAS[idioma][0] for idioma in self.idiomas))
+        # la cola de los idiomas con menos canciones es mas chica, como en el csv real
+        self.vocabularios = {idioma: Vocabulario(comunes, consonantes, vocales, finales,
+                                                 max(len(comunes), int(vocabulario * peso / 0.4)), self.azar)
+                             for idioma, (peso, comunes, consonantes, vocales, finales) in IDIOMAS.items()}
+        # pocos artistas con muchas canciones: popularidad de zipf sobre un grupo proporcional al corpus
+        self.artistas = [self._nombre_artista() for _ in range(max(50, filas // 20))]
+        self.acumulados_artistas = list(itertools.accumulate(1.0 / rango
+                                                             for rango in range(1, len(self.artistas) + 1)))
+        self.playlists = sorted({f"{self.azar.choice(ESTILOS)} {self.azar.choice(ADJETIVOS)}" for _ in range(400)})
+
+    def _nombre_artista(self) -> str:
+        idioma = self.azar.choice(self.idiomas)
+        palabras = self.vocabularios[idioma].palabras
+        nombre = " ".join(self.azar.choice(palabras[-len(palabras) // 2:]) for _ in range(self.azar.randint(1, 3)))
+        return nombre.title() if self.azar.random() < 0.8 else nombre.upper()
+
+    def _id(self) -> str:
+        return "".join(self.azar.choice(CARACTERES_ID) for _ in range(22))  # como los ids de spotify
+
+    def _verso(self, idioma: str) -> str:
+        palabras = self.vocabularios[idioma].elegir(self.azar, self.azar.randint(4, 9))
+        return " ".join(palabras) + self.azar.choice(["", "", ",", "?", "!", "..."])
+
+    def cancion(self) -> Dict[str, str]:
+        azar = self.azar
+        idioma = azar.choices(self.idiomas, cum_weights=self.proporciones)[0]
+        mezcla = idioma != "en" and azar.random() < PROPORCION_MEZCLA
+        coro = [self._verso("en" if mezcla and azar.random() < 0.5 else idioma) for _ in range(azar.randint(2, 4))]
+        estrofas = [[self._verso(idioma) for _ in range(4)] for _ in range(azar.randint(2, 4))]
+        versos = []
+        for estrofa in estrofas:
+            versos.extend(estrofa)
+            versos.extend(coro)
+        if azar.random() < 0.5:
+            versos.extend(coro)  # el coro final
+        if azar.random() < 0.7:
+            palabras_coro = coro[0].rstrip(",?!.").split()
+            titulo = " ".join(palabras_coro[:azar.randint(1, min(4, len(palabras_coro)))])
+        else:
+            titulo = " ".join(self.vocabularios[idioma].elegir(azar, azar.randint(1, 4)))
+        if azar.random() < 0.1:
+            titulo += f" (feat. {azar.choice(self.artistas)})"
+        return {
+            "track_id": self._id(),
+            "track_name": string.capwords(titulo),
+            "track_artist": azar.choices(self.artistas, cum_weights=self.acumulados_artistas)[0],
+            "lyrics": " ".join(versos),
+            "playlist_name": azar.choice(self.playlists),
+        }
+
+
+def generar_corpus(ruta: str, filas: int, semilla: int = 11, vocabulario: int = 20000) -> Dict:
+    """escribe el csv y devuelve lo que lo identifica (filas, semilla, bytes y crc32 del archivo)"""
+    generador = GeneradorCanciones(filas, semilla, vocabulario)
+    with open(ruta, 'w', newline='', encoding='utf-8') as archivo:
+        escritor = csv.DictWriter(archivo, fieldnames=COLUMNAS)
+        escritor.writeheader()
+        for _ in range(filas):
+            escritor.writerow(generador.cancion())
+    return {"filas": filas, "semilla": semilla, "vocabulario": vocabulario, **firma_archivo(ruta)}
+
+
+def firma_archivo(ruta: str) -> Dict:
+    crc = 0
+    tamanio = 0
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(1 << 20), b''):
+            crc = zlib.crc32(bloque, crc)
+            tamanio += len(bloque)
+    return {"bytes": tamanio, "crc32": f"{crc:08x}"}
+
+
+def escribir_auxiliares(directorio: str):
+    """stoplist.csv y pesos_campos.json que IndiceInvertido espera junto al indice"""
+    with open(os.path.join(directorio, "pesos_campos.json"), 'w', encoding='utf-8') as archivo:
+        json.dump(PESOS_CAMPOS, archivo)
+    with open(os.path.join(directorio, "stoplist.csv"), 'w', encoding='utf-8') as archivo:
+        archivo.write("\n".join(STOPLIST))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="genera un spotify_songs_filtrado.csv sintetico")
+    parser.add_argument("salida")
+    parser.add_argument("--filas", type=int, default=100000)
+    parser.add_argument("--semilla", type=int, default=11)
+    parser.add_argument("--vocabulario", type=int, default=20000, help="palabras de la cola del ingles y el español")
+    argumentos = parser.parse_args()
+    print(generar_corpus(argumentos.salida, argumentos.filas, argumentos.semilla, argumentos.vocabulario))
@@ -0,0 +1,226 @@
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import contextlib
+import subprocess
+from typing import Dict, List
+
+try:
+    import resource
+except ImportError:  # en windows no hay resource; el pico de memoria sale de psutil si esta
+    resource = None
+
+from benchmarks.corpus import generar_corpus, firma_archivo, escribir_auxiliares
+from benchmarks.carga import generar_carga, guardar_carga, leer_carga, MEZCLA
+
+# SUITE DE BENCHMARKS REPRODUCIBLE DEL INDICE INVERTIDO
+# para cada tamaño de corpus: genera el csv sintetico (corpus.py) y las consultas (carga.py) con semillas fijas,
+# construye el indice con IndiceInvertido y sirve las consultas con MotorConsulta, cada cosa en un proceso
+# nuevo para que el pico de memoria y el arranque sean los de ese paso solo. reporta:
+#   construccion: segundos, filas/s y pico de RSS (del proceso principal y del mayor worker)
+#   indice: bytes en disco por archivo y en total
+#   arranque: importar app.Final2, construir el motor y la primera consulta (y aparte armar los trigramas)
+#   consultas: p50/p95/p99 y media en ms, consultas/s, por tipo de consulta y el reparto por etapa (Metricas.py)
+# todo va a un json (--salida) con la version de git y la maquina; python -m benchmarks.comparar compara dos.
+# el csv y el indice quedan en --directorio (o en uno temporal que se borra al terminar)
+# uso: python -m benchmarks.suite [--filas 10000 100000] [--consultas 2000] [--workers N] [--salida r.json]
+
+VERSION_SUITE = 1
+PERCENTILES = (50, 95, 99)
+ARCHIVOS_AUXILIARES = {"spotify_songs_filtrado.csv", "stoplist.csv", "pesos_campos.json", "carga.jsonl"}
+
+
+def rss_pico_mb() -> Dict[str, float]:
+    """pico de memoria residente de este proceso y del mayor de sus hijos ya terminados, en MB"""
+    if resource is not None:
+        escala = 1 if sys.platform == "darwin" else 1024  # ru_maxrss esta en bytes en mac y en KB en linux
+        return {"proceso": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * escala / 1e6,
+                "hijos": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * escala / 1e6}
+    try:
+        import psutil
+        return {"proceso": getattr(psutil.Process().memory_info(), "peak_wset", 0) / 1e6, "hijos": None}
+    except ImportError:
+        return {"proceso": None, "hijos": None}
+
+
+def percentiles_ms(tiempos: List[float]) -> Dict[str, float]:
+    if not tiempos:
+        return {}
+    ordenados = sorted(tiempos)
+    resumen = {f"p{p}_ms": ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))] * 1000
+               for p in PERCENTILES}
+    resumen["media_ms"] = sum(ordenados) / len(ordenados) * 1000
+    resumen["consultas"] = len(ordenados)
+    return {clave: round(valor, 4) for clave, valor in resumen.items()}
+
+
+def _construir(directorio: str, workers: int) -> Dict:
+    from app.Final2 import IndiceInvertido
+    ruta_csv = os.path.join(directorio, "spotify_songs_filtrado.csv")
+    indice = IndiceInvertido(ruta_csv, os.path.join(directorio, "stoplist.csv"), directorio,
+                             os.path.join(directorio, "normas.npy"), os.path.join(directorio, "pesos_campos.json"),
+                             workers=workers)
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        indice.construir_indice()
+    return {"segundos": round(time.perf_counter() - inicio, 3), "rss_pico_mb": rss_pico_mb()}
+
+
+def _consultar(directorio: str, top_k: int, difusa: bool) -> Dict:
+    inicio = time.perf_counter()
+    from app.Final2 import MotorConsulta
+    from app.Metricas import metricas, NOMBRE_ETAPAS
+    importado = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        # como routes.py: perezoso, con impactos y sin cache de resultados (cada consulta se resuelve)
+        motor = MotorConsulta(os.path.join(directorio, "spotify_songs_filtrado.csv"), directorio,
+                              os.path.join(directorio, "normas.npy"), os.path.join(directorio, "stoplist.csv"),
+                              modo_carga='perezoso', usar_impactos=True)
+    listo = time.perf_counter()
+    carga = leer_carga(os.path.join(directorio, "carga.jsonl"))
+    motor.buscar(carga[0]["consulta"], top_k, difusa=difusa)
+    primera = time.perf_counter()
+    if difusa:
+        motor._indice_trigramas()  # se arma con la primera consulta con errores; aparte, para no ensuciar el p99
+    trigramas = time.perf_counter()
+    metricas.limpiar()
+    tiempos = {}
+    vacias = 0
+    inicio_carga = time.perf_counter()
+    for consulta in carga:
+        antes = time.perf_counter()
+        vacias += not motor.buscar(consulta["consulta"], top_k, difusa=difusa)
+        tiempos.setdefault(consulta["tipo"], []).append(time.perf_counter() - antes)
+    duracion = time.perf_counter() - inicio_carga
+    todos = [tiempo for lista in tiempos.values() for tiempo in lista]
+    return {
+        "arranque": {clave: round(valor, 4) for clave, valor in (
+            ("importar_s", importado - inicio), ("motor_s", listo - importado), ("primera_consulta_s", primera - listo),
+            ("total_s", primera - inicio), ("trigramas_s", trigramas - primera))},
+        "consultas": {"todas": {**percentiles_ms(todos), "por_segundo": round(len(todos) / duracion, 1),
+                                "sin_resultados": vacias},
+                      "por_tipo": {tipo: percentiles_ms(lista) for tipo, lista in sorted(tiempos.items())},
+                      "etapas_media_ms": {clave: valores["media_ms"] for clave, valores
+                                          in sorted(metricas.resumen().get(NOMBRE_ETAPAS, {}).items())},
+                      "cache_postings": motor.estadisticas_cache()},
+        "rss_pico_mb": rss_pico_mb()["proceso"],
+    }
+
+
+def _en_proceso(etapa: str, *argumentos) -> Dict:
+    # cada paso en un interprete nuevo: su pico de RSS y su arranque no arrastran lo que hizo el anterior
+    salida = subprocess.run([sys.executable, "-m", "benchmarks.suite", "--etapa", etapa, *map(str, argumentos)],
+                            capture_output=True, text=True)
+    if salida.returncode != 0:
+        raise RuntimeError(f"fallo la etapa {etapa}:\n{salida.stderr}")
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def tamanio_indice(directorio: str) -> Dict:
+    archivos = {}
+    for raiz, _, nombres in os.walk(directorio):
+        for nombre in nombres:
+            ruta = os.path.join(raiz, nombre)
+            relativa = os.path.relpath(ruta, directorio)
+            if relativa not in ARCHIVOS_AUXILIARES:
+                archivos[relativa] = os.path.getsize(ruta)
+    return {"bytes": sum(archivos.values()), "archivos": dict(sorted(archivos.items()))}
+
+
+def correr(filas: int, directorio: str, consultas: int, workers: int, semilla: int, top_k: int,
+           difusa: bool) -> Dict:
+    os.makedirs(directorio, exist_ok=True)
+    ruta_csv = os.path.join(directorio, "spotify_songs_filtrado.csv")
+    inicio = time.perf_counter()
+    corpus = generar_corpus(ruta_csv, filas, semilla)
+    corpus["segundos_generacion"] = round(time.perf_counter() - inicio, 2)
+    escribir_auxiliares(directorio)
+    ruta_carga = os.path.join(directorio, "carga.jsonl")
+    guardar_carga(ruta_carga, generar_carga(ruta_csv, consultas, semilla))
+    print(f"{filas} filas: corpus de {corpus['bytes'] / 1e6:.1f} MB, construyendo el indice...", flush=True)
+    construccion = _en_proceso("construir", directorio, workers)
+    construccion["filas_por_segundo"] = round(filas / construccion["segundos"], 1)
+    indice = tamanio_indice(directorio)
+    print(f"{filas} filas: indice de {indice['bytes'] / 1e6:.1f} MB en {construccion['segundos']:.1f} s, "
+          f"consultando...", flush=True)
+    servicio = _en_proceso("consultar", directorio, top_k, int(difusa))
+    return {"filas": filas, "corpus": corpus, "carga": {"consultas": consultas, **firma_archivo(ruta_carga)},
+            "construccion": construccion, "indice": indice, **servicio}
+
+
+def version_git() -> Dict:
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=raiz, capture_output=True, text=True, check=True)
+        cambios = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=raiz,
+                                 capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "cambios_sin_commit": None}
+    return {"commit": commit.stdout.strip(), "cambios_sin_commit": bool(cambios.stdout.strip())}
+
+
+def maquina() -> Dict:
+    import numpy
+    return {"python": platform.python_version(), "numpy": numpy.__version__, "sistema": platform.platform(),
+            "procesador": platform.processor() or platform.machine(), "cpus": os.cpu_count()}
+
+
+def imprimir(corrida: Dict):
+    construccion, consultas = corrida["construccion"], corrida["consultas"]["todas"]
+    print(f"  construccion: {construccion['segundos']:.1f} s, {construccion['filas_por_segundo']:.0f} filas/s, "
+          f"pico RSS {construccion['rss_pico_mb']['proceso']:.0f} MB")
+    print(f"  indice: {corrida['indice']['bytes'] / 1e6:.1f} MB; arranque {corrida['arranque']['total_s']:.2f} s, "
+          f"pico RSS consultando {corrida['rss_pico_mb']:.0f} MB")
+    print(f"  consultas: p50 {consultas['p50_ms']:.2f} ms, p95 {consultas['p95_ms']:.2f} ms, "
+          f"p99 {consultas['p99_ms']:.2f} ms, {consultas['por_segundo']:.0f}/s")
+    for tipo, valores in corrida["consultas"]["por_tipo"].items():
+        print(f"    {tipo:10} p50 {valores['p50_ms']:8.2f} ms  p99 {valores['p99_ms']:8.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="suite de benchmarks de construccion y consulta del indice")
+    parser.add_argument("--filas", type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument("--consultas", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=1, help="procesos de IndiceInvertido al construir")
+    parser.add_argument("--semilla", type=int, default=11)
+    parser.add_argument("--top_k", type=int, default=10)
+    parser.add_argument("--sin_difusa", action='store_true', help="consultas sin la expansion de terminos con errores")
+    parser.add_argument("--directorio", help="donde dejar los csv y los indices (por defecto uno temporal)")
+    parser.add_argument("--salida", default="resultados_suite.json")
+    parser.add_argument("--etapa", help=argparse.SUPPRESS)  # uso interno: un paso en su propio proceso
+    argumentos, resto = parser.parse_known_args()
+
+    if argumentos.etapa == "construir":
+        print(json.dumps(_construir(resto[0], int(resto[1]))))
+    elif argumentos.etapa == "consultar":
+        print(json.dumps(_consultar(resto[0], int(resto[1]), resto[2] == "1")))
+    else:
+        base = argumentos.directorio or tempfile.mkdtemp(prefix="suite_indice_")
+        resultados = {
+            "suite": VERSION_SUITE,
+            "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git": version_git(),
+            "maquina": maquina(),
+            "parametros": {"consultas": argumentos.consultas, "workers": argumentos.workers,
+                           "semilla": argumentos.semilla, "top_k": argumentos.top_k,
+                           "difusa": not argumentos.sin_difusa, "mezcla": MEZCLA},
+            "corridas": [],
+        }
+        try:
+            for filas in argumentos.filas:
+                corrida = correr(filas, os.path.join(base, f"filas_{filas}"), argumentos.consultas,
+                                 argumentos.workers, argumentos.semilla, argumentos.top_k, not argumentos.sin_difusa)
+                resultados["corridas"].append(corrida)
+                imprimir(corrida)
+                with open(argumentos.salida, 'w', encoding='utf-8') as archivo:  # tambien si falla la siguiente
+                    json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+        finally:
+            if not argumentos.directorio:
+                shutil.rmtree(base, ignore_errors=True)
+        print(f"resultados en {argumentos.salida}")